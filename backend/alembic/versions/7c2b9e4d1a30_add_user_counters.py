@@ -0,0 +1,48 @@
+"""add_user_counters
+
+Revision ID: 7c2b9e4d1a30
+Revises: 1fa2cf495087
+Create Date: 2026-10-19 10:12:41.208113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2b9e4d1a30'
+down_revision = '1fa2cf495087'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('user_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('data_sources_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('conversations_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('queries_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+    # Backfill from the existing rows
+    op.execute("""
+        INSERT INTO user_counters (user_id, data_sources_count, conversations_count, queries_count)
+        SELECT u.id,
+               COALESCE(ds.n, 0),
+               COALESCE(c.n, 0),
+               COALESCE(q.n, 0)
+        FROM users u
+        LEFT JOIN (SELECT owner_user_id, COUNT(*) AS n FROM data_sources GROUP BY owner_user_id) ds
+               ON ds.owner_user_id = u.id
+        LEFT JOIN (SELECT user_id, COUNT(*) AS n FROM conversations GROUP BY user_id) c
+               ON c.user_id = u.id
+        LEFT JOIN (SELECT user_id, COUNT(*) AS n FROM queries GROUP BY user_id) q
+               ON q.user_id = u.id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('user_counters')
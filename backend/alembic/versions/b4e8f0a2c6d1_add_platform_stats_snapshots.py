@@ -0,0 +1,39 @@
+"""add_platform_stats_snapshots
+
+Revision ID: b4e8f0a2c6d1
+Revises: 7c2b9e4d1a30
+Create Date: 2026-10-19 10:48:03.551920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e8f0a2c6d1'
+down_revision = '7c2b9e4d1a30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('platform_stats_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('snapshot_date', sa.Date(), nullable=False),
+    sa.Column('users_count', sa.Integer(), nullable=False),
+    sa.Column('data_sources_count', sa.Integer(), nullable=False),
+    sa.Column('conversations_count', sa.Integer(), nullable=False),
+    sa.Column('queries_count', sa.Integer(), nullable=False),
+    sa.Column('storage_bytes', sa.BigInteger(), nullable=True, comment='NULL when unknown (backfilled days)'),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_platform_stats_snapshots_id'), 'platform_stats_snapshots', ['id'], unique=False)
+    op.create_index(op.f('ix_platform_stats_snapshots_snapshot_date'), 'platform_stats_snapshots', ['snapshot_date'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_platform_stats_snapshots_snapshot_date'), table_name='platform_stats_snapshots')
+    op.drop_index(op.f('ix_platform_stats_snapshots_id'), table_name='platform_stats_snapshots')
+    op.drop_table('platform_stats_snapshots')
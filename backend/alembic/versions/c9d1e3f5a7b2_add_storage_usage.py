@@ -0,0 +1,42 @@
+"""add_storage_usage
+
+Revision ID: c9d1e3f5a7b2
+Revises: b4e8f0a2c6d1
+Create Date: 2026-10-19 11:20:37.904416
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9d1e3f5a7b2'
+down_revision = 'b4e8f0a2c6d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('storage_usage',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('path', sa.String(), nullable=False, comment='File path relative to the working directory'),
+    sa.Column('kind', sa.String(), nullable=False, comment='upload, columnar, exec_db, result_cache, export, vector_index, other'),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('data_source_id', sa.Integer(), nullable=True),
+    sa.Column('bytes', sa.BigInteger(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['data_source_id'], ['data_sources.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('path')
+    )
+    op.create_index(op.f('ix_storage_usage_id'), 'storage_usage', ['id'], unique=False)
+    op.create_index(op.f('ix_storage_usage_user_id'), 'storage_usage', ['user_id'], unique=False)
+    # Existing files are picked up by the first storage reconciliation run
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_storage_usage_user_id'), table_name='storage_usage')
+    op.drop_index(op.f('ix_storage_usage_id'), table_name='storage_usage')
+    op.drop_table('storage_usage')
@@ -0,0 +1,31 @@
+"""add_api_key_prefix
+
+Revision ID: e5f7a9c1d3b4
+Revises: c9d1e3f5a7b2
+Create Date: 2026-10-19 12:02:15.417362
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5f7a9c1d3b4'
+down_revision = 'c9d1e3f5a7b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('api_keys', sa.Column('prefix', sa.String(), nullable=True, comment='Public key id, the first part of the key'))
+    op.create_index(op.f('ix_api_keys_prefix'), 'api_keys', ['prefix'], unique=True)
+    op.alter_column('api_keys', 'key_hash', existing_type=sa.String(), comment='HMAC-SHA256 of the secret part', existing_nullable=False)
+    op.alter_column('api_keys', 'allowed_ips', existing_type=sa.Text(), comment='Comma-separated IPs/CIDR networks (empty = any)', existing_nullable=True)
+    # Keys without a prefix predate key authentication and cannot be used
+
+
+def downgrade() -> None:
+    op.alter_column('api_keys', 'allowed_ips', existing_type=sa.Text(), comment=None, existing_nullable=True)
+    op.alter_column('api_keys', 'key_hash', existing_type=sa.String(), comment=None, existing_nullable=False)
+    op.drop_index(op.f('ix_api_keys_prefix'), table_name='api_keys')
+    op.drop_column('api_keys', 'prefix')
@@ -0,0 +1,367 @@
+"""
+Admission control for expensive endpoints.
+
+Each request to a guarded endpoint first takes a token from its
+principal's rate bucket (per user for JWT logins, per key for API keys),
+then waits for a concurrency slot: at most ADMISSION_USER_CONCURRENCY
+running per user and ADMISSION_GLOBAL_CONCURRENCY overall. Requests that
+are rate limited, or cannot get a slot within ADMISSION_QUEUE_SECONDS,
+get 429 with Retry-After. Background work started by a request (the
+exact run after an approximate answer) waits for a slot of the same user
+through background_slot().
+
+State is per process by default. With ADMISSION_BACKEND=redis (requires
+the `redis` package) buckets and slots are shared by all workers; if
+Redis is unreachable, the local state is used instead for
+ADMISSION_REDIS_RETRY_SECONDS before Redis is tried again.
+"""
+import asyncio
+import math
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, status
+
+from app.core.config import settings
+from app.core.metrics import counter, gauge, histogram
+from app.core.rate_limit import TokenBucket
+from app.core.security import AuthUser, get_current_user
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+
+_admission_results = counter(
+    "lumiere_admission_total",
+    "Admission decisions for guarded endpoints",
+    label_names=("endpoint", "result")
+)
+_admission_wait = histogram(
+    "lumiere_admission_wait_seconds",
+    "Time spent waiting for a concurrency slot",
+    label_names=("endpoint",)
+)
+_slot_held = histogram(
+    "lumiere_admission_slot_seconds",
+    "Time a concurrency slot was held",
+    label_names=("endpoint",)
+)
+
+
+class _LocalBackend:
+    """In-process buckets and slots; waiters are served in arrival order"""
+
+    MAX_BUCKETS = 10000
+
+    def __init__(self, user_limit: int, global_limit: int):
+        self.user_limit = user_limit
+        self.global_limit = global_limit
+        self.active: Dict[str, int] = {}
+        self.total = 0
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._waiters: Deque[Tuple[str, asyncio.Future]] = deque()
+
+    async def take(self, key: str, per_minute: float) -> float:
+        """Take one request token; returns 0 if allowed, else seconds to wait"""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.MAX_BUCKETS:
+                # Full buckets carry no state: drop them
+                self._buckets = {k: b for k, b in self._buckets.items() if b.tokens < b.capacity}
+            bucket = self._buckets[key] = TokenBucket.per_minute(per_minute)
+        if bucket.try_acquire(1):
+            return 0.0
+        return bucket.wait_time(1)
+
+    def _can_run(self, user_key: str) -> bool:
+        return self.total < self.global_limit and self.active.get(user_key, 0) < self.user_limit
+
+    def _grant(self, user_key: str):
+        self.active[user_key] = self.active.get(user_key, 0) + 1
+        self.total += 1
+
+    async def acquire(self, user_key: str, timeout: float) -> Optional[str]:
+        """Wait up to `timeout` seconds for a slot; returns a lease or None"""
+        if self._can_run(user_key):
+            self._grant(user_key)
+            return "local"
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (user_key, future)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait({future}, timeout=timeout)
+        except asyncio.CancelledError:
+            # Request cancelled while waiting (e.g. client disconnected)
+            if future.done():
+                self._release(user_key)
+            else:
+                self._waiters.remove(entry)
+                future.cancel()
+            raise
+        if future.done():
+            return "local"
+        self._waiters.remove(entry)
+        future.cancel()
+        return None
+
+    async def release(self, user_key: str, lease: str):
+        self._release(user_key)
+
+    def _release(self, user_key: str):
+        self.total -= 1
+        self.active[user_key] -= 1
+        if not self.active[user_key]:
+            del self.active[user_key]
+
+        # Hand freed capacity to the oldest waiters that may run
+        for entry in list(self._waiters):
+            if self.total >= self.global_limit:
+                break
+            waiter_key, future = entry
+            if self._can_run(waiter_key):
+                self._waiters.remove(entry)
+                self._grant(waiter_key)
+                future.set_result(None)
+
+
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[4]) or redis.call('ZCARD', KEYS[2]) >= tonumber(ARGV[5]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+redis.call('EXPIRE', KEYS[2], ARGV[6])
+return 1
+"""
+
+
+class _RedisBackend:
+    """
+    Buckets and slots shared through Redis. Slots are leases that expire
+    after ADMISSION_LEASE_SECONDS, so a crashed worker cannot hold them
+    forever. Waiting polls, so ordering among waiters is not strict.
+    """
+
+    POLL_SECONDS = 0.05
+
+    def __init__(self, url: str, user_limit: int, global_limit: int, lease_seconds: int):
+        self.user_limit = user_limit
+        self.global_limit = global_limit
+        self.lease_seconds = lease_seconds
+        self.client = aioredis.from_url(url)
+        self._take = self.client.register_script(_TAKE_SCRIPT)
+        self._acquire = self.client.register_script(_ACQUIRE_SCRIPT)
+
+    async def take(self, key: str, per_minute: float) -> float:
+        wait = await self._take(
+            keys=[f"lumiere:admission:rate:{key}"],
+            args=[per_minute / 60.0, per_minute, time.time()]
+        )
+        return float(wait)
+
+    def _slot_keys(self, user_key: str):
+        return [f"lumiere:admission:slots:{user_key}", "lumiere:admission:slots"]
+
+    async def acquire(self, user_key: str, timeout: float) -> Optional[str]:
+        lease = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while True:
+            now = time.time()
+            granted = await self._acquire(
+                keys=self._slot_keys(user_key),
+                args=[now, now + self.lease_seconds, lease, self.user_limit, self.global_limit, self.lease_seconds]
+            )
+            if granted == 1:
+                return lease
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            await asyncio.sleep(min(self.POLL_SECONDS, remaining))
+
+    async def release(self, user_key: str, lease: str):
+        user_slots, all_slots = self._slot_keys(user_key)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zrem(user_slots, lease)
+            pipe.zrem(all_slots, lease)
+            await pipe.execute()
+
+    async def close(self):
+        await self.client.close()
+
+
+class AdmissionController:
+    """Rate limits and concurrency caps for guarded endpoints"""
+
+    def __init__(self):
+        self.local = _LocalBackend(settings.ADMISSION_USER_CONCURRENCY, settings.ADMISSION_GLOBAL_CONCURRENCY)
+        self.shared: Optional[_RedisBackend] = None
+        self._shared_retry_at = 0.0  # monotonic time until which Redis is skipped after an error
+        if settings.ADMISSION_BACKEND == "redis":
+            if aioredis is None:
+                print("Warning: ADMISSION_BACKEND=redis but redis is not installed; using in-process state")
+            else:
+                self.shared = _RedisBackend(
+                    settings.REDIS_URL,
+                    settings.ADMISSION_USER_CONCURRENCY,
+                    settings.ADMISSION_GLOBAL_CONCURRENCY,
+                    settings.ADMISSION_LEASE_SECONDS
+                )
+
+    async def _call(self, method: str, *args):
+        """
+        Run a backend call on Redis, falling back to local state on errors
+        and for ADMISSION_REDIS_RETRY_SECONDS after one (warned once).
+        """
+        if self.shared is not None and time.monotonic() >= self._shared_retry_at:
+            try:
+                return "shared", await getattr(self.shared, method)(*args)
+            except Exception as e:
+                now = time.monotonic()
+                if now >= self._shared_retry_at:  # calls in flight fail together; warn once
+                    print(
+                        f"Warning: admission backend unavailable ({e}); using in-process state "
+                        f"for {settings.ADMISSION_REDIS_RETRY_SECONDS:g}s"
+                    )
+                self._shared_retry_at = now + settings.ADMISSION_REDIS_RETRY_SECONDS
+        return "local", await getattr(self.local, method)(*args)
+
+    async def enter(self, user: AuthUser, endpoint: str) -> Tuple[str, str]:
+        """
+        Admit a request or raise 429.
+
+        Returns:
+            (backend, lease) to pass to leave()
+        """
+        if user.key_prefix:
+            principal, per_minute = f"key:{user.key_prefix}", settings.ADMISSION_API_KEY_RATE_PER_MINUTE
+        else:
+            principal, per_minute = f"user:{user.id}", settings.ADMISSION_USER_RATE_PER_MINUTE
+
+        _, wait = await self._call("take", principal, per_minute)
+        if wait > 0:
+            _admission_results.inc(endpoint=endpoint, result="rate_limited")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded, please retry later",
+                headers={"Retry-After": str(max(1, math.ceil(wait)))}
+            )
+
+        slot = await self.acquire_slot(user.id, endpoint, settings.ADMISSION_QUEUE_SECONDS)
+        if slot is None:
+            typical = _slot_held.quantile(0.5, endpoint=endpoint) or 1.0
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests in progress, please retry shortly",
+                headers={"Retry-After": str(max(1, math.ceil(typical)))}
+            )
+        return slot
+
+    async def acquire_slot(self, user_id: int, endpoint: str, timeout: float) -> Optional[Tuple[str, str]]:
+        """
+        Wait up to `timeout` seconds for one of the user's concurrency
+        slots, without taking a rate token.
+
+        Returns:
+            (backend, lease) to pass to release_slot(), or None on timeout
+        """
+        start = time.perf_counter()
+        backend, lease = await self._call("acquire", f"user:{user_id}", timeout)
+        _admission_wait.observe(time.perf_counter() - start, endpoint=endpoint)
+        if lease is None:
+            _admission_results.inc(endpoint=endpoint, result="queue_timeout")
+            return None
+        _admission_results.inc(endpoint=endpoint, result="admitted")
+        return backend, lease
+
+    async def leave(self, user: AuthUser, backend: str, lease: str):
+        await self.release_slot(user.id, backend, lease)
+
+    async def release_slot(self, user_id: int, backend: str, lease: str):
+        target = self.shared if backend == "shared" else self.local
+        try:
+            await target.release(f"user:{user_id}", lease)
+        except Exception as e:
+            print(f"Warning: failed to release admission slot ({e}); it expires with its lease")
+
+    async def close(self):
+        if self.shared is not None:
+            await self.shared.close()
+
+
+admission_controller = AdmissionController()
+
+gauge(
+    "lumiere_admission_running",
+    "Guarded requests holding a slot in this process's local state",
+    fn=lambda: admission_controller.local.total
+)
+gauge(
+    "lumiere_admission_queued",
+    "Guarded requests waiting for a slot in this process's local state",
+    fn=lambda: len(admission_controller.local._waiters)
+)
+
+
+def admission(endpoint: str):
+    """
+    Dependency guarding an expensive endpoint; resolves to the current user.
+
+    Usage: current_user: AuthUser = Depends(admission("ai_query"))
+    """
+    async def admit(current_user: AuthUser = Depends(get_current_user)):
+        backend, lease = await admission_controller.enter(current_user, endpoint)
+        start = time.perf_counter()
+        try:
+            yield current_user
+        finally:
+            _slot_held.observe(time.perf_counter() - start, endpoint=endpoint)
+            await admission_controller.leave(current_user, backend, lease)
+    return admit
+
+
+@asynccontextmanager
+async def background_slot(user_id: int, endpoint: str, timeout: float) -> AsyncIterator[bool]:
+    """
+    Hold one of the user's concurrency slots for background work started
+    by a guarded request (its rate token was paid by that request).
+    Yields whether a slot was granted within `timeout` seconds.
+
+    Usage: async with background_slot(user_id, "ai_query_refine", 60) as admitted: ...
+    """
+    slot = await admission_controller.acquire_slot(user_id, endpoint, timeout)
+    start = time.perf_counter()
+    try:
+        yield slot is not None
+    finally:
+        if slot is not None:
+            _slot_held.observe(time.perf_counter() - start, endpoint=endpoint)
+            await admission_controller.release_slot(user_id, *slot)
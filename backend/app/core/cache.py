@@ -0,0 +1,71 @@
+"""
+Small in-process caches with a time-to-live and LRU eviction.
+
+Each worker process has its own copy, so entries can be stale for up to
+`ttl` seconds after a change made by another process; changes made in
+this process should call `invalidate`.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+from app.core.metrics import record_cache
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after being set"""
+
+    def __init__(self, name: str, ttl: float, max_size: int = 1024):
+        self.name = name
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                record_cache(self.name, True)
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        record_cache(self.name, False)
+        return None
+
+    def set(self, key: Hashable, value: V):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, load: Callable[[], Optional[V]]) -> Optional[V]:
+        """Return the cached value, or load and cache it (None is not cached)"""
+        value = self.get(key)
+        if value is None:
+            value = load()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable, V], bool]):
+        """Drop every entry for which predicate(key, value) is true"""
+        with self._lock:
+            for key in [k for k, (_, v) in self._entries.items() if predicate(k, v)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
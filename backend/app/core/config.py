@@ -3,7 +3,7 @@ Configuration module for Lumiere backend.
 Loads environment variables and provides application settings.
 """
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 
 
 class Settings(BaseSettings):
@@ -21,9 +21,31 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_USER_CACHE_TTL_SECONDS: float = 30.0  # max staleness of is_active/is_admin across workers
+    AUTH_USER_CACHE_SIZE: int = 10000
+    API_KEY_HMAC_SECRET: str = ""  # empty = use SECRET_KEY
+    API_KEY_CACHE_TTL_SECONDS: float = 60.0  # max delay before a revocation applies in other workers
+    API_KEY_CACHE_SIZE: int = 10000
+    PASSWORD_HASH_WORKERS: int = 2  # bcrypt threads per process
+    PASSWORD_HASH_QUEUE_SIZE: int = 32  # waiting hash/verify calls before 429
     
     # OpenAI API
     OPENAI_API_KEY: str = ""
+    OPENAI_BASE_URL: str = ""  # e.g. http://localhost:8100/v1 for the local mock server
+    
+    # LLM dispatcher (rate limits, retries)
+    LLM_REQUESTS_PER_MINUTE: int = 500
+    LLM_TOKENS_PER_MINUTE: int = 200000
+    LLM_MAX_RETRIES: int = 4
+    LLM_BACKOFF_BASE_SECONDS: float = 0.5
+    LLM_BACKOFF_MAX_SECONDS: float = 20.0
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 30.0
+    LLM_INTERACTIVE_RESERVE: float = 0.2  # capacity share kept free for interactive calls
+    
+    # LLM pricing, USD per 1M tokens (JSON in the environment)
+    LLM_PRICE_PER_1M_TOKENS: Dict[str, Dict[str, float]] = {
+        "gpt-4o-mini": {"prompt": 0.15, "completion": 0.60},
+    }
     
     # Application
     APP_NAME: str = "Lumiere"
@@ -31,21 +53,111 @@ class Settings(BaseSettings):
     DEBUG: bool = False
     ENVIRONMENT: str = "development"
     
+    # Observability
+    SERVER_TIMING_HEADER: bool = True  # per-stage durations in a Server-Timing response header
+    METRICS_ENABLED: bool = False  # Prometheus text endpoint at /metrics
+    METRICS_ALLOWED_NETWORKS: str = "127.0.0.1/32,::1/128"  # scrapers allowed to read /metrics
+    
+    # Buffered writes of audit/log/usage records
+    EVENT_SINK_BATCH_SIZE: int = 200
+    EVENT_SINK_FLUSH_SECONDS: float = 2.0
+    EVENT_SINK_MAX_QUEUE: int = 50000  # events beyond this are dropped
+    
+    # Admission control for expensive endpoints (/ai/query, /ai/chart, /ai/insight, /data/upload)
+    ADMISSION_USER_RATE_PER_MINUTE: float = 30
+    ADMISSION_API_KEY_RATE_PER_MINUTE: float = 60
+    ADMISSION_USER_CONCURRENCY: int = 2
+    ADMISSION_GLOBAL_CONCURRENCY: int = 16  # per process, or per cluster with the redis backend
+    ADMISSION_QUEUE_SECONDS: float = 10.0  # max wait for a slot before 429
+    ADMISSION_BACKEND: str = "memory"  # memory | redis (shared across workers)
+    ADMISSION_LEASE_SECONDS: int = 600  # redis slots expire after this
+    ADMISSION_REDIS_RETRY_SECONDS: float = 30.0  # after a redis error, use in-process state this long
+    REDIS_URL: str = "redis://localhost:6379/0"
+    
+    # SQL execution budgets
+    QUERY_TIMEOUT_SECONDS: float = 30.0
+    QUERY_MEMORY_LIMIT_MB: float = 1024  # growth of process RSS while a query runs
+    QUERY_PROGRESS_STEPS: int = 10000  # SQLite VM steps between budget checks
+    QUERY_CANCEL_POLL_SECONDS: float = 1.0  # how often a running query checks for cancels from other workers
+    QUERY_STALE_MARGIN_SECONDS: float = 300.0  # queries running this long past their limits are marked failed
+    SQL_FASTPATH_ENABLED: bool = True  # run simple single-table queries on the DataFrame, without SQLite
+    
+    # SQL validation (before data is loaded)
+    QUERY_MAX_COST: float = 2e8  # estimated row operations; costlier queries are rejected
+    QUERY_MAX_RESULT_ROWS: int = 10000  # queries that may return more get a LIMIT
+    TABLE_PROFILE_CACHE_TTL_SECONDS: float = 3600.0
+    TABLE_PROFILE_CACHE_SIZE: int = 256
+    DATAFRAME_CACHE_SIZE: int = 4  # parsed CSVs kept in memory; 0 disables
+    DATAFRAME_CACHE_TTL_SECONDS: float = 600.0
+    
+    # SQL repair (failed SQL goes back to the LLM with the error)
+    QUERY_REPAIR_MAX_ATTEMPTS: int = 2  # 0 disables repair
+    QUERY_REPAIR_DEADLINE_SECONDS: float = 90.0  # hard limit for all runs and repairs of one query
+    
+    # Rollups (pre-aggregated summaries of large CSV sources)
+    ROLLUP_ENABLED: bool = True
+    ROLLUP_MIN_ROWS: int = 100000  # smaller sources are fast enough on the fast path
+    ROLLUP_MAX_CARDINALITY: int = 1000  # distinct values of a dimension
+    ROLLUP_MAX_DIMENSIONS: int = 6  # per source; rollups are built for each one and each pair
+    ROLLUP_MAX_MEASURES: int = 8
+    ROLLUP_MAX_ROWS: int = 100000  # larger rollups are skipped
+    ROLLUP_SOURCES_PER_RUN: int = 16  # most recently queried sources considered per job run
+    ROLLUP_BUILD_INTERVAL_SECONDS: int = 600
+    ROLLUP_CACHE_SIZE: int = 32  # data sources whose rollups are kept in memory
+    ROLLUP_CACHE_TTL_SECONDS: float = 86400.0
+    
+    # Approximate queries (on a sample kept at upload)
+    APPROX_SAMPLE_ROWS: int = 100000  # larger uploads get a sample of this many rows
+    APPROX_SAMPLE_CACHE_SIZE: int = 8  # samples kept in memory
+    APPROX_CONFIDENCE: float = 0.95  # level of the returned confidence intervals
+    APPROX_EXACT_TIMEOUT_SECONDS: float = 600.0  # budget of the exact run that follows an estimate
+    APPROX_EXACT_QUEUE_SECONDS: float = 300.0  # max wait for an admission slot before the exact run is skipped
+    
+    # Background jobs
+    STATS_SNAPSHOT_INTERVAL_SECONDS: int = 900
+    USER_COUNTERS_REBUILD_INTERVAL_SECONDS: int = 86400
+    STORAGE_RECONCILE_INTERVAL_SECONDS: int = 3600
+    QUERY_STALE_SWEEP_INTERVAL_SECONDS: int = 300
+    
     # CORS
     ALLOWED_ORIGINS: str = "http://localhost:3000,http://localhost:5173"
     
     # File Upload
     MAX_FILE_SIZE_MB: int = 100
     UPLOAD_DIR: str = "./uploads"
+    STORAGE_QUOTA_MB_PER_USER: int = 0  # 0 = unlimited
+    STORAGE_SCAN_WORKERS: int = 4  # parallel directory scans during reconciliation
     
     # Encryption
     ENCRYPTION_KEY: str
     
+    # Vector search (RAG)
+    VECTOR_STORE_DIR: str = "./uploads/vectors"
+    EMBEDDING_DIM: int = 384
+    VECTOR_SEARCH_CHUNK_ROWS: int = 262144
+    VECTOR_ANN_ENABLED: bool = True
+    VECTOR_ANN_MIN_ROWS: int = 200000  # below this, exact search is fast enough
+    VECTOR_ANN_NLIST: int = 0  # 0 = 4 * sqrt(n) at training time
+    VECTOR_ANN_NPROBE: int = 16
+    VECTOR_ANN_TRAIN_SAMPLE: int = 100000
+    
+    # RAG ingestion
+    RAG_EMBEDDER: str = "hashing"
+    RAG_CHUNK_SIZE: int = 1000
+    RAG_CHUNK_OVERLAP: int = 100
+    RAG_EMBED_BATCH_SIZE: int = 256
+    RAG_INGEST_WORKERS: int = 4
+    
     @property
     def allowed_origins_list(self) -> List[str]:
         """Parse ALLOWED_ORIGINS string into a list."""
         return [origin.strip() for origin in self.ALLOWED_ORIGINS.split(",")]
     
+    @property
+    def metrics_allowed_networks_list(self) -> List[str]:
+        """Parse METRICS_ALLOWED_NETWORKS string into a list of CIDRs."""
+        return [net.strip() for net in self.METRICS_ALLOWED_NETWORKS.split(",") if net.strip()]
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -7,16 +7,27 @@ from sqlalchemy.orm import sessionmaker, Session
 from typing import Generator
 
 from app.core.config import settings
+from app.core.metrics import gauge
+
+# Connection pool limits
+POOL_SIZE = 10
+MAX_OVERFLOW = 20
 
 # Create database engine
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
     echo=settings.DEBUG
 )
 
+# Connection pool usage, read at scrape time
+gauge("lumiere_db_pool_size", "Configured persistent connections in the pool", fn=lambda: engine.pool.size())
+gauge("lumiere_db_pool_checked_out", "Connections currently checked out of the pool", fn=lambda: engine.pool.checkedout())
+gauge("lumiere_db_pool_checked_in", "Idle connections in the pool", fn=lambda: engine.pool.checkedin())
+gauge("lumiere_db_pool_overflow", "Connections open beyond pool_size (negative while below it)", fn=lambda: engine.pool.overflow())
+
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
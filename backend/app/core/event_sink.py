@@ -0,0 +1,226 @@
+"""
+Buffered writer for high-volume records (audit trail, system logs, usage,
+query history and metrics).
+
+Callers enqueue rows without touching the database. A background task
+bulk inserts them, one INSERT per model, when `EVENT_SINK_BATCH_SIZE` rows
+are pending or every `EVENT_SINK_FLUSH_SECONDS`. When the queue is full new
+events are dropped and counted, so a slow database never blocks requests.
+"""
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple, Type
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.metrics import counter, gauge
+from app.models.query import QueryHistory
+from app.models.system import AuditTrail, SystemLog, UsageCost
+
+_events = counter(
+    "lumiere_event_sink_events_total",
+    "Buffered events by outcome (written, dropped, failed)",
+    label_names=("outcome",)
+)
+
+
+class EventSink:
+    """Bounded in-process queue of rows flushed in bulk by a background task"""
+
+    def __init__(self, batch_size: int, flush_interval: float, max_queue: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue: Deque[Tuple[Type, Dict[str, Any]]] = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one writer at a time
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def emit(self, model: Type, **values: Any) -> bool:
+        """
+        Queue one row for `model`. Safe to call from any thread.
+
+        Returns:
+            False if the queue was full and the event was dropped
+        """
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                _events.inc(outcome="dropped")
+                return False
+            self._queue.append((model, values))
+            due = len(self._queue) >= self.batch_size
+
+        if due:
+            if self._task is not None:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            else:
+                # Not running under the app (scripts): write inline
+                self.flush()
+        return True
+
+    # --- Background flushing ---
+
+    async def start(self):
+        """Start the flush task on the running event loop"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task and write everything still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await run_in_threadpool(self.flush)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await run_in_threadpool(self.flush)
+            except Exception as e:
+                print(f"Warning: event sink flush failed: {e}")
+
+    # --- Writing ---
+
+    def flush(self) -> int:
+        """
+        Write all queued rows. Rows of each model go in one bulk INSERT;
+        if a batch fails (e.g. its parent row was deleted meanwhile) the
+        rows are retried one by one so a single bad row loses only itself.
+
+        Returns:
+            Number of rows written
+        """
+        with self._flush_lock:
+            with self._lock:
+                items = list(self._queue)
+                self._queue.clear()
+            if not items:
+                return 0
+
+            by_model: Dict[Type, List[Dict[str, Any]]] = {}
+            for model, values in items:
+                by_model.setdefault(model, []).append(values)
+
+            written = 0
+            db = SessionLocal()
+            try:
+                for model, rows in by_model.items():
+                    try:
+                        db.execute(insert(model), rows)
+                        db.commit()
+                        written += len(rows)
+                    except SQLAlchemyError:
+                        db.rollback()
+                        written += self._write_one_by_one(db, model, rows)
+            finally:
+                db.close()
+
+            _events.inc(written, outcome="written")
+            return written
+
+    @staticmethod
+    def _write_one_by_one(db, model: Type, rows: List[Dict[str, Any]]) -> int:
+        written = 0
+        for row in rows:
+            try:
+                db.execute(insert(model), [row])
+                db.commit()
+                written += 1
+            except SQLAlchemyError as e:
+                db.rollback()
+                _events.inc(outcome="failed")
+                print(f"Warning: dropped {model.__name__} event: {e.__class__.__name__}")
+        return written
+
+
+event_sink = EventSink(
+    batch_size=settings.EVENT_SINK_BATCH_SIZE,
+    flush_interval=settings.EVENT_SINK_FLUSH_SECONDS,
+    max_queue=settings.EVENT_SINK_MAX_QUEUE
+)
+
+gauge("lumiere_event_sink_pending", "Events waiting to be written", fn=lambda: event_sink.pending)
+
+
+# --- Record helpers ---
+
+def audit(
+    action: str,
+    user_id: Optional[int] = None,
+    object_type: Optional[str] = None,
+    object_id: Optional[int] = None,
+    diff: Optional[Dict[str, Any]] = None
+) -> bool:
+    """Queue an AuditTrail entry (user_id is the actor)"""
+    return event_sink.emit(
+        AuditTrail,
+        user_id=user_id,
+        action=action,
+        object_type=object_type,
+        object_id=object_id,
+        diff=diff,
+        created_at=datetime.utcnow()
+    )
+
+
+def system_log(
+    level: str,
+    component: str,
+    action: str,
+    details: Optional[str] = None,
+    user_id: Optional[int] = None,
+    ip_address: Optional[str] = None
+) -> bool:
+    """Queue a SystemLog entry (level: info, warn, error, audit)"""
+    return event_sink.emit(
+        SystemLog,
+        level=level,
+        component=component,
+        action=action,
+        details=details,
+        user_id=user_id,
+        ip_address=ip_address,
+        created_at=datetime.utcnow()
+    )
+
+
+def usage_cost(metric: str, value: float, unit: str) -> bool:
+    """Queue a UsageCost entry (metric: query_time, token_usage, storage, model_api_calls)"""
+    now = datetime.utcnow()
+    return event_sink.emit(UsageCost, metric=metric, value=value, unit=unit, recorded_at=now, created_at=now)
+
+
+def query_history(query_id: int, user_id: Optional[int], action: str, details: Optional[str] = None) -> bool:
+    """Queue a QueryHistory entry (action: created, executed, rejected, repaired, repair_failed, cancelled, timeout, edited, saved, shared)"""
+    return event_sink.emit(
+        QueryHistory,
+        query_id=query_id,
+        user_id=user_id,
+        action=action,
+        details=details,
+        created_at=datetime.utcnow()
+    )
@@ -0,0 +1,297 @@
+"""
+In-process metrics primitives and the Prometheus text exposition.
+
+Metrics are created with counter(), gauge() and histogram(), which also
+register them for render_prometheus(). Values can be pushed (inc, set,
+observe) or pulled at scrape time from a callback, for numbers another
+component already tracks (pool usage, dispatcher stats).
+"""
+import bisect
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+# Latency buckets in seconds (upper bounds; +Inf is implicit)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+class _HistogramData:
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size  # per bucket, last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+
+class _Metric:
+    """Base for registered metrics"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """(name suffix, labels, value) triples for exposition"""
+        raise NotImplementedError
+
+
+# Callback result: a single value, or label values tuple -> value
+_Callback = Callable[[], Union[float, Dict[Tuple[str, ...], float]]]
+
+
+class _ValueMetric(_Metric):
+    """Counter/gauge storage: a value per label set, or a scrape-time callback"""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str] = (),
+        fn: Optional[_Callback] = None
+    ):
+        super().__init__(name, description, label_names)
+        self._fn = fn
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def value(self, **labels: str) -> float:
+        """Current value for one label set"""
+        if self._fn is not None:
+            result = self._fn()
+            if isinstance(result, dict):
+                return float(result.get(self._key(labels), 0.0))
+            return float(result)
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        """Label values -> value for every label set seen"""
+        if self._fn is not None:
+            result = self._fn()
+            return dict(result) if isinstance(result, dict) else {(): float(result)}
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        return [
+            ("", dict(zip(self.label_names, key)), value)
+            for key, value in sorted(self.values().items())
+        ]
+
+
+class Counter(_ValueMetric):
+    """Monotonically increasing count (thread-safe)"""
+
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_ValueMetric):
+    """Value that can go up and down (thread-safe)"""
+
+    type_name = "gauge"
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """
+    Thread-safe fixed-bucket histogram with optional labels.
+
+    Observations are kept as bucket counts plus count and sum, so memory
+    stays constant however many values are recorded. Quantiles are
+    estimated by interpolating within the bucket that holds the rank.
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        label_names: Sequence[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._data: Dict[Tuple[str, ...], _HistogramData] = {}
+
+    def observe(self, value: float, **labels: str):
+        """Record one value"""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._data.get(key)
+            if data is None:
+                data = self._data[key] = _HistogramData(len(self.buckets) + 1)
+            data.counts[index] += 1
+            data.count += 1
+            data.sum += value
+
+    def snapshot(self) -> Dict[Tuple[str, ...], Dict[str, object]]:
+        """Label values -> {"count", "sum", "counts"} (per-bucket, not cumulative)"""
+        with self._lock:
+            return {
+                key: {"count": data.count, "sum": data.sum, "counts": list(data.counts)}
+                for key, data in self._data.items()
+            }
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """Estimated q-quantile (0..1) for one label set, None if empty"""
+        with self._lock:
+            data = self._data.get(self._key(labels))
+            if data is None or data.count == 0:
+                return None
+            counts = list(data.counts)
+            total = data.count
+
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index == len(self.buckets):
+                    return lower  # +Inf bucket: best estimate is its lower bound
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def summary(self, **labels: str) -> Dict[str, Optional[float]]:
+        """count, mean, p50, p95 and p99 (seconds) for one label set"""
+        with self._lock:
+            data = self._data.get(self._key(labels))
+            count, total = (data.count, data.sum) if data else (0, 0.0)
+        return {
+            "count": count,
+            "mean": total / count if count else None,
+            "p50": self.quantile(0.50, **labels),
+            "p95": self.quantile(0.95, **labels),
+            "p99": self.quantile(0.99, **labels),
+        }
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        for key, data in sorted(self.snapshot().items()):
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), data["counts"]):
+                cumulative += count
+                le = "+Inf" if bound == math.inf else repr(float(bound))
+                samples.append(("_bucket", {**labels, "le": le}, cumulative))
+            samples.append(("_sum", labels, data["sum"]))
+            samples.append(("_count", labels, data["count"]))
+        return samples
+
+
+# --- Registry ---
+
+_registry: Dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            # A module imported under two names re-creates its metrics; keep the first
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name: str, description: str, label_names: Sequence[str] = (), fn: Optional[_Callback] = None) -> Counter:
+    """Create and register a Counter (fn: read the value at scrape time)"""
+    return _register(Counter(name, description, label_names, fn))
+
+
+def gauge(name: str, description: str, label_names: Sequence[str] = (), fn: Optional[_Callback] = None) -> Gauge:
+    """Create and register a Gauge (fn: read the value at scrape time)"""
+    return _register(Gauge(name, description, label_names, fn))
+
+
+def histogram(
+    name: str,
+    description: str,
+    label_names: Sequence[str] = (),
+    buckets: Iterable[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    """Create and register a Histogram"""
+    return _register(Histogram(name, description, label_names, buckets))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render_prometheus() -> str:
+    """All registered metrics in the Prometheus text format (version 0.0.4)"""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {_escape(metric.description)}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        for suffix, labels, value in metric.samples():
+            label_text = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+            label_text = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{metric.name}{suffix}{label_text} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Caches ---
+
+cache_requests = counter(
+    "lumiere_cache_requests_total",
+    "Cache lookups by cache and result (hit/miss)",
+    label_names=("cache", "result")
+)
+
+
+def record_cache(cache: str, hit: bool):
+    """Count one lookup in a named in-process cache"""
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def cache_hit_ratios() -> Dict[str, float]:
+    """Hit ratio per cache since startup"""
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), value in cache_requests.values().items():
+        hits_misses = totals.setdefault(cache, [0.0, 0.0])
+        hits_misses[0 if result == "hit" else 1] += value
+    return {
+        cache: hits / (hits + misses) if hits + misses else 0.0
+        for cache, (hits, misses) in totals.items()
+    }
@@ -0,0 +1,63 @@
+"""
+Rate limiting primitives.
+"""
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Holds up to `capacity` tokens and refills at `rate` tokens per second.
+    The level may go negative when actual usage is charged after the fact
+    (e.g. LLM tokens known only from the response), which delays later
+    acquisitions until the debt is repaid.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, amount: float) -> "TokenBucket":
+        """Bucket allowing `amount` per minute with a one-minute burst"""
+        return cls(rate=amount / 60.0, capacity=amount)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        """Current level"""
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def wait_time(self, amount: float = 1.0, reserve: float = 0.0) -> float:
+        """Seconds until `amount` tokens are available above `reserve`"""
+        with self._lock:
+            self._refill()
+            # Requests larger than the bucket can only ever wait for a full one
+            needed = min(amount + reserve, self.capacity) - self._tokens
+            return max(0.0, needed / self.rate) if self.rate > 0 else float("inf")
+
+    def try_acquire(self, amount: float = 1.0, reserve: float = 0.0) -> bool:
+        """Take `amount` tokens if that leaves at least `reserve` behind"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= min(amount + reserve, self.capacity):
+                self._tokens -= amount
+                return True
+            return False
+
+    def charge(self, amount: float):
+        """Adjust the level by `amount` unconditionally (negative refunds)"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens - amount)
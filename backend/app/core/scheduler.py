@@ -0,0 +1,100 @@
+"""
+Periodic background jobs run on the application's event loop.
+
+Job functions are synchronous (they use the database) and run in the
+thread pool. Every worker process runs its own copy, so jobs must be
+idempotent (e.g. upserts keyed by date).
+"""
+import asyncio
+import time
+from typing import Callable, List, Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.core.database import SessionLocal
+from app.core.metrics import counter, histogram
+
+_job_duration = histogram(
+    "lumiere_job_duration_seconds",
+    "Duration of periodic background job runs",
+    label_names=("job",)
+)
+_job_failures = counter(
+    "lumiere_job_failures_total",
+    "Periodic background job runs that raised",
+    label_names=("job",)
+)
+
+
+class PeriodicJob:
+    """Runs `fn` every `interval` seconds (first run after `initial_delay`)"""
+
+    def __init__(self, name: str, interval: float, fn: Callable[[], object], initial_delay: float = 0.0):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.initial_delay = initial_delay
+        self.last_run: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self):
+        start = time.perf_counter()
+        try:
+            await run_in_threadpool(self.fn)
+        except Exception as e:
+            _job_failures.inc(job=self.name)
+            print(f"Warning: job {self.name} failed: {e}")
+        finally:
+            _job_duration.observe(time.perf_counter() - start, job=self.name)
+            self.last_run = time.time()
+
+    async def _loop(self):
+        await asyncio.sleep(self.initial_delay)
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+_jobs: List[PeriodicJob] = []
+
+
+def register_job(name: str, interval: float, fn: Callable[[], object], initial_delay: float = 0.0) -> PeriodicJob:
+    """Register a job to be started with the application"""
+    job = PeriodicJob(name, interval, fn, initial_delay)
+    _jobs.append(job)
+    return job
+
+
+def with_session(fn: Callable[[Session], object]) -> Callable[[], object]:
+    """Wrap a function taking a DB session into a job with its own session"""
+    def run():
+        db = SessionLocal()
+        try:
+            return fn(db)
+        finally:
+            db.close()
+    return run
+
+
+async def start_jobs():
+    for job in _jobs:
+        job.start()
+
+
+async def stop_jobs():
+    for job in _jobs:
+        await job.stop()
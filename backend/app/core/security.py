@@ -2,23 +2,81 @@
 Security utilities for authentication and authorization.
 Includes password hashing, JWT token generation, and verification.
 """
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Union
+from typing import Callable, FrozenSet, Optional, Tuple, TypeVar, Union
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import APIKeyHeader, HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.core.database import get_db
-from app.models.user import User
+from app.core.metrics import counter, gauge
+from app.core.timing import span
+from app.models.user import APIKey, User
 
 # Password hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # HTTP Bearer token scheme
-security_scheme = HTTPBearer()
+security_scheme = HTTPBearer(auto_error=False)
+
+# API key header for programmatic clients
+api_key_scheme = APIKeyHeader(name="X-API-Key", auto_error=False)
+
+
+class AuthUser:
+    """
+    Lightweight snapshot of the authenticated user, as returned by
+    get_current_user. Load the User row when more fields are needed.
+    """
+    __slots__ = ("id", "username", "is_active", "is_admin", "scopes", "key_prefix")
+
+    def __init__(
+        self,
+        id: int,
+        username: str,
+        is_active: bool,
+        is_admin: bool,
+        scopes: Optional[FrozenSet[str]] = None,
+        key_prefix: Optional[str] = None
+    ):
+        self.id = id
+        self.username = username
+        self.is_active = is_active
+        self.is_admin = is_admin
+        self.scopes = scopes  # None for JWT logins (no restriction), API key scopes otherwise
+        self.key_prefix = key_prefix  # API key used, if any
+
+
+# Authenticated users by username (the JWT subject)
+_auth_users: TTLCache[AuthUser] = TTLCache(
+    "auth_user",
+    ttl=settings.AUTH_USER_CACHE_TTL_SECONDS,
+    max_size=settings.AUTH_USER_CACHE_SIZE
+)
+
+
+def invalidate_user_cache(user_id: int):
+    """Drop a user's cached snapshot; call after committing changes to the user"""
+    _auth_users.invalidate_where(lambda _, user: user.id == user_id)
+    _api_keys.invalidate_where(lambda _, key: key.user.id == user_id)
+
+
+def _load_auth_user(db: Session, username: str) -> Optional[AuthUser]:
+    row = db.query(User.id, User.username, User.is_active, User.is_admin).filter(
+        User.username == username
+    ).first()
+    return AuthUser(*row) if row else None
 
 
 def hash_password(password: str) -> str:
@@ -48,6 +106,74 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+# --- Password hashing off the event loop ---
+
+T = TypeVar("T")
+
+_password_rejected = counter(
+    "lumiere_password_hash_rejected_total",
+    "Password hash/verify calls rejected because the hashing pool was saturated",
+    label_names=("op",)
+)
+login_attempts = counter(
+    "lumiere_login_attempts_total",
+    "Login attempts by outcome",
+    label_names=("result",)
+)
+
+
+class PasswordHashPool:
+    """
+    Runs bcrypt on a dedicated, bounded thread pool (bcrypt releases the
+    GIL), so hashing neither blocks the event loop nor starves the shared
+    thread pool used by sync endpoints. Calls beyond `workers + queue_size`
+    in flight are rejected with 429 instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int, queue_size: int):
+        self.workers = workers
+        self.max_pending = workers + queue_size
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    async def run(self, op: str, fn: Callable[..., T], *args) -> T:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                _password_rejected.inc(op=op)
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="Too many authentication requests, please retry shortly",
+                    headers={"Retry-After": "1"}
+                )
+            self.pending += 1
+        try:
+            with span("password_hash"):
+                return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+
+password_pool = PasswordHashPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_SIZE)
+
+gauge(
+    "lumiere_password_hash_pending",
+    "Password hash/verify calls running or queued",
+    fn=lambda: password_pool.pending
+)
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password on the password hashing pool (raises 429 when saturated)"""
+    return await password_pool.run("hash", hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the password hashing pool (raises 429 when saturated)"""
+    return await password_pool.run("verify", verify_password, plain_password, hashed_password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     Create a JWT access token.
@@ -89,22 +215,165 @@ def decode_access_token(token: str) -> Optional[dict]:
         return None
 
 
+# --- API keys ---
+#
+# Keys look like "lmr_<prefix>_<secret>". The prefix is stored in clear and
+# indexed; the secret is stored as an HMAC-SHA256 keyed with the server
+# secret, which is fast to verify (API keys are random, so a slow hash adds
+# nothing). Changing API_KEY_HMAC_SECRET (or SECRET_KEY when it is unset)
+# invalidates every key.
+
+API_KEY_TAG = "lmr"
+
+# Scopes an API key can be granted: "<router>:read" for GET requests,
+# "<router>:write" for the rest. Admin and key management are JWT-only.
+API_KEY_SCOPES = ("ai:read", "ai:write", "data:read", "data:write", "users:read", "users:write")
+
+_api_key_auth = counter(
+    "lumiere_api_key_auth_total",
+    "API key authentications by outcome",
+    label_names=("result",)
+)
+
+
+class _VerifiedKey:
+    """Cached API key: its hash, owner (with scopes) and allowed networks"""
+    __slots__ = ("key_hash", "user", "networks")
+
+    def __init__(self, key_hash: str, user: AuthUser, networks: Tuple):
+        self.key_hash = key_hash
+        self.user = user
+        self.networks = networks
+
+
+# Active API keys by prefix
+_api_keys: TTLCache[_VerifiedKey] = TTLCache(
+    "api_key",
+    ttl=settings.API_KEY_CACHE_TTL_SECONDS,
+    max_size=settings.API_KEY_CACHE_SIZE
+)
+
+
+def hash_api_key_secret(secret: str) -> str:
+    key = (settings.API_KEY_HMAC_SECRET or settings.SECRET_KEY).encode()
+    return hmac.new(key, secret.encode(), hashlib.sha256).hexdigest()
+
+
+def generate_api_key() -> Tuple[str, str, str]:
+    """
+    Generate a new API key.
+    
+    Returns:
+        (full key to hand out once, prefix, hash of the secret to store)
+    """
+    prefix = secrets.token_hex(6)
+    secret = secrets.token_urlsafe(32)
+    return f"{API_KEY_TAG}_{prefix}_{secret}", prefix, hash_api_key_secret(secret)
+
+
+def parse_networks(allowed_ips: Optional[str]) -> Tuple:
+    """Parse a comma-separated IP/CIDR list (raises ValueError if malformed)"""
+    return tuple(
+        ipaddress.ip_network(item.strip(), strict=False)
+        for item in (allowed_ips or "").split(",") if item.strip()
+    )
+
+
+def invalidate_api_key(prefix: str):
+    """Drop a cached key; call after committing a revocation"""
+    _api_keys.invalidate(prefix)
+
+
+def _load_api_key(db: Session, prefix: str) -> Optional[_VerifiedKey]:
+    row = db.query(
+        APIKey.key_hash, APIKey.scopes, APIKey.allowed_ips,
+        User.id, User.username, User.is_active, User.is_admin
+    ).join(User, User.id == APIKey.user_id).filter(
+        APIKey.prefix == prefix,
+        APIKey.is_active.is_(True),
+        APIKey.revoked_at.is_(None)
+    ).first()
+    if row is None:
+        return None
+    try:
+        networks = parse_networks(row.allowed_ips)
+    except ValueError:
+        return None  # unusable rather than unrestricted
+    scopes = frozenset(scope.strip() for scope in (row.scopes or "").split(",") if scope.strip())
+    user = AuthUser(row.id, row.username, row.is_active, row.is_admin, scopes, key_prefix=prefix)
+    return _VerifiedKey(row.key_hash, user, networks)
+
+
+def _request_scope(request: Request) -> str:
+    """Scope needed for a request, e.g. "data:read" for GET /api/v1/data/..."""
+    path = request.url.path
+    area = path[len("/api/v1/"):].split("/", 1)[0] if path.startswith("/api/v1/") else ""
+    return f"{area}:{'read' if request.method in ('GET', 'HEAD') else 'write'}"
+
+
+def authenticate_api_key(db: Session, raw_key: str, request: Request) -> AuthUser:
+    """
+    Authenticate a request by API key.
+    
+    The key row is looked up by its prefix (cached), the secret is compared
+    in constant time, then the client IP and the request's scope are
+    checked against the key.
+    
+    Raises:
+        HTTPException: 401 for an unknown or wrong key, 403 if the key is
+            not allowed from this address or for this endpoint
+    """
+    tag, _, rest = raw_key.partition("_")
+    prefix, _, secret = rest.partition("_")
+    entry = None
+    if tag == API_KEY_TAG and prefix and secret:
+        entry = _api_keys.get_or_load(prefix, lambda: _load_api_key(db, prefix))
+    if entry is None or not hmac.compare_digest(entry.key_hash, hash_api_key_secret(secret)):
+        _api_key_auth.inc(result="invalid")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid API key")
+    
+    if entry.networks:
+        try:
+            client = ipaddress.ip_address(request.client.host) if request.client else None
+        except ValueError:
+            client = None
+        if client is None or not any(client in network for network in entry.networks):
+            _api_key_auth.inc(result="ip_denied")
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="API key not allowed from this address")
+    
+    scope = _request_scope(request)
+    if scope not in entry.user.scopes:
+        _api_key_auth.inc(result="scope_denied")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"API key lacks the '{scope}' scope")
+    
+    _api_key_auth.inc(result="ok")
+    return entry.user
+
+
 def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(security_scheme),
+    api_key: Optional[str] = Depends(api_key_scheme),
     db: Session = Depends(get_db)
-) -> User:
+) -> AuthUser:
     """
-    Dependency to get the current authenticated user from JWT token.
+    Dependency to get the current authenticated user from a JWT bearer
+    token or an X-API-Key header.
+    
+    The user is served from a short-lived in-process cache, so most
+    requests do not query the database for authentication.
     
     Args:
+        request: Incoming request (client IP and path, for API keys)
         credentials: HTTP Authorization credentials
+        api_key: API key header value
         db: Database session
         
     Returns:
-        Current authenticated User object
+        Snapshot of the current authenticated user
         
     Raises:
-        HTTPException: If token is invalid or user not found
+        HTTPException: If token or key is invalid or user not found
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -112,19 +381,25 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    token = credentials.credentials
-    payload = decode_access_token(token)
-    
-    if payload is None:
-        raise credentials_exception
-    
-    username: str = payload.get("sub")
-    if username is None:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise credentials_exception
+    if api_key:
+        user = authenticate_api_key(db, api_key, request)
+    else:
+        if credentials is None:
+            raise credentials_exception
+        
+        token = credentials.credentials
+        payload = decode_access_token(token)
+        
+        if payload is None:
+            raise credentials_exception
+        
+        username: str = payload.get("sub")
+        if username is None:
+            raise credentials_exception
+        
+        user = _auth_users.get_or_load(username, lambda: _load_auth_user(db, username))
+        if user is None:
+            raise credentials_exception
     
     if not user.is_active:
         raise HTTPException(
@@ -136,8 +411,8 @@ def get_current_user(
 
 
 def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: AuthUser = Depends(get_current_user)
+) -> AuthUser:
     """
     Dependency to get the current active user.
     
@@ -145,7 +420,7 @@ def get_current_active_user(
         current_user: Current user from get_current_user dependency
         
     Returns:
-        Current active User object
+        Current active user snapshot
         
     Raises:
         HTTPException: If user is inactive
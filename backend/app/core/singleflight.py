@@ -0,0 +1,81 @@
+"""
+Single-flight call coalescing.
+Concurrent callers asking for the same key share one in-flight execution.
+"""
+import copy
+import threading
+from typing import Any, Callable, Dict
+
+
+class _Call:
+    """An in-flight call that followers wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into a single execution.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running block and receive a copy of the leader's
+    result, or re-raise its exception. Nothing is cached after the call
+    completes, so results never go stale.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn() once per concurrent burst of callers with the same key.
+
+        Args:
+            key: Deduplication key (e.g. a prompt hash)
+            fn: Zero-argument callable producing the result
+
+        Returns:
+            The result of fn()
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        """Counts of executed and coalesced calls"""
+        with self._lock:
+            return {
+                "calls": self.executed + self.coalesced,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
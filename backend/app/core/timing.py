@@ -0,0 +1,142 @@
+"""
+Request timing: per-stage spans, per-route metrics and the Server-Timing header.
+
+Services wrap expensive steps in `with span("stage"):`. Each span is
+observed into a process-wide histogram and, when running inside a request,
+added to that request's stage breakdown, which TimingMiddleware returns as
+a Server-Timing header (visible in the browser devtools network panel).
+The middleware also records latency and status per route template.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import counter, gauge, histogram
+
+# Durations of all spans, by stage name
+stage_duration = histogram(
+    "lumiere_stage_duration_seconds",
+    "Duration of instrumented request stages",
+    label_names=("stage",)
+)
+request_duration = histogram(
+    "lumiere_http_request_duration_seconds",
+    "HTTP request latency by route template",
+    label_names=("method", "route")
+)
+requests_total = counter(
+    "lumiere_http_requests_total",
+    "HTTP requests by route template and status code",
+    label_names=("method", "route", "status")
+)
+request_errors = counter(
+    "lumiere_http_request_errors_total",
+    "HTTP requests answered with a 5xx status",
+    label_names=("method", "route")
+)
+
+started_at = time.time()
+gauge("lumiere_process_start_time_seconds", "Start time of the process (unix seconds)", fn=lambda: started_at)
+
+# Stage name -> accumulated seconds for the current request. Worker threads
+# started with run_in_threadpool inherit the context, so spans recorded
+# there land in the same dict.
+_request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stages", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a stage of the current request (repeated stages accumulate)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_duration.observe(elapsed, stage=name)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages[name] = stages.get(name, 0.0) + elapsed
+
+
+def current_stages() -> Dict[str, float]:
+    """Stage durations (seconds) recorded so far in the current request"""
+    return dict(_request_stages.get() or {})
+
+
+def stage_summary() -> Dict[str, Dict[str, Optional[float]]]:
+    """Aggregated count/mean/p50/p95/p99 (seconds) per stage since startup"""
+    return {key[0]: stage_duration.summary(stage=key[0]) for key in stage_duration.snapshot()}
+
+
+def request_totals() -> Dict[str, float]:
+    """Requests, 5xx errors and total latency (seconds) across all routes since startup"""
+    requests = errors = 0.0
+    for (_, _, status_code), value in requests_total.values().items():
+        requests += value
+        if status_code.startswith("5"):
+            errors += value
+    latency = sum(data["sum"] for data in request_duration.snapshot().values())
+    return {"requests": requests, "errors": errors, "latency_s": latency}
+
+
+def format_server_timing(stages: Dict[str, float], total: float) -> str:
+    """Server-Timing header value; durations in milliseconds"""
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware that collects the stage breakdown of each HTTP request
+    and adds it to the response as a Server-Timing header.
+
+    Written as plain ASGI rather than BaseHTTPMiddleware so the context
+    variable set here is visible to the endpoint and streaming responses
+    are not buffered.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages: Dict[str, float] = {}
+        token = _request_stages.set(stages)
+        start = time.perf_counter()
+        status_code = 500  # if the app fails before responding
+
+        async def send_with_timing(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if settings.SERVER_TIMING_HEADER:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", format_server_timing(stages, time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stages.reset(token)
+            self._record(scope, status_code, time.perf_counter() - start)
+
+    @staticmethod
+    def _record(scope: Scope, status_code: int, elapsed: float):
+        # The router stores the matched route in the scope; label by its
+        # template (/api/v1/data/{id}) to keep label cardinality bounded
+        route = scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        method = scope.get("method", "")
+        request_duration.observe(elapsed, method=method, route=path)
+        requests_total.inc(method=method, route=path, status=str(status_code))
+        if status_code >= 500:
+            request_errors.inc(method=method, route=path)
@@ -2,7 +2,7 @@
 Models package initialization.
 Import all models here for easy access and Alembic auto-generation.
 """
-from app.models.user import User, Role, UserRole, APIKey, PasswordReset
+from app.models.user import User, Role, UserRole, APIKey, PasswordReset, UserCounter
 from app.models.data_source import DataSource, DataSourceConfig
 from app.models.query import Query, QueryHistory, QueryResult, QueryMetric
 from app.models.agent import Agent, AgentRun, OrchestratorRun
@@ -12,7 +12,7 @@ from app.models.insight import Insight, PromptTemplate
 from app.models.dashboard import Dashboard, DashboardShare, Chart
 from app.models.workspace import Workspace, WorkspaceItem
 from app.models.export import Export, ScheduledReport
-from app.models.system import SystemLog, Notification, UsageCost, Alert, BusinessGlossary, AuditTrail
+from app.models.system import SystemLog, Notification, UsageCost, Alert, BusinessGlossary, AuditTrail, PlatformStatsSnapshot, StorageUsage
 
 __all__ = [
     # User models
@@ -21,6 +21,7 @@ __all__ = [
     "UserRole",
     "APIKey",
     "PasswordReset",
+    "UserCounter",
     # Data source models
     "DataSource",
     "DataSourceConfig",
@@ -61,5 +62,7 @@ __all__ = [
     "Alert",
     "BusinessGlossary",
     "AuditTrail",
+    "PlatformStatsSnapshot",
+    "StorageUsage",
 ]
 
@@ -19,7 +19,7 @@ class Query(Base):
     generated_sql = Column(Text)
     engine = Column(String, comment="Which agent/model generated SQL")
     data_source_id = Column(Integer, ForeignKey("data_sources.id"), comment="Which datasource executed on")
-    status = Column(String, default="pending", comment="pending, running, success, failed")
+    status = Column(String, default="pending", comment="pending, running, cancelling, success, refining, error, cancelled, timeout")
     started_at = Column(DateTime(timezone=True))
     finished_at = Column(DateTime(timezone=True))
     error_message = Column(Text)
@@ -48,7 +48,7 @@ class QueryHistory(Base):
     id = Column(Integer, primary_key=True, index=True)
     query_id = Column(Integer, ForeignKey("queries.id"), nullable=False)
     user_id = Column(Integer)
-    action = Column(String, comment="created, executed, edited, saved, shared")
+    action = Column(String, comment="created, executed, rejected, repaired, repair_failed, cancelled, timeout, refined, refine_failed, edited, saved, shared")
     details = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
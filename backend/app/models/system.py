@@ -1,7 +1,7 @@
 """
 System and monitoring related models.
 """
-from sqlalchemy import Boolean, Column, Integer, String, Text, DateTime, ForeignKey, Numeric
+from sqlalchemy import BigInteger, Boolean, Column, Date, Integer, String, Text, DateTime, ForeignKey, Numeric
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import JSON
@@ -110,3 +110,32 @@ class AuditTrail(Base):
     # Relationships
     user = relationship("User", back_populates="audit_trails")
 
+
+
+class PlatformStatsSnapshot(Base):
+    """Daily platform totals, refreshed by a background job for the admin dashboard."""
+    __tablename__ = "platform_stats_snapshots"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    snapshot_date = Column(Date, unique=True, nullable=False, index=True)
+    users_count = Column(Integer, nullable=False, default=0)
+    data_sources_count = Column(Integer, nullable=False, default=0)
+    conversations_count = Column(Integer, nullable=False, default=0)
+    queries_count = Column(Integer, nullable=False, default=0)
+    storage_bytes = Column(BigInteger, comment="NULL when unknown (backfilled days)")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class StorageUsage(Base):
+    """Bytes stored on disk per file, attributed to a user and data source."""
+    __tablename__ = "storage_usage"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    path = Column(String, unique=True, nullable=False, comment="File path relative to the working directory")
+    kind = Column(String, nullable=False, comment="upload, sample, columnar, exec_db, result_cache, export, vector_index, other")
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), index=True)
+    data_source_id = Column(Integer, ForeignKey("data_sources.id", ondelete="SET NULL"))
+    bytes = Column(BigInteger, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -27,7 +27,7 @@ class User(Base):
     
     # Relationships
     user_roles = relationship("UserRole", back_populates="user")
-    api_keys = relationship("APIKey", back_populates="user")
+    api_keys = relationship("APIKey", back_populates="user", cascade="all, delete-orphan")
     data_sources = relationship("DataSource", back_populates="owner")
     queries = relationship("Query", back_populates="user")
     orchestrator_runs = relationship("OrchestratorRun", back_populates="user")
@@ -80,9 +80,10 @@ class APIKey(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    key_hash = Column(String, nullable=False)
+    prefix = Column(String, unique=True, index=True, comment="Public key id, the first part of the key")
+    key_hash = Column(String, nullable=False, comment="HMAC-SHA256 of the secret part")
     name = Column(String)
-    allowed_ips = Column(Text)
+    allowed_ips = Column(Text, comment="Comma-separated IPs/CIDR networks (empty = any)")
     scopes = Column(Text, comment="Comma-separated scopes")
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -106,3 +107,14 @@ class PasswordReset(Base):
     # Relationships
     user = relationship("User", back_populates="password_resets")
 
+
+
+class UserCounter(Base):
+    """Maintained per-user object counts, adjusted on create/delete."""
+    __tablename__ = "user_counters"
+    
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    data_sources_count = Column(Integer, nullable=False, default=0, server_default="0")
+    conversations_count = Column(Integer, nullable=False, default=0, server_default="0")
+    queries_count = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -9,8 +9,9 @@ from app.core.database import get_db
 from app.core.security import (
     create_access_token,
     get_current_user,
-    verify_password,
-    hash_password
+    login_attempts,
+    AuthUser,
+    verify_password_async
 )
 from app.models.user import User
 from app.services.admin_service import AdminService
@@ -31,8 +32,8 @@ router = APIRouter(prefix="/admin", tags=["admin"])
 
 
 def get_current_admin(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: AuthUser = Depends(get_current_user)
+) -> AuthUser:
     """
     Dependency to verify current user is an admin.
     
@@ -40,7 +41,7 @@ def get_current_admin(
         current_user: Current authenticated user
         
     Returns:
-        User if admin
+        User snapshot if admin
         
     Raises:
         HTTPException: If user is not an admin
@@ -54,7 +55,7 @@ def get_current_admin(
 
 
 @router.post("/login", response_model=AdminTokenResponse)
-def admin_login(
+async def admin_login(
     login_data: AdminLogin,
     db: Session = Depends(get_db)
 ):
@@ -67,13 +68,20 @@ def admin_login(
     user = db.query(User).filter(User.username == login_data.username).first()
     
     if not user:
+        login_attempts.inc(result="failure")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid admin credentials"
         )
     
     # Verify password
-    if not verify_password(login_data.password, user.password_hash):
+    try:
+        verified = await verify_password_async(login_data.password, user.password_hash)
+    except HTTPException:
+        login_attempts.inc(result="rejected")
+        raise
+    if not verified:
+        login_attempts.inc(result="failure")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid admin credentials"
@@ -86,6 +94,8 @@ def admin_login(
             detail="Admin access required"
         )
     
+    login_attempts.inc(result="success")
+    
     # Create access token
     access_token = create_access_token(data={"sub": user.username})
     
@@ -102,7 +112,7 @@ def admin_login(
 @router.get("/stats", response_model=PlatformStats)
 def get_platform_stats(
     db: Session = Depends(get_db),
-    _admin: User = Depends(get_current_admin)
+    _admin: AuthUser = Depends(get_current_admin)
 ):
     """
     Get platform-wide statistics.
@@ -120,7 +130,7 @@ def get_users_list(
     search: Optional[str] = Query(None, description="Search by username or email"),
     is_active: Optional[bool] = Query(None, description="Filter by active status"),
     db: Session = Depends(get_db),
-    _admin: User = Depends(get_current_admin)
+    _admin: AuthUser = Depends(get_current_admin)
 ):
     """
     Get paginated list of users.
@@ -151,7 +161,7 @@ def get_users_list(
 def get_user_detail(
     user_id: int,
     db: Session = Depends(get_db),
-    _admin: User = Depends(get_current_admin)
+    _admin: AuthUser = Depends(get_current_admin)
 ):
     """
     Get detailed information about a specific user.
@@ -174,14 +184,14 @@ def update_user_status(
     user_id: int,
     status_update: UserStatusUpdate,
     db: Session = Depends(get_db),
-    _admin: User = Depends(get_current_admin)
+    admin: AuthUser = Depends(get_current_admin)
 ):
     """
     Update user active status (enable/disable).
     
     Allows admin to activate or deactivate user accounts.
     """
-    success = AdminService.update_user_status(db, user_id, status_update.is_active)
+    success = AdminService.update_user_status(db, user_id, status_update.is_active, actor_id=admin.id)
     
     if not success:
         raise HTTPException(
@@ -199,7 +209,7 @@ def update_user_status(
 def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
-    _admin: User = Depends(get_current_admin)
+    admin: AuthUser = Depends(get_current_admin)
 ):
     """
     Delete a user and all associated data.
@@ -207,7 +217,7 @@ def delete_user(
     Permanently removes user from the system.
     Admin users cannot be deleted through this endpoint.
     """
-    success = AdminService.delete_user(db, user_id)
+    success = AdminService.delete_user(db, user_id, actor_id=admin.id)
     
     if not success:
         raise HTTPException(
@@ -227,7 +237,7 @@ def get_activity_feed(
     page_size: int = Query(20, ge=1, le=100, description="Items per page"),
     activity_type: Optional[str] = Query(None, description="Filter by activity type"),
     db: Session = Depends(get_db),
-    _admin: User = Depends(get_current_admin)
+    _admin: AuthUser = Depends(get_current_admin)
 ):
     """
     Get recent platform activity feed.
@@ -252,7 +262,7 @@ def get_activity_feed(
 @router.get("/health", response_model=SystemHealth)
 def get_system_health(
     db: Session = Depends(get_db),
-    _admin: User = Depends(get_current_admin)
+    _admin: AuthUser = Depends(get_current_admin)
 ):
     """
     Get system health metrics.
@@ -267,7 +277,7 @@ def get_user_growth_analytics(
     period: str = Query("month", regex="^(day|week|month)$", description="Time period grouping"),
     days: int = Query(30, ge=1, le=365, description="Number of days to include"),
     db: Session = Depends(get_db),
-    _admin: User = Depends(get_current_admin)
+    _admin: AuthUser = Depends(get_current_admin)
 ):
     """
     Get user growth analytics data for charts.
@@ -3,13 +3,13 @@ AI Router - API endpoints for AI-powered query generation and execution.
 Handles natural language to SQL conversion and query history.
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query as QueryParam
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query as QueryParam
 from sqlalchemy.orm import Session
 from typing import Optional
 
+from app.core.admission import admission
 from app.core.database import get_db
-from app.core.security import get_current_user
-from app.models.user import User
+from app.core.security import get_current_user, AuthUser
 from app.services.query_service import QueryService
 from app.services.analysis_service import AnalysisService
 from app.schemas.ai_query import (
@@ -17,7 +17,10 @@ from app.schemas.ai_query import (
     AIQueryResponse,
     QueryHistoryResponse,
     QueryDetailResponse,
+    QueryCancelResponse,
     RerunQueryRequest,
+    SQLValidationRequest,
+    SQLValidationResponse,
 )
 from app.schemas.chart_insight import (
     ChartGenerationRequest,
@@ -43,7 +46,8 @@ def get_analysis_service(db: Session = Depends(get_db)) -> AnalysisService:
 @router.post("/query", response_model=AIQueryResponse, status_code=status.HTTP_201_CREATED)
 async def execute_ai_query(
     query_request: AIQueryRequest,
-    current_user: User = Depends(get_current_user),
+    http_request: Request,
+    current_user: AuthUser = Depends(admission("ai_query")),
     service: QueryService = Depends(get_query_service)
 ):
     """
@@ -59,6 +63,11 @@ async def execute_ai_query(
     - `data_source_id`: ID of the data source to query
     - `question`: Natural language question (e.g., "What were total sales by region?")
     - `execute`: Whether to execute the SQL (default: true)
+    - `approximate`: Estimate COUNT/SUM/AVG from a sample of large data
+      sources, with confidence intervals in `result.margins` (default: false)
+    - `exact_followup`: Then run the query exactly in the background; the
+      exact result replaces the estimate in GET /ai/query/{query_id}
+      (default: false)
     
     **Returns**:
     - Generated SQL query
@@ -66,6 +75,17 @@ async def execute_ai_query(
     - Query results (if executed)
     - Query ID for history
     
+    Execution stops with status "timeout" past the query time budget
+    ("error" past the memory budget), and "cancelled" if the client
+    disconnects or the run is cancelled with DELETE /ai/query/{query_id}/run.
+    SQL that fails validation or execution is sent back to the LLM with the
+    error for a corrected query (a few attempts, within a fixed deadline);
+    each attempt is recorded in the query's history.
+    
+    Approximate queries that cannot be estimated from a sample (MIN, MAX,
+    COUNT(DISTINCT), row listings) or whose data source has no sample run
+    exactly, with `result.approximate` false.
+    
     **Example**:
     ```json
     {
@@ -75,7 +95,33 @@ async def execute_ai_query(
     }
     ```
     """
-    return await service.execute_ai_query(query_request, current_user)
+    return await service.execute_ai_query(query_request, current_user, http_request)
+
+
+@router.post("/query/validate", response_model=SQLValidationResponse)
+async def validate_sql(
+    validation_request: SQLValidationRequest,
+    current_user: AuthUser = Depends(get_current_user),
+    service: QueryService = Depends(get_query_service)
+):
+    """
+    Validate SQL against a data source without running it.
+    
+    The same check runs on generated SQL before every execution: the
+    statement must be a single read-only SELECT over the source's columns,
+    and its estimated cost (from the query plan and column statistics)
+    must be within the limit.
+    
+    **Request Body**:
+    - `data_source_id`: ID of the data source
+    - `sql`: SQL to validate (table "data", alias "df")
+    
+    **Returns**:
+    - `is_valid` and the reason in `error` if not
+    - `suggested_fix`: the SQL with a LIMIT added, if the result could be
+      larger than the row limit
+    """
+    return await service.validate_sql(validation_request, current_user)
 
 
 @router.get("/queries", response_model=QueryHistoryResponse)
@@ -83,7 +129,7 @@ async def get_query_history(
     skip: int = QueryParam(0, ge=0, description="Number of records to skip"),
     limit: int = QueryParam(20, ge=1, le=100, description="Number of records to return"),
     data_source_id: Optional[int] = QueryParam(None, description="Filter by data source"),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     service: QueryService = Depends(get_query_service)
 ):
     """
@@ -109,7 +155,7 @@ async def get_query_history(
 @router.get("/query/{query_id}", response_model=QueryDetailResponse)
 async def get_query_detail(
     query_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     service: QueryService = Depends(get_query_service)
 ):
     """
@@ -128,7 +174,8 @@ async def get_query_detail(
 @router.post("/query/{query_id}/rerun", response_model=AIQueryResponse)
 async def rerun_query(
     query_id: int,
-    current_user: User = Depends(get_current_user),
+    http_request: Request,
+    current_user: AuthUser = Depends(admission("ai_query")),
     service: QueryService = Depends(get_query_service)
 ):
     """
@@ -141,13 +188,32 @@ async def rerun_query(
     - Fresh query results
     - New query ID (creates a new history entry)
     """
-    return await service.rerun_query(query_id, current_user)
+    return await service.rerun_query(query_id, current_user, http_request)
+
+
+@router.delete("/query/{query_id}/run", response_model=QueryCancelResponse, status_code=status.HTTP_202_ACCEPTED)
+async def cancel_query(
+    query_id: int,
+    current_user: AuthUser = Depends(get_current_user),
+    service: QueryService = Depends(get_query_service)
+):
+    """
+    Cancel a running query.
+    
+    **Path Parameters**:
+    - `query_id`: ID of the running query
+    
+    **Returns**:
+    - 202 Accepted; the query ends with status "cancelled"
+    - 409 if the query is not running
+    """
+    return service.cancel_query(query_id, current_user)
 
 
 @router.delete("/query/{query_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_query(
     query_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     service: QueryService = Depends(get_query_service)
 ):
     """
@@ -166,7 +232,7 @@ async def delete_query(
 @router.post("/chart", response_model=ChartGenerationResponse)
 async def generate_chart(
     request: ChartGenerationRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(admission("ai_chart")),
     service: AnalysisService = Depends(get_analysis_service)
 ):
     """
@@ -198,7 +264,7 @@ async def generate_chart(
 @router.post("/insight", response_model=InsightGenerationResponse)
 async def generate_insight(
     request: InsightGenerationRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(admission("ai_insight")),
     service: AnalysisService = Depends(get_analysis_service)
 ):
     """
@@ -0,0 +1,66 @@
+"""
+API Keys Router - Manage API keys for programmatic access.
+Keys are sent in the X-API-Key header; these endpoints require a JWT login.
+"""
+
+from typing import List
+
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.orm import Session
+
+from app.core.database import get_db
+from app.core.security import get_current_user, AuthUser
+from app.services.api_key_service import ApiKeyService
+from app.schemas.api_key import APIKeyCreate, APIKeyCreated, APIKeyOut
+
+
+router = APIRouter(prefix="/api-keys", tags=["API Keys"])
+
+
+def get_api_key_service(db: Session = Depends(get_db)) -> ApiKeyService:
+    """Dependency to get API key service instance"""
+    return ApiKeyService(db)
+
+
+@router.post("", response_model=APIKeyCreated, status_code=status.HTTP_201_CREATED)
+async def create_api_key(
+    data: APIKeyCreate,
+    current_user: AuthUser = Depends(get_current_user),
+    service: ApiKeyService = Depends(get_api_key_service)
+):
+    """
+    Create an API key.
+    
+    - **name**: Label for the key
+    - **scopes**: e.g. ["ai:read", "ai:write"], or ["*"] for all
+    - **allowed_ips**: Optional IPs/CIDR networks the key may be used from
+    
+    Returns:
+    - The key details and the full key. Store it now: it cannot be shown again.
+    """
+    return service.create_key(current_user, data)
+
+
+@router.get("", response_model=List[APIKeyOut])
+async def list_api_keys(
+    current_user: AuthUser = Depends(get_current_user),
+    service: ApiKeyService = Depends(get_api_key_service)
+):
+    """
+    List your API keys (without secrets).
+    """
+    return service.list_keys(current_user)
+
+
+@router.delete("/{key_id}", response_model=APIKeyOut)
+async def revoke_api_key(
+    key_id: int,
+    current_user: AuthUser = Depends(get_current_user),
+    service: ApiKeyService = Depends(get_api_key_service)
+):
+    """
+    Revoke an API key.
+    
+    - **key_id**: ID of the key
+    """
+    return service.revoke_key(current_user, key_id)
@@ -1,16 +1,16 @@
 """
 Authentication routes for login, register, and user info.
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
 from app.core.database import get_db
-from app.core.security import create_access_token, get_current_user
+from app.core.security import create_access_token, get_current_user, login_attempts, AuthUser
 from app.core.config import settings
+from app.core.event_sink import audit, system_log
 from app.schemas.user import UserCreate, UserLogin, UserOut, Token
-from app.services.user_service import create_user, authenticate_user, update_last_login
-from app.models.user import User
+from app.services.user_service import create_user, authenticate_user, update_last_login, get_user_by_id
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -27,12 +27,13 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     Returns:
         Created user object
     """
-    user = create_user(db, user_data)
+    user = await create_user(db, user_data)
+    audit("user_register", user_id=user.id, object_type="user", object_id=user.id, diff={"username": user.username})
     return user
 
 
 @router.post("/login", response_model=Token)
-async def login(credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(credentials: UserLogin, request: Request, db: Session = Depends(get_db)):
     """
     Login with username and password to get JWT token.
     
@@ -44,19 +45,30 @@ async def login(credentials: UserLogin, db: Session = Depends(get_db)):
         JWT access token
         
     Raises:
-        HTTPException: If credentials are invalid
+        HTTPException: If credentials are invalid, or 429 if the password
+            hashing pool is saturated
     """
-    user = authenticate_user(db, credentials.username, credentials.password)
+    try:
+        user = await authenticate_user(db, credentials.username, credentials.password)
+    except HTTPException:
+        login_attempts.inc(result="rejected")
+        raise
+    client_ip = request.client.host if request.client else None
     
     if not user:
+        login_attempts.inc(result="failure")
+        system_log("warn", "auth", "login_failed", details=credentials.username, ip_address=client_ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    login_attempts.inc(result="success")
+    
     # Update last login
     update_last_login(db, user.id)
+    system_log("info", "auth", "login", user_id=user.id, ip_address=client_ip)
     
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -69,15 +81,25 @@ async def login(credentials: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserOut)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(
+    current_user: AuthUser = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
     """
     Get current authenticated user information.
     
     Args:
         current_user: Current user from JWT token
+        db: Database session
         
     Returns:
         Current user object
     """
-    return current_user
+    user = get_user_by_id(db, current_user.id)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return user
 
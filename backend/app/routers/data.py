@@ -7,9 +7,9 @@ from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status,
 from sqlalchemy.orm import Session
 from typing import Optional
 
+from app.core.admission import admission
 from app.core.database import get_db
-from app.core.security import get_current_user
-from app.models.user import User
+from app.core.security import get_current_user, AuthUser
 from app.services.data_service import DataService
 from app.schemas.data_source import (
     CSVUploadResponse,
@@ -32,7 +32,7 @@ def get_data_service(db: Session = Depends(get_db)) -> DataService:
 async def upload_csv_file(
     file: UploadFile = File(..., description="CSV file to upload"),
     name: Optional[str] = Query(None, description="Custom name for the data source"),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(admission("data_upload")),
     service: DataService = Depends(get_data_service)
 ):
     """
@@ -52,7 +52,7 @@ async def get_data_sources(
     skip: int = Query(0, ge=0, description="Number of records to skip"),
     limit: int = Query(20, ge=1, le=100, description="Number of records to return"),
     source_type: Optional[str] = Query(None, description="Filter by source type (csv, database, api)"),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     service: DataService = Depends(get_data_service)
 ):
     """
@@ -76,7 +76,7 @@ async def get_data_sources(
 @router.get("/source/{data_source_id}", response_model=DataSourceResponse)
 async def get_data_source(
     data_source_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     service: DataService = Depends(get_data_service)
 ):
     """
@@ -94,7 +94,7 @@ async def get_data_source(
 async def update_data_source(
     data_source_id: int,
     update_data: DataSourceUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     service: DataService = Depends(get_data_service)
 ):
     """
@@ -116,7 +116,7 @@ async def update_data_source(
 @router.delete("/source/{data_source_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_data_source(
     data_source_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     service: DataService = Depends(get_data_service)
 ):
     """
@@ -136,7 +136,7 @@ async def preview_data_source(
     data_source_id: int,
     limit: int = Query(100, ge=1, le=1000, description="Number of rows to return"),
     offset: int = Query(0, ge=0, description="Number of rows to skip"),
-    current_user: User = Depends(get_current_user),
+    current_user: AuthUser = Depends(get_current_user),
     service: DataService = Depends(get_data_service)
 ):
     """
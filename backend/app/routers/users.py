@@ -5,10 +5,9 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
-from app.core.security import get_current_user
+from app.core.security import get_current_user, AuthUser
 from app.schemas.user import UserOut, UserUpdate
 from app.services.user_service import get_user_by_id, update_user
-from app.models.user import User
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -17,7 +16,7 @@ router = APIRouter(prefix="/users", tags=["Users"])
 async def get_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Get user profile by ID.
@@ -47,7 +46,7 @@ async def update_user_info(
     user_id: int,
     user_data: UserUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: AuthUser = Depends(get_current_user)
 ):
     """
     Update user information.
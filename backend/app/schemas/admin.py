@@ -2,7 +2,7 @@
 Admin-related Pydantic schemas for request/response validation.
 """
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 from pydantic import BaseModel, EmailStr
 
 
@@ -135,6 +135,7 @@ class SystemHealth(BaseModel):
     uptime: str  # e.g., "99.98%"
     last_backup: Optional[datetime] = None
     disk_usage: Optional[str] = None
+    cache_hit_ratios: Dict[str, float] = {}  # per in-process cache, since startup
 
 
 # Analytics
@@ -14,6 +14,11 @@ class QueryStatus(str, Enum):
     SUCCESS = "success"
     ERROR = "error"
     PENDING = "pending"
+    RUNNING = "running"
+    CANCELLING = "cancelling"
+    CANCELLED = "cancelled"
+    REFINING = "refining"  # approximate result stored, exact run pending
+    TIMEOUT = "timeout"
 
 
 # --- AI Query Request/Response Schemas ---
@@ -23,13 +28,23 @@ class AIQueryRequest(BaseModel):
     data_source_id: int = Field(..., description="ID of the data source to query")
     question: str = Field(..., min_length=5, max_length=500, description="Natural language question")
     execute: bool = Field(default=True, description="Whether to execute the generated SQL")
+    approximate: bool = Field(
+        default=False,
+        description="Estimate COUNT/SUM/AVG results from a sample of large data sources, with confidence intervals"
+    )
+    exact_followup: bool = Field(
+        default=False,
+        description="After an approximate result, run the query exactly in the background and replace the stored result"
+    )
     
     class Config:
         json_schema_extra = {
             "example": {
                 "data_source_id": 1,
                 "question": "What were the total sales by region?",
-                "execute": True
+                "execute": True,
+                "approximate": False,
+                "exact_followup": False
             }
         }
 
@@ -47,6 +62,14 @@ class QueryExecutionResult(BaseModel):
     rows: List[Dict[str, Any]]
     row_count: int
     execution_time_ms: float
+    approximate: bool = False
+    sample_rows: Optional[int] = None
+    population_rows: Optional[int] = None
+    confidence: Optional[float] = None
+    margins: Optional[Dict[str, List[Optional[float]]]] = Field(
+        default=None,
+        description="Per estimated column, the half-width of each row's confidence interval"
+    )
 
 
 class AIQueryResponse(BaseModel):
@@ -59,6 +82,7 @@ class AIQueryResponse(BaseModel):
     status: QueryStatus
     result: Optional[QueryExecutionResult] = None
     error: Optional[str] = None
+    refining: bool = Field(default=False, description="An exact run will replace the approximate result (see query detail)")
     created_at: datetime
     
     class Config:
@@ -110,6 +134,12 @@ class QueryDetailResponse(BaseModel):
         from_attributes = True
 
 
+class QueryCancelResponse(BaseModel):
+    """Response after requesting cancellation of a running query"""
+    query_id: int
+    status: QueryStatus
+
+
 # --- SQL Validation Schemas ---
 
 class SQLValidationRequest(BaseModel):
@@ -0,0 +1,47 @@
+"""
+Pydantic schemas for API key endpoints.
+"""
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
+
+from app.core.security import API_KEY_SCOPES, parse_networks
+
+
+class APIKeyCreate(BaseModel):
+    """Schema for creating an API key."""
+    name: str = Field(..., min_length=1, max_length=100)
+    scopes: List[str] = Field(..., min_length=1, description=f"Any of {', '.join(API_KEY_SCOPES)}, or '*' for all")
+    allowed_ips: List[str] = Field(default_factory=list, description="IPs or CIDR networks; empty allows any")
+    
+    @field_validator('scopes')
+    @classmethod
+    def validate_scopes(cls, v: List[str]) -> List[str]:
+        if "*" in v:
+            return list(API_KEY_SCOPES)
+        unknown = [scope for scope in v if scope not in API_KEY_SCOPES]
+        if unknown:
+            raise ValueError(f"Unknown scopes: {', '.join(unknown)}")
+        return sorted(set(v))
+    
+    @field_validator('allowed_ips')
+    @classmethod
+    def validate_allowed_ips(cls, v: List[str]) -> List[str]:
+        return [str(network) for network in parse_networks(",".join(v))]
+
+
+class APIKeyOut(BaseModel):
+    """Schema for API key output (the secret is never returned)."""
+    id: int
+    name: Optional[str] = None
+    prefix: Optional[str] = None
+    scopes: List[str]
+    allowed_ips: List[str]
+    is_active: bool
+    created_at: datetime
+    revoked_at: Optional[datetime] = None
+
+
+class APIKeyCreated(APIKeyOut):
+    """Schema returned once, at creation, with the full key."""
+    key: str
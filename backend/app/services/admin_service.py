@@ -1,20 +1,33 @@
 """
 Admin service for platform administration logic.
 """
-from datetime import datetime, timedelta
+import os
+import shutil
+import time
+from datetime import date, datetime, timedelta
 from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
-from app.models.user import User
+from app.core.config import settings
+from app.core.database import engine, POOL_SIZE, MAX_OVERFLOW
+from app.core.event_sink import audit
+from app.core.metrics import cache_hit_ratios
+from app.core.security import invalidate_user_cache
+from app.core.timing import request_totals, started_at
+
+from app.models.user import User, UserCounter
+from app.models.query import Query
 from app.models.data_source import DataSource
 from app.models.conversation import Conversation
-from app.models.system import AuditTrail
+from app.models.system import AuditTrail, PlatformStatsSnapshot
 from app.core.utils import mask_email, mask_phone, calculate_storage_size
 from app.schemas.admin import (
     UserListItem, UserDetail, ActivityItem, PlatformStats,
     SystemHealth, UserGrowthData
 )
+from app.services.storage_service import StorageService
 
 
 class AdminService:
@@ -25,72 +38,114 @@ class AdminService:
         """
         Get platform-wide statistics.
         
+        Totals come from the daily snapshot maintained by the platform
+        stats job (computed on the spot if there is none yet), so the cost
+        does not grow with the tables.
+        
         Args:
             db: Database session
             
         Returns:
             Platform statistics
         """
-        # Current counts
-        total_users = db.query(User).filter(User.is_admin == False).count()
-        total_data_sources = db.query(DataSource).count()
-        total_conversations = db.query(Conversation).count()
-        
-        # Calculate total storage (mock for now - TODO: implement real calculation)
-        total_storage_bytes = 523456789000  # ~487 GB
-        total_storage = calculate_storage_size(total_storage_bytes)
-        
-        # Calculate growth (last 30 days vs previous 30 days)
-        now = datetime.utcnow()
-        thirty_days_ago = now - timedelta(days=30)
-        sixty_days_ago = now - timedelta(days=60)
-        
-        # User growth
-        users_last_30 = db.query(User).filter(
-            User.created_at >= thirty_days_ago,
-            User.is_admin == False
-        ).count()
-        users_prev_30 = db.query(User).filter(
-            User.created_at >= sixty_days_ago,
-            User.created_at < thirty_days_ago,
-            User.is_admin == False
-        ).count()
-        user_growth = ((users_last_30 - users_prev_30) / users_prev_30 * 100) if users_prev_30 > 0 else 0
-        
-        # Data source growth
-        ds_last_30 = db.query(DataSource).filter(
-            DataSource.created_at >= thirty_days_ago
-        ).count()
-        ds_prev_30 = db.query(DataSource).filter(
-            DataSource.created_at >= sixty_days_ago,
-            DataSource.created_at < thirty_days_ago
-        ).count()
-        ds_growth = ((ds_last_30 - ds_prev_30) / ds_prev_30 * 100) if ds_prev_30 > 0 else 0
-        
-        # Conversation growth
-        conv_last_30 = db.query(Conversation).filter(
-            Conversation.created_at >= thirty_days_ago
-        ).count()
-        conv_prev_30 = db.query(Conversation).filter(
-            Conversation.created_at >= sixty_days_ago,
-            Conversation.created_at < thirty_days_ago
-        ).count()
-        conv_growth = ((conv_last_30 - conv_prev_30) / conv_prev_30 * 100) if conv_prev_30 > 0 else 0
-        
-        # Storage growth (mock)
-        storage_growth = 6.2
+        today = datetime.utcnow().date()
+        current = AdminService._snapshot_on_or_before(db, today)
+        if current is None:
+            current = AdminService.refresh_platform_stats(db)
+        
+        # Growth: items added in the last 30 days vs the 30 days before
+        past_30 = AdminService._snapshot_on_or_before(db, today - timedelta(days=30))
+        past_60 = AdminService._snapshot_on_or_before(db, today - timedelta(days=60))
+        
+        def growth(field: str) -> float:
+            if past_30 is None or past_60 is None:
+                return 0.0
+            added_last = getattr(current, field) - getattr(past_30, field)
+            added_prev = getattr(past_30, field) - getattr(past_60, field)
+            return round((added_last - added_prev) / added_prev * 100, 1) if added_prev > 0 else 0.0
+        
+        # Storage growth: change in total size over 30 days
+        storage_growth = 0.0
+        if past_30 is not None and past_30.storage_bytes and current.storage_bytes is not None:
+            storage_growth = round((current.storage_bytes - past_30.storage_bytes) / past_30.storage_bytes * 100, 1)
         
         return PlatformStats(
-            total_users=total_users,
-            total_data_sources=total_data_sources,
-            total_conversations=total_conversations,
-            total_storage=total_storage,
-            user_growth=round(user_growth, 1),
-            data_source_growth=round(ds_growth, 1),
-            conversation_growth=round(conv_growth, 1),
+            total_users=current.users_count,
+            total_data_sources=current.data_sources_count,
+            total_conversations=current.conversations_count,
+            total_storage=calculate_storage_size(current.storage_bytes or 0),
+            user_growth=growth("users_count"),
+            data_source_growth=growth("data_sources_count"),
+            conversation_growth=growth("conversations_count"),
             storage_growth=storage_growth
         )
     
+    @staticmethod
+    def _snapshot_on_or_before(db: Session, day: date) -> Optional[PlatformStatsSnapshot]:
+        return db.query(PlatformStatsSnapshot).filter(
+            PlatformStatsSnapshot.snapshot_date <= day
+        ).order_by(desc(PlatformStatsSnapshot.snapshot_date)).first()
+    
+    @staticmethod
+    def _count_totals(db: Session, before: Optional[datetime] = None) -> dict:
+        """Row totals in one round trip, optionally only rows created before a time"""
+        def total(model, *conditions):
+            if before is not None:
+                conditions += (model.created_at < before,)
+            return select(func.count()).select_from(model).where(*conditions).scalar_subquery()
+        
+        row = db.execute(select(
+            total(User, User.is_admin == False),
+            total(DataSource),
+            total(Conversation),
+            total(Query)
+        )).one()
+        return {
+            "users_count": row[0],
+            "data_sources_count": row[1],
+            "conversations_count": row[2],
+            "queries_count": row[3],
+        }
+    
+    @staticmethod
+    def refresh_platform_stats(db: Session) -> PlatformStatsSnapshot:
+        """
+        Upsert today's platform stats snapshot (run periodically).
+        
+        The reference days used for growth (30 and 60 days ago) are
+        backfilled from created_at when missing, so growth is available
+        right after deployment; their storage is unknown.
+        
+        Args:
+            db: Database session
+            
+        Returns:
+            Today's snapshot
+        """
+        today = datetime.utcnow().date()
+        
+        def upsert(day: date, values: dict, update: bool):
+            stmt = pg_insert(PlatformStatsSnapshot).values(snapshot_date=day, **values)
+            if update:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[PlatformStatsSnapshot.snapshot_date],
+                    set_={**values, "updated_at": func.now()}
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=[PlatformStatsSnapshot.snapshot_date])
+            db.execute(stmt)
+        
+        upsert(today, {**AdminService._count_totals(db), "storage_bytes": StorageService(db).total_bytes()}, update=True)
+        
+        for days in (30, 60):
+            day = today - timedelta(days=days)
+            if db.query(PlatformStatsSnapshot.id).filter(PlatformStatsSnapshot.snapshot_date == day).first() is None:
+                end_of_day = datetime.combine(day + timedelta(days=1), datetime.min.time())
+                upsert(day, {**AdminService._count_totals(db, before=end_of_day), "storage_bytes": None}, update=False)
+        
+        db.commit()
+        return db.query(PlatformStatsSnapshot).filter(PlatformStatsSnapshot.snapshot_date == today).one()
+    
     @staticmethod
     def get_users_list(
         db: Session,
@@ -129,17 +184,19 @@ class AdminService:
         # Get total count
         total = query.count()
         
-        # Apply pagination
+        # Apply pagination; statistics come from the maintained counters in
+        # the same query (missing row = nothing created yet)
         offset = (page - 1) * page_size
-        users = query.order_by(desc(User.created_at)).offset(offset).limit(page_size).all()
+        rows = query.outerjoin(
+            UserCounter, UserCounter.user_id == User.id
+        ).add_columns(
+            UserCounter.data_sources_count,
+            UserCounter.conversations_count
+        ).order_by(desc(User.created_at)).offset(offset).limit(page_size).all()
         
         # Convert to response schema with masked data
         user_items = []
-        for user in users:
-            # Get user statistics
-            ds_count = db.query(DataSource).filter(DataSource.owner_id == user.id).count()
-            conv_count = db.query(Conversation).filter(Conversation.user_id == user.id).count()
-            
+        for user, ds_count, conv_count in rows:
             user_item = UserListItem(
                 id=user.id,
                 username=user.username,
@@ -150,8 +207,8 @@ class AdminService:
                 is_admin=user.is_admin,
                 created_at=user.created_at,
                 last_login_at=user.last_login_at,
-                data_sources_count=ds_count,
-                conversations_count=conv_count
+                data_sources_count=ds_count or 0,
+                conversations_count=conv_count or 0
             )
             user_items.append(user_item)
         
@@ -169,15 +226,23 @@ class AdminService:
         Returns:
             User detail or None if not found
         """
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
+        # User and exact statistics in one round trip (correlated counts)
+        def count_for(model, owner_column):
+            return select(func.count()).select_from(model).where(
+                owner_column == User.id
+            ).correlate(User).scalar_subquery()
+        
+        row = db.query(
+            User,
+            count_for(DataSource, DataSource.owner_user_id),
+            count_for(Conversation, Conversation.user_id),
+            count_for(Query, Query.user_id)
+        ).filter(User.id == user_id).first()
+        if not row:
             return None
         
-        # Get statistics
-        ds_count = db.query(DataSource).filter(DataSource.owner_id == user.id).count()
-        conv_count = db.query(Conversation).filter(Conversation.user_id == user.id).count()
-        queries_count = 0  # TODO: implement when Query model is used
-        total_storage = "0 B"  # TODO: implement real calculation
+        user, ds_count, conv_count, queries_count = row
+        total_storage = calculate_storage_size(StorageService(db).user_bytes(user.id))
         
         return UserDetail(
             id=user.id,
@@ -199,7 +264,7 @@ class AdminService:
         )
     
     @staticmethod
-    def update_user_status(db: Session, user_id: int, is_active: bool) -> bool:
+    def update_user_status(db: Session, user_id: int, is_active: bool, actor_id: Optional[int] = None) -> bool:
         """
         Update user active status (enable/disable).
         
@@ -207,6 +272,7 @@ class AdminService:
             db: Database session
             user_id: User ID
             is_active: New active status
+            actor_id: Admin performing the change (for the audit trail)
             
         Returns:
             True if updated, False if user not found
@@ -215,22 +281,31 @@ class AdminService:
         if not user:
             return False
         
+        previous = user.is_active
         user.is_active = is_active
         user.updated_at = datetime.utcnow()
         db.commit()
-        
-        # TODO: Log this action in audit trail
+        invalidate_user_cache(user_id)
+        
+        audit(
+            "user_activate" if is_active else "user_deactivate",
+            user_id=actor_id,
+            object_type="user",
+            object_id=user_id,
+            diff={"username": user.username, "is_active": [previous, is_active]}
+        )
         
         return True
     
     @staticmethod
-    def delete_user(db: Session, user_id: int) -> bool:
+    def delete_user(db: Session, user_id: int, actor_id: Optional[int] = None) -> bool:
         """
         Delete a user and all associated data.
         
         Args:
             db: Database session
             user_id: User ID
+            actor_id: Admin performing the deletion (for the audit trail)
             
         Returns:
             True if deleted, False if user not found
@@ -239,11 +314,20 @@ class AdminService:
         if not user or user.is_admin:  # Prevent deleting admin users
             return False
         
+        username = user.username
+        
         # Delete user (cascade will handle related data)
         db.delete(user)
         db.commit()
-        
-        # TODO: Log this action in audit trail
+        invalidate_user_cache(user_id)
+        
+        audit(
+            "user_delete",
+            user_id=actor_id,
+            object_type="user",
+            object_id=user_id,
+            diff={"username": username}
+        )
         
         return True
     
@@ -284,10 +368,10 @@ class AdminService:
             action = activity.action.lower()
             if 'register' in action or 'signup' in action:
                 activity_type = 'user_register'
-                description = f"New user registered: {activity.details.get('username', 'Unknown')}" if activity.details else "New user registered"
+                description = f"New user registered: {activity.diff.get('username', 'Unknown')}" if activity.diff else "New user registered"
             elif 'upload' in action or 'create' in action and 'data' in action:
                 activity_type = 'data_upload'
-                description = f"User {activity.details.get('username', 'Unknown')} uploaded data" if activity.details else "Data uploaded"
+                description = f"User {activity.diff.get('username', 'Unknown')} uploaded data" if activity.diff else "Data uploaded"
             else:
                 activity_type = 'system'
                 description = activity.action
@@ -297,9 +381,9 @@ class AdminService:
                 type=activity_type,
                 description=description,
                 user_id=activity.user_id,
-                username=activity.details.get('username') if activity.details else None,
+                username=activity.diff.get('username') if activity.diff else None,
                 timestamp=activity.created_at,
-                metadata=activity.details
+                metadata=activity.diff
             )
             activities.append(activity_item)
         
@@ -318,23 +402,56 @@ class AdminService:
         """
         # Check database connectivity
         try:
-            db.execute("SELECT 1")
+            db.execute(text("SELECT 1"))
             db_status = "healthy"
-        except:
+        except Exception:
             db_status = "down"
         
-        # TODO: Implement real metrics
-        # For now, return mock data
+        # Pool exhaustion makes requests queue for a connection
+        if db_status == "healthy" and engine.pool.checkedout() >= POOL_SIZE + MAX_OVERFLOW:
+            db_status = "degraded"
+        
+        # Request metrics recorded by TimingMiddleware since startup
+        totals = request_totals()
+        error_rate = totals["errors"] / totals["requests"] * 100 if totals["requests"] else 0.0
+        avg_ms = totals["latency_s"] / totals["requests"] * 1000 if totals["requests"] else 0.0
+        
+        if db_status == "down":
+            api_status = "down"
+        elif db_status == "degraded" or error_rate >= 1.0:
+            api_status = "degraded"
+        else:
+            api_status = "healthy"
+        
+        try:
+            disk = shutil.disk_usage(settings.UPLOAD_DIR if os.path.isdir(settings.UPLOAD_DIR) else ".")
+            disk_usage = f"{disk.used / disk.total * 100:.0f}%"
+        except OSError:
+            disk_usage = None
+        
         return SystemHealth(
-            api_status="healthy",
+            api_status=api_status,
             database_status=db_status,
-            error_rate="0.02%",
-            avg_response_time="245ms",
-            uptime="99.98%",
-            last_backup=datetime.utcnow() - timedelta(hours=6),
-            disk_usage="45%"
+            error_rate=f"{error_rate:.2f}%",
+            avg_response_time=f"{avg_ms:.0f}ms",
+            uptime=AdminService._format_duration(time.time() - started_at),
+            last_backup=None,  # backups are not managed by the application
+            disk_usage=disk_usage,
+            cache_hit_ratios={cache: round(ratio, 4) for cache, ratio in cache_hit_ratios().items()}
         )
     
+    @staticmethod
+    def _format_duration(seconds: float) -> str:
+        """Human-readable duration, e.g. "3d 4h 12m" """
+        minutes, _ = divmod(int(seconds), 60)
+        hours, minutes = divmod(minutes, 60)
+        days, hours = divmod(hours, 24)
+        if days:
+            return f"{days}d {hours}h {minutes}m"
+        if hours:
+            return f"{hours}h {minutes}m"
+        return f"{minutes}m"
+    
     @staticmethod
     def get_user_growth_data(
         db: Session,
@@ -374,10 +491,10 @@ class AdminService:
             User.is_admin == False
         ).count()
         
-        for date, new_users in growth_data:
+        for day, new_users in growth_data:
             cumulative_count += new_users
             result.append(UserGrowthData(
-                date=date.strftime('%Y-%m-%d'),
+                date=day.strftime('%Y-%m-%d'),
                 count=cumulative_count,
                 new_users=new_users
             ))
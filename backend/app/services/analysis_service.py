@@ -3,15 +3,20 @@ Analysis Service - Chart and Insight generation from query results.
 Uses LLM to generate visualizations and insights.
 """
 
-import pandas as pd
+import math
 from typing import Dict, Any
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
 
+from app.core.timing import span
 from app.models.query import Query
 from app.models.data_source import DataSource
 from app.models.user import User
 from app.services.llm_service import LLMService
+from app.services.llm_dispatcher import LLMRateLimitError
+from app.services.rollups import execute_on_source
+from app.services.usage_service import track_usage, record_query_metric
 from app.schemas.chart_insight import (
     ChartConfig,
     ChartDataset,
@@ -42,6 +47,8 @@ class AnalysisService:
         Returns:
             ChartGenerationResponse with Chart.js config
         """
+        usage = track_usage()
+        
         # Get query
         query = self.db.query(Query).filter(
             Query.id == query_id,
@@ -54,7 +61,7 @@ class AnalysisService:
                 detail="Query not found"
             )
         
-        if query.status != "success":
+        if query.status not in ("success", "refining"):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Can only generate charts for successful queries"
@@ -74,17 +81,15 @@ class AnalysisService:
         
         # Load data and execute SQL
         try:
-            df = pd.read_csv(data_source.connection_string)
-            from pandasql import sqldf
-            data = df
-            result_df = sqldf(query.sql_query, locals())
+            result_df = await run_in_threadpool(execute_on_source, data_source.connection_string, query.sql_query)
             
             # Convert to dict format
-            query_results = {
-                "columns": result_df.columns.tolist(),
-                "rows": result_df.to_dict('records'),
-                "row_count": len(result_df)
-            }
+            with span("serialize"):
+                query_results = {
+                    "columns": result_df.columns.tolist(),
+                    "rows": result_df.to_dict('records'),
+                    "row_count": len(result_df)
+                }
             
         except Exception as e:
             raise HTTPException(
@@ -92,12 +97,15 @@ class AnalysisService:
                 detail=f"Failed to execute query: {str(e)}"
             )
         
-        # Generate chart config using LLM
+        # Generate chart config using LLM (in a worker thread so viewers of
+        # the same query can share one in-flight call)
         try:
-            chart_config_raw = self.llm_service.generate_chart_config(
+            chart_config_raw = await run_in_threadpool(
+                self.llm_service.generate_chart_config,
                 question=query.question,
                 sql=query.sql_query,
-                query_results=query_results
+                query_results=query_results,
+                user_id=user.id
             )
             
             # Parse into ChartConfig schema
@@ -118,12 +126,20 @@ class AnalysisService:
                 explanation=chart_config_raw.get("explanation", "")
             )
             
+        except LLMRateLimitError as e:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=str(e),
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to generate chart: {str(e)}"
             )
         
+        record_query_metric(query.id, usage)
+        
         return ChartGenerationResponse(
             query_id=query.id,
             config=chart_config,
@@ -145,6 +161,8 @@ class AnalysisService:
         Returns:
             InsightGenerationResponse with insights
         """
+        usage = track_usage()
+        
         # Get query
         query = self.db.query(Query).filter(
             Query.id == query_id,
@@ -157,7 +175,7 @@ class AnalysisService:
                 detail="Query not found"
             )
         
-        if query.status != "success":
+        if query.status not in ("success", "refining"):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Can only generate insights for successful queries"
@@ -176,17 +194,15 @@ class AnalysisService:
         
         # Load data and execute SQL
         try:
-            df = pd.read_csv(data_source.connection_string)
-            from pandasql import sqldf
-            data = df
-            result_df = sqldf(query.sql_query, locals())
+            result_df = await run_in_threadpool(execute_on_source, data_source.connection_string, query.sql_query)
             
             # Convert to dict format
-            query_results = {
-                "columns": result_df.columns.tolist(),
-                "rows": result_df.to_dict('records'),
-                "row_count": len(result_df)
-            }
+            with span("serialize"):
+                query_results = {
+                    "columns": result_df.columns.tolist(),
+                    "rows": result_df.to_dict('records'),
+                    "row_count": len(result_df)
+                }
             
         except Exception as e:
             raise HTTPException(
@@ -194,20 +210,31 @@ class AnalysisService:
                 detail=f"Failed to execute query: {str(e)}"
             )
         
-        # Generate insights using LLM
+        # Generate insights using LLM (in a worker thread so viewers of
+        # the same query can share one in-flight call)
         try:
-            insight_text = self.llm_service.generate_insight(
+            insight_text = await run_in_threadpool(
+                self.llm_service.generate_insight,
                 question=query.question,
                 sql=query.sql_query,
-                query_results=query_results
+                query_results=query_results,
+                user_id=user.id
             )
             
+        except LLMRateLimitError as e:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=str(e),
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to generate insights: {str(e)}"
             )
         
+        record_query_metric(query.id, usage)
+        
         return InsightGenerationResponse(
             query_id=query.id,
             insight_text=insight_text,
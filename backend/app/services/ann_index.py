@@ -0,0 +1,248 @@
+"""
+ANN Index - Approximate nearest neighbour search over a VectorStore.
+Inverted file (IVF) index: vectors are bucketed by their nearest k-means
+centroid and a query only scans the `nprobe` closest buckets.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.vector_store import VectorStore, get_vector_store
+
+
+class IVFIndex:
+    """
+    Inverted file index over the rows of a VectorStore.
+
+    The index stores row positions only; vectors stay in the store's
+    matrix. Recall/latency is traded with `nlist` (number of buckets,
+    fixed at training) and `nprobe` (buckets scanned per query).
+    """
+
+    def __init__(self, store: VectorStore, nlist: int = 0, nprobe: Optional[int] = None):
+        self.store = store
+        self.nlist = nlist or settings.VECTOR_ANN_NLIST
+        self.nprobe = nprobe or settings.VECTOR_ANN_NPROBE
+        self._path = os.path.join(store.directory, f"{store.name}.ivf.npz")
+
+        self._lock = threading.RLock()
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments = np.empty(0, dtype=np.int32)  # list id per indexed row
+        self._lists: List[np.ndarray] = []
+        self._pending: List[List[np.ndarray]] = []
+
+        self._load()
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    @property
+    def indexed_rows(self) -> int:
+        return len(self._assignments)
+
+    def _load(self):
+        """Load centroids and assignments saved by a previous build"""
+        if not os.path.exists(self._path):
+            return
+
+        data = np.load(self._path)
+        centroids = data["centroids"]
+        assignments = data["assignments"]
+        if centroids.shape[1] != self.store.dim or len(assignments) > self.store.row_count:
+            # Stale index (store was rebuilt underneath it); ignore
+            return
+
+        self._centroids = centroids
+        self.nlist = len(centroids)
+        self._set_assignments(assignments)
+
+    def save(self):
+        """Persist centroids and row assignments next to the store"""
+        with self._lock:
+            if self._centroids is None:
+                return
+            tmp_path = f"{self._path}.tmp.npz"
+            np.savez(tmp_path, centroids=self._centroids, assignments=self._assignments)
+            os.replace(tmp_path, self._path)
+
+    def _set_assignments(self, assignments: np.ndarray):
+        """Rebuild the inverted lists from a full assignment array"""
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(assignments[order], np.arange(self.nlist + 1))
+        self._assignments = assignments.astype(np.int32)
+        self._lists = [order[bounds[i]:bounds[i + 1]].astype(np.int64) for i in range(self.nlist)]
+        self._pending = [[] for _ in range(self.nlist)]
+
+    def _assign(self, start: int, end: int) -> np.ndarray:
+        """Nearest-centroid list id for store rows [start, end)"""
+        matrix = self.store.matrix
+        chunk_rows = settings.VECTOR_SEARCH_CHUNK_ROWS
+        out = np.empty(end - start, dtype=np.int32)
+        for lo in range(start, end, chunk_rows):
+            hi = min(lo + chunk_rows, end)
+            out[lo - start:hi - start] = np.argmax(matrix[lo:hi] @ self._centroids.T, axis=1)
+        return out
+
+    def train(self, sample_size: Optional[int] = None, iterations: int = 20, seed: int = 0):
+        """
+        Train centroids with spherical k-means on a sample and (re)assign
+        every row of the store. This is the offline full rebuild.
+        """
+        sample_size = sample_size or settings.VECTOR_ANN_TRAIN_SAMPLE
+        rng = np.random.default_rng(seed)
+
+        with self._lock:
+            count = self.store.row_count
+            alive = np.setdiff1d(np.arange(count), self.store.deleted_rows)
+            if len(alive) == 0:
+                return
+
+            nlist = self.nlist or max(1, int(4 * np.sqrt(len(alive))))
+            nlist = min(nlist, len(alive))
+            sample_rows = np.sort(rng.choice(alive, size=min(sample_size, len(alive)), replace=False))
+            sample = np.asarray(self.store.matrix[sample_rows])
+
+            centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+            for _ in range(iterations):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                counts = np.bincount(labels, minlength=nlist)
+
+                # Re-seed empty clusters from random sample points
+                empty = counts == 0
+                if empty.any():
+                    sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+
+                norms = np.linalg.norm(sums, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                centroids = (sums / norms).astype(np.float32)
+
+            self._centroids = centroids
+            self.nlist = nlist
+            self._set_assignments(self._assign(0, count))
+            self.save()
+
+    def sync(self) -> int:
+        """
+        Incrementally assign store rows appended since the last build.
+
+        Centroids are kept as-is; retrain() when the data drifts far from
+        the trained distribution.
+
+        Returns:
+            Number of rows added to the index
+        """
+        with self._lock:
+            if self._centroids is None:
+                return 0
+
+            start = len(self._assignments)
+            end = self.store.row_count
+            if end <= start:
+                return 0
+
+            labels = self._assign(start, end)
+            rows = np.arange(start, end, dtype=np.int64)
+            order = np.argsort(labels, kind="stable")
+            bounds = np.searchsorted(labels[order], np.arange(self.nlist + 1))
+            for list_id in range(self.nlist):
+                members = rows[order[bounds[list_id]:bounds[list_id + 1]]]
+                if len(members):
+                    self._pending[list_id].append(members)
+
+            self._assignments = np.concatenate([self._assignments, labels])
+            self.save()
+            return end - start
+
+    def compact(self):
+        """Compact the underlying store and remap the inverted lists"""
+        with self._lock:
+            mapping = self.store.compact()
+            if self._centroids is None:
+                return
+
+            indexed = len(self._assignments)
+            keep = mapping[:indexed] >= 0
+            self._set_assignments(self._assignments[keep])
+            self.save()
+
+    def _list_rows(self, list_id: int) -> np.ndarray:
+        """Rows in one inverted list, folding in pending appends"""
+        if self._pending[list_id]:
+            self._lists[list_id] = np.concatenate([self._lists[list_id], *self._pending[list_id]])
+            self._pending[list_id] = []
+        return self._lists[list_id]
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        nprobe: Optional[int] = None
+    ) -> List[List[Tuple[int, int, float]]]:
+        """
+        Approximate top-k cosine search.
+
+        Rows appended to the store but not yet synced into the index are
+        scanned exactly, so fresh documents are always searchable.
+
+        Returns:
+            Same format as VectorStore.search
+        """
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.store.dim)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        # Only the index's own state is read under the lock; candidate
+        # scoring runs outside it so syncs and other searches are not blocked
+        with self._lock:
+            probe_scores = queries @ self._centroids.T
+            probes = np.argpartition(-probe_scores, nprobe - 1, axis=1)[:, :nprobe]
+            lists = {int(l): self._list_rows(int(l)) for l in np.unique(probes)}
+            indexed = len(self._assignments)
+            count, matrix, ids, deleted = self.store.snapshot()
+        unindexed = np.arange(indexed, count, dtype=np.int64)
+
+        results = []
+        for q, query in enumerate(queries):
+            candidates = np.concatenate([lists[int(l)] for l in probes[q]] + [unindexed])
+            if len(deleted):
+                candidates = candidates[~np.isin(candidates, deleted, assume_unique=True)]
+            if len(candidates) == 0:
+                results.append([])
+                continue
+
+            candidates.sort()  # sequential reads from the memmap
+            scores = matrix[candidates] @ query
+            top_k = min(k, len(candidates))
+            top = np.argpartition(-scores, top_k - 1)[:top_k]
+            top = top[np.argsort(-scores[top])]
+            results.append([
+                (int(eid), int(did), float(score))
+                for (eid, did), score in zip(ids[candidates[top]], scores[top])
+                if did != VectorStore.DELETED  # removed after the snapshot
+            ])
+
+        return results
+
+
+# Process-wide indexes, one per embedding model
+_indexes: Dict[str, IVFIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_ann_index(model: str) -> IVFIndex:
+    """Get (or open) the shared IVF index for an embedding model"""
+    with _indexes_lock:
+        index = _indexes.get(model)
+        if index is None:
+            index = IVFIndex(get_vector_store(model))
+            _indexes[model] = index
+        return index
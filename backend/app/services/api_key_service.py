@@ -0,0 +1,108 @@
+"""
+API Key Service - Creating, listing and revoking API keys.
+Keys are verified in core.security; this service manages the rows.
+"""
+
+from datetime import datetime
+from typing import List
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from app.core.event_sink import audit
+from app.core.security import AuthUser, generate_api_key, invalidate_api_key
+from app.models.user import APIKey
+from app.schemas.api_key import APIKeyCreate, APIKeyCreated, APIKeyOut
+
+
+class ApiKeyService:
+    """Service for a user's API keys"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _to_out(api_key: APIKey) -> APIKeyOut:
+        return APIKeyOut(
+            id=api_key.id,
+            name=api_key.name,
+            prefix=api_key.prefix,
+            scopes=[s for s in (api_key.scopes or "").split(",") if s],
+            allowed_ips=[ip for ip in (api_key.allowed_ips or "").split(",") if ip],
+            is_active=bool(api_key.is_active) and api_key.revoked_at is None,
+            created_at=api_key.created_at,
+            revoked_at=api_key.revoked_at
+        )
+
+    def create_key(self, user: AuthUser, data: APIKeyCreate) -> APIKeyCreated:
+        """
+        Create an API key for the user.
+
+        Returns:
+            The key details, including the full key (only shown here)
+        """
+        key, prefix, key_hash = generate_api_key()
+        api_key = APIKey(
+            user_id=user.id,
+            prefix=prefix,
+            key_hash=key_hash,
+            name=data.name,
+            scopes=",".join(data.scopes),
+            allowed_ips=",".join(data.allowed_ips) or None,
+            is_active=True
+        )
+        self.db.add(api_key)
+        self.db.commit()
+        self.db.refresh(api_key)
+
+        audit(
+            "api_key_create",
+            user_id=user.id,
+            object_type="api_key",
+            object_id=api_key.id,
+            diff={"username": user.username, "name": data.name, "prefix": prefix, "scopes": data.scopes}
+        )
+
+        return APIKeyCreated(**self._to_out(api_key).model_dump(), key=key)
+
+    def list_keys(self, user: AuthUser) -> List[APIKeyOut]:
+        """List the user's API keys, newest first"""
+        keys = self.db.query(APIKey).filter(
+            APIKey.user_id == user.id
+        ).order_by(APIKey.created_at.desc()).all()
+        return [self._to_out(api_key) for api_key in keys]
+
+    def revoke_key(self, user: AuthUser, key_id: int) -> APIKeyOut:
+        """
+        Revoke one of the user's API keys.
+
+        Takes effect immediately in this process; other workers drop their
+        cached copy within API_KEY_CACHE_TTL_SECONDS.
+        """
+        api_key = self.db.query(APIKey).filter(
+            APIKey.id == key_id,
+            APIKey.user_id == user.id
+        ).first()
+        if not api_key:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="API key not found"
+            )
+
+        if api_key.revoked_at is None:
+            api_key.is_active = False
+            api_key.revoked_at = datetime.utcnow()
+            self.db.commit()
+            self.db.refresh(api_key)
+            if api_key.prefix:
+                invalidate_api_key(api_key.prefix)
+
+            audit(
+                "api_key_revoke",
+                user_id=user.id,
+                object_type="api_key",
+                object_id=api_key.id,
+                diff={"username": user.username, "prefix": api_key.prefix}
+            )
+
+        return self._to_out(api_key)
@@ -0,0 +1,89 @@
+"""
+Counter Service - Maintained per-user object counts.
+Counters are adjusted in the same transaction as the create/delete they
+track, so listings read one row per user instead of counting tables.
+"""
+
+from typing import Dict
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.conversation import Conversation
+from app.models.data_source import DataSource
+from app.models.query import Query
+from app.models.user import User, UserCounter
+
+
+# Counter name -> UserCounter column
+COUNTERS = {
+    "data_sources": "data_sources_count",
+    "conversations": "conversations_count",
+    "queries": "queries_count",
+}
+
+
+def adjust_user_counter(db: Session, user_id: int, counter: str, delta: int = 1) -> None:
+    """
+    Add `delta` to one of a user's counters (creating the row if needed).
+
+    Does not commit: call it before the commit of the change it counts so
+    both land in the same transaction.
+    """
+    column = COUNTERS[counter]
+    stmt = insert(UserCounter).values(user_id=user_id, **{column: max(delta, 0)})
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserCounter.user_id],
+        set_={
+            column: func.greatest(getattr(UserCounter, column) + delta, 0),
+            "updated_at": func.now(),
+        }
+    )
+    db.execute(stmt)
+
+
+def count_subqueries() -> Dict[str, object]:
+    """Grouped per-user count subqueries, keyed like COUNTERS"""
+    return {
+        "data_sources": select(
+            DataSource.owner_user_id.label("user_id"), func.count().label("n")
+        ).group_by(DataSource.owner_user_id).subquery(),
+        "conversations": select(
+            Conversation.user_id.label("user_id"), func.count().label("n")
+        ).group_by(Conversation.user_id).subquery(),
+        "queries": select(
+            Query.user_id.label("user_id"), func.count().label("n")
+        ).group_by(Query.user_id).subquery(),
+    }
+
+
+def rebuild_user_counters(db: Session) -> int:
+    """
+    Recompute every user's counters from the source tables in one
+    statement (grouped subqueries joined to users) and upsert them.
+    Use to repair drift, e.g. after bulk deletes outside the services.
+
+    Returns:
+        Number of users updated
+    """
+    subqueries = count_subqueries()
+    source = select(
+        User.id,
+        *[func.coalesce(sq.c.n, 0) for sq in subqueries.values()]
+    ).select_from(User)
+    for sq in subqueries.values():
+        source = source.outerjoin(sq, sq.c.user_id == User.id)
+
+    columns = ["user_id"] + [COUNTERS[name] for name in subqueries]
+    stmt = insert(UserCounter).from_select(columns, source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserCounter.user_id],
+        set_={
+            **{column: getattr(stmt.excluded, column) for column in columns[1:]},
+            "updated_at": func.now(),
+        }
+    )
+    result = db.execute(stmt)
+    db.commit()
+    return result.rowcount
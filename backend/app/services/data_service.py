@@ -9,6 +9,7 @@ import os
 from typing import Optional, List, Dict, Any, BinaryIO
 from sqlalchemy.orm import Session
 from fastapi import UploadFile, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 
 from app.models.data_source import DataSource
 from app.models.user import User
@@ -20,6 +21,12 @@ from app.schemas.data_source import (
     DataPreviewResponse,
 )
 from app.core.config import settings
+from app.core.event_sink import audit
+from app.core.timing import span
+from app.services.counter_service import adjust_user_counter
+from app.services.sampling import remove_sample, sample_bytes, sample_path, write_sample
+from app.services.storage_service import StorageService
+from app.services.table_profile import load_frame, store_profile
 
 
 class DataService:
@@ -70,8 +77,11 @@ class DataService:
                     detail="File is empty"
                 )
             
+            StorageService(self.db).check_quota(user.id, file_size)
+            
             # Parse CSV with pandas
-            df = pd.read_csv(io.BytesIO(contents))
+            with span("csv_parse"):
+                df = self._parse_csv(contents)
             
             if df.empty:
                 raise HTTPException(
@@ -83,6 +93,11 @@ class DataService:
             column_count = len(df.columns)
             columns = df.columns.tolist()
             
+            # Large uploads also get a sample for approximate queries; it counts too
+            extra_bytes = sample_bytes(file_size, row_count)
+            if extra_bytes:
+                StorageService(self.db).check_quota(user.id, file_size + extra_bytes)
+            
             # Get sample data (first 5 rows)
             sample_data = df.head(5).to_dict('records')
             
@@ -91,8 +106,12 @@ class DataService:
             file_path = os.path.join(self.upload_dir, filename)
             
             # Save file to disk
-            with open(file_path, 'wb') as f:
-                f.write(contents)
+            with span("file_write"):
+                with open(file_path, 'wb') as f:
+                    f.write(contents)
+            
+            # Profile and sample in a worker thread; both are pandas work on the whole file
+            sample_file = await run_in_threadpool(self._prepare_for_queries, file_path, df)
             
             # Create database record
             data_source = DataSource(
@@ -107,9 +126,23 @@ class DataService:
                 is_active=True
             )
             
-            self.db.add(data_source)
-            self.db.commit()
-            self.db.refresh(data_source)
+            with span("db"):
+                self.db.add(data_source)
+                self.db.flush()
+                adjust_user_counter(self.db, user.id, "data_sources", +1)
+                StorageService(self.db).record_file(file_path, "upload", user.id, data_source.id)
+                if sample_file:
+                    StorageService(self.db).record_file(sample_file, "sample", user.id, data_source.id)
+                self.db.commit()
+                self.db.refresh(data_source)
+            
+            audit(
+                "data_upload",
+                user_id=user.id,
+                object_type="data_source",
+                object_id=data_source.id,
+                diff={"username": user.username, "name": data_source.name, "rows": row_count, "bytes": file_size}
+            )
             
             return CSVUploadResponse(
                 id=data_source.id,
@@ -123,6 +156,8 @@ class DataService:
                 created_at=data_source.created_at
             )
             
+        except HTTPException:
+            raise
         except pd.errors.EmptyDataError:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -137,11 +172,30 @@ class DataService:
             # Clean up file if it was saved
             if 'file_path' in locals() and os.path.exists(file_path):
                 os.remove(file_path)
+                remove_sample(file_path)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error processing file: {str(e)}"
             )
     
+    @staticmethod
+    def _prepare_for_queries(file_path: str, df: pd.DataFrame) -> Optional[str]:
+        """
+        Warm the profile the AI query path uses instead of re-reading the
+        file, and write the sample for approximate queries on large uploads.
+        
+        Returns:
+            Path of the sample, if one was written
+        """
+        with span("csv_profile"):
+            store_profile(file_path, df)
+        with span("csv_sample"):
+            return write_sample(file_path, df)
+    
+    def _parse_csv(self, contents: bytes) -> pd.DataFrame:
+        """Parse uploaded CSV bytes into a DataFrame"""
+        return pd.read_csv(io.BytesIO(contents))
+    
     def get_data_sources(
         self,
         user: User,
@@ -237,11 +291,27 @@ class DataService:
                     os.remove(file_path)
                 except Exception as e:
                     print(f"Warning: Failed to delete file {file_path}: {e}")
+            try:
+                remove_sample(file_path)
+            except Exception as e:
+                print(f"Warning: Failed to delete sample of {file_path}: {e}")
         
         # Delete database record
         self.db.delete(data_source)
+        adjust_user_counter(self.db, user.id, "data_sources", -1)
+        if data_source.source_type == "csv" and data_source.connection_string:
+            StorageService(self.db).forget_file(data_source.connection_string)
+            StorageService(self.db).forget_file(sample_path(data_source.connection_string))
         self.db.commit()
         
+        audit(
+            "data_delete",
+            user_id=user.id,
+            object_type="data_source",
+            object_id=data_source_id,
+            diff={"username": user.username, "name": data_source.name}
+        )
+        
         return True
     
     def preview_data(
@@ -287,15 +357,16 @@ class DataService:
             )
         
         try:
-            # Read CSV with pandas
-            df = pd.read_csv(file_path)
+            # Read CSV with pandas (shared with the query path's cache)
+            df = load_frame(file_path)
             
             total_rows = len(df)
             columns = df.columns.tolist()
             
             # Apply offset and limit
-            df_slice = df.iloc[offset:offset + limit]
-            rows = df_slice.to_dict('records')
+            with span("serialize"):
+                df_slice = df.iloc[offset:offset + limit]
+                rows = df_slice.to_dict('records')
             
             return DataPreviewResponse(
                 columns=columns,
@@ -0,0 +1,266 @@
+"""
+LLM Dispatcher - Central admission and retry control for LLM API calls.
+Enforces requests/min and tokens/min budgets, serves interactive work
+ahead of reports and background jobs, round-robins between users within
+a priority, and retries rate-limited or transient failures with
+exponential backoff and jitter.
+"""
+
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, Hashable, Optional, Tuple
+
+import openai
+
+from app.core.config import settings
+from app.core.metrics import counter, gauge
+from app.core.rate_limit import TokenBucket
+
+
+class Priority(IntEnum):
+    """LLM call priority; lower values are served first"""
+    INTERACTIVE = 0
+    REPORT = 1
+    BACKGROUND = 2
+
+
+class LLMRateLimitError(Exception):
+    """LLM capacity exhausted; the caller should retry after `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Failures worth retrying: provider rate limits and transient server/network errors
+_RETRYABLE = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+class _Ticket:
+    """A caller waiting for admission."""
+
+    __slots__ = ("priority", "user_key", "tokens", "granted")
+
+    def __init__(self, priority: Priority, user_key: Hashable, tokens: int):
+        self.priority = priority
+        self.user_key = user_key
+        self.tokens = tokens
+        self.granted = False
+
+
+class LLMDispatcher:
+    """
+    Process-wide scheduler for LLM calls.
+
+    Callers block in submit() until their call is admitted. Admission takes
+    one request from the RPM bucket and the estimated tokens from the TPM
+    bucket; the estimate is corrected with the real usage afterwards.
+    Non-interactive work is only admitted while both buckets stay above a
+    reserve, so background jobs use spare capacity without crowding out
+    users.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        queue_timeout: float = 30.0,
+        interactive_reserve: float = 0.2
+    ):
+        self.requests = TokenBucket.per_minute(requests_per_minute)
+        self.tokens = TokenBucket.per_minute(tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+        self.interactive_reserve = interactive_reserve
+
+        self._cond = threading.Condition()
+        # priority -> user -> FIFO of tickets; user order rotates for fairness
+        self._queues: Dict[Priority, "OrderedDict[Hashable, Deque[_Ticket]]"] = {
+            p: OrderedDict() for p in Priority
+        }
+        self.stats = {"admitted": 0, "retried": 0, "rejected": 0, "queue_wait_s": 0.0}
+
+    @classmethod
+    def from_settings(cls) -> "LLMDispatcher":
+        return cls(
+            requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+            tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+            max_retries=settings.LLM_MAX_RETRIES,
+            backoff_base=settings.LLM_BACKOFF_BASE_SECONDS,
+            backoff_max=settings.LLM_BACKOFF_MAX_SECONDS,
+            queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS,
+            interactive_reserve=settings.LLM_INTERACTIVE_RESERVE,
+        )
+
+    # --- Queueing ---
+
+    def _next_ticket(self) -> Optional[_Ticket]:
+        """Head of the highest non-empty priority, rotating across users"""
+        for priority in Priority:
+            users = self._queues[priority]
+            if users:
+                return users[next(iter(users))][0]
+        return None
+
+    def _pop(self, ticket: _Ticket):
+        users = self._queues[ticket.priority]
+        queue = users[ticket.user_key]
+        queue.remove(ticket)
+        if queue:
+            users.move_to_end(ticket.user_key)  # next user's turn
+        else:
+            del users[ticket.user_key]
+
+    def _dispatch_locked(self) -> float:
+        """
+        Admit queued tickets while the buckets allow.
+
+        Returns:
+            Seconds until the head ticket could be admitted (0 if queue empty)
+        """
+        while True:
+            ticket = self._next_ticket()
+            if ticket is None:
+                return 0.0
+
+            reserve = 0.0 if ticket.priority == Priority.INTERACTIVE else self.interactive_reserve
+            request_reserve = reserve * self.requests.capacity
+            token_reserve = reserve * self.tokens.capacity
+
+            wait = max(
+                self.requests.wait_time(1, request_reserve),
+                self.tokens.wait_time(ticket.tokens, token_reserve)
+            )
+            if wait > 0:
+                return wait
+
+            self.requests.try_acquire(1)
+            self.tokens.charge(ticket.tokens)
+            ticket.granted = True
+            self._pop(ticket)
+            self.stats["admitted"] += 1
+            self._cond.notify_all()
+
+    def _acquire(self, priority: Priority, user_key: Hashable, tokens: int):
+        """Block until admitted or the queue timeout expires"""
+        ticket = _Ticket(priority, user_key, tokens)
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+
+        with self._cond:
+            self._queues[priority].setdefault(user_key, deque()).append(ticket)
+            while True:
+                wait = self._dispatch_locked()
+                if ticket.granted:
+                    self.stats["queue_wait_s"] += time.monotonic() - start
+                    return
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._pop(ticket)
+                    self.stats["rejected"] += 1
+                    self._cond.notify_all()
+                    raise LLMRateLimitError(
+                        "LLM capacity exhausted, please retry shortly",
+                        retry_after=max(wait, 1.0)
+                    )
+                self._cond.wait(timeout=min(wait or remaining, remaining))
+
+    # --- Execution ---
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, honouring a server Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    def submit(
+        self,
+        fn: Callable[[], Tuple[Any, int]],
+        priority: Priority = Priority.INTERACTIVE,
+        user_id: Optional[int] = None,
+        estimated_tokens: int = 1000
+    ) -> Any:
+        """
+        Run an LLM call under the rate limits.
+
+        Args:
+            fn: Performs the API call; returns (result, tokens actually used)
+            priority: Scheduling class
+            user_id: Caller for per-user fairness (None = shared system queue)
+            estimated_tokens: Prompt + expected completion tokens
+
+        Returns:
+            The result from fn
+
+        Raises:
+            LLMRateLimitError: Capacity stayed exhausted past the queue
+                timeout or through all retries
+        """
+        user_key = user_id if user_id is not None else "system"
+
+        for attempt in range(self.max_retries + 1):
+            self._acquire(priority, user_key, estimated_tokens)
+            try:
+                result, used_tokens = fn()
+            except _RETRYABLE as e:
+                # A provider 429 means our budgets are optimistic; charge an
+                # extra request so other callers slow down too
+                if isinstance(e, openai.RateLimitError):
+                    self.requests.charge(1)
+
+                if attempt == self.max_retries:
+                    if isinstance(e, openai.RateLimitError):
+                        raise LLMRateLimitError(
+                            "LLM provider rate limit reached, please retry shortly",
+                            retry_after=self._backoff(attempt, e) or 1.0
+                        )
+                    raise
+
+                self.stats["retried"] += 1
+                time.sleep(self._backoff(attempt, e))
+                continue
+
+            if used_tokens:
+                self.tokens.charge(used_tokens - estimated_tokens)
+            return result
+
+
+dispatcher = LLMDispatcher.from_settings()
+
+counter(
+    "lumiere_llm_dispatch_total",
+    "LLM dispatcher outcomes (admitted, retried, rejected)",
+    label_names=("outcome",),
+    fn=lambda: {(k,): dispatcher.stats[k] for k in ("admitted", "retried", "rejected")}
+)
+counter(
+    "lumiere_llm_queue_wait_seconds_total",
+    "Total time LLM calls spent waiting for admission",
+    fn=lambda: dispatcher.stats["queue_wait_s"]
+)
+gauge(
+    "lumiere_llm_budget_remaining",
+    "Current level of the LLM rate limit buckets",
+    label_names=("budget",),
+    fn=lambda: {("requests",): dispatcher.requests.tokens, ("tokens",): dispatcher.tokens.tokens}
+)
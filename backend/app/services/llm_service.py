@@ -3,25 +3,128 @@ LLM Service - Integration with OpenAI for AI-powered features.
 Handles SQL generation, chart configuration, and insight generation.
 """
 
+import hashlib
 import json
+import time
 from typing import Optional, Dict, Any, List
 from openai import OpenAI
 from app.core.config import settings
+from app.core.metrics import counter, histogram
+from app.core.singleflight import SingleFlight
+from app.core.timing import span
+from app.services.llm_dispatcher import dispatcher, Priority, LLMRateLimitError
+from app.services.usage_service import record_llm_call
+
+
+# Shared across LLMService instances (one is created per request), so
+# identical prompts from concurrent requests make a single API call
+_inflight = SingleFlight()
+
+llm_call_duration = histogram(
+    "lumiere_llm_call_duration_seconds",
+    "Latency of individual LLM API calls (each retry counts)",
+    label_names=("model", "outcome")
+)
+llm_tokens = counter(
+    "lumiere_llm_tokens_total",
+    "LLM tokens used, as reported by the API",
+    label_names=("model", "kind")
+)
+counter(
+    "lumiere_llm_coalesced_calls_total",
+    "LLM requests served by joining an identical in-flight call",
+    fn=lambda: _inflight.stats()["coalesced"]
+)
 
 
 class LLMService:
     """Service for interacting with OpenAI LLM"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=settings.OPENAI_API_KEY)
+        # Retries are handled by the dispatcher, which knows about the
+        # shared rate limits
+        self.client = OpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL or None,
+            max_retries=0
+        )
         self.model = "gpt-4o-mini"  # Using GPT-4 Turbo for better SQL generation
         self.temperature = 0.1  # Low temperature for more deterministic outputs
     
+    @staticmethod
+    def coalescing_stats() -> Dict[str, int]:
+        """Counts of executed vs coalesced (deduplicated) LLM calls"""
+        return _inflight.stats()
+    
+    def _complete(
+        self,
+        system_prompt: str,
+        prompt: str,
+        temperature: float,
+        json_mode: bool = False,
+        priority: Priority = Priority.INTERACTIVE,
+        user_id: Optional[int] = None
+    ) -> str:
+        """
+        Run a chat completion and return the message content.
+        
+        Concurrent calls with an identical request (same prompt hash) wait
+        on one in-flight API call and share its result. The call itself is
+        scheduled by the LLM dispatcher (rate limits, priority, retries).
+        """
+        request = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": temperature,
+        }
+        if json_mode:
+            request["response_format"] = {"type": "json_object"}
+        
+        key = hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+        
+        # Rough estimate (~4 chars per token) plus room for the completion;
+        # corrected with the real usage once the response arrives
+        estimated_tokens = (len(system_prompt) + len(prompt)) // 4 + 500
+        
+        def call():
+            start = time.perf_counter()
+            try:
+                response = self.client.chat.completions.create(**request)
+            except Exception:
+                llm_call_duration.observe(time.perf_counter() - start, model=self.model, outcome="error")
+                raise
+            llm_call_duration.observe(time.perf_counter() - start, model=self.model, outcome="ok")
+            
+            usage = response.usage
+            if usage:
+                llm_tokens.inc(usage.prompt_tokens, model=self.model, kind="prompt")
+                llm_tokens.inc(usage.completion_tokens, model=self.model, kind="completion")
+                record_llm_call(self.model, usage.prompt_tokens, usage.completion_tokens)
+            else:
+                record_llm_call(self.model, 0, 0)
+            return response.choices[0].message.content, usage.total_tokens if usage else 0
+        
+        with span("llm"):
+            return _inflight.do(
+                key,
+                lambda: dispatcher.submit(
+                    call,
+                    priority=priority,
+                    user_id=user_id,
+                    estimated_tokens=estimated_tokens
+                )
+            )
+    
     def generate_sql(
         self,
         question: str,
         table_schema: Dict[str, Any],
-        sample_data: List[Dict[str, Any]]
+        sample_data: List[Dict[str, Any]],
+        priority: Priority = Priority.INTERACTIVE,
+        user_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Generate SQL query from natural language question.
@@ -30,6 +133,8 @@ class LLMService:
             question: User's natural language question
             table_schema: Schema information (columns, types)
             sample_data: Sample rows from the data
+            priority: Scheduling priority for the LLM call
+            user_id: Requesting user, for per-user fairness
         
         Returns:
             Dict with 'sql', 'explanation', and 'confidence'
@@ -38,24 +143,17 @@ class LLMService:
         prompt = self._build_sql_prompt(question, table_schema, sample_data)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert SQL query generator. Generate SQL queries for pandas DataFrames using standard SQL syntax. Always return valid JSON."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
+            content = self._complete(
+                system_prompt="You are an expert SQL query generator. Generate SQL queries for pandas DataFrames using standard SQL syntax. Always return valid JSON.",
+                prompt=prompt,
                 temperature=self.temperature,
-                response_format={"type": "json_object"}
+                json_mode=True,
+                priority=priority,
+                user_id=user_id
             )
             
             # Parse response
-            result = json.loads(response.choices[0].message.content)
+            result = json.loads(content)
             
             return {
                 "sql": result.get("sql", ""),
@@ -63,6 +161,8 @@ class LLMService:
                 "confidence": result.get("confidence", 0.8)
             }
             
+        except LLMRateLimitError:
+            raise
         except Exception as e:
             raise Exception(f"LLM error: {str(e)}")
     
@@ -94,13 +194,13 @@ SAMPLE DATA (first 3 rows):
 
 USER QUESTION: "{question}"
 
-Generate a SQL query to answer this question. The query will be executed on a pandas DataFrame using pandasql, so use standard SQL syntax.
+Generate a SQL query to answer this question. The query runs on SQLite, with the dataset loaded as the table "data" (also available as "df"), so use SQLite syntax and functions.
 
 IMPORTANT RULES:
 1. Use "data" as the table name
-2. Column names must exactly match the schema (case-sensitive)
-3. Use standard SQL syntax (SELECT, FROM, WHERE, GROUP BY, ORDER BY, LIMIT, etc.)
-4. Do NOT use CTEs or window functions (not supported in pandasql)
+2. Column names must exactly match the schema (case-sensitive); quote names with spaces or symbols in double quotes
+3. Only a single read-only SELECT statement; CTEs (WITH) and window functions are supported
+4. Use SQLite functions (e.g. strftime for dates, CAST, COALESCE); there is no DATE_TRUNC, EXTRACT or ILIKE
 5. For aggregations, always use GROUP BY
 6. For filtering, use WHERE clause
 7. Keep queries simple and efficient
@@ -113,6 +213,109 @@ Return your response in JSON format:
 }}
 
 The confidence should be between 0.0 and 1.0 based on how certain you are that the query correctly answers the question.
+"""
+        return prompt
+    
+    def repair_sql(
+        self,
+        question: str,
+        table_schema: Dict[str, Any],
+        column_profiles: List[Dict[str, Any]],
+        failed_sql: str,
+        error: str,
+        priority: Priority = Priority.INTERACTIVE,
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate a corrected SQL query after a failed attempt.
+        
+        Args:
+            question: User's natural language question
+            table_schema: Schema information (columns, types)
+            column_profiles: Statistics of the columns involved in the error
+            failed_sql: The SQL that failed
+            error: The validation or SQLite error it failed with
+            priority: Scheduling priority for the LLM call
+            user_id: Requesting user, for per-user fairness
+        
+        Returns:
+            Dict with 'sql', 'explanation', and 'confidence'
+        """
+        prompt = self._build_repair_prompt(question, table_schema, column_profiles, failed_sql, error)
+        
+        try:
+            content = self._complete(
+                system_prompt="You are an expert SQL query generator. Fix SQL queries that failed on SQLite. Always return valid JSON.",
+                prompt=prompt,
+                temperature=self.temperature,
+                json_mode=True,
+                priority=priority,
+                user_id=user_id
+            )
+            
+            result = json.loads(content)
+            
+            return {
+                "sql": result.get("sql", ""),
+                "explanation": result.get("explanation", ""),
+                "confidence": result.get("confidence", 0.8)
+            }
+            
+        except LLMRateLimitError:
+            raise
+        except Exception as e:
+            raise Exception(f"LLM error: {str(e)}")
+    
+    def _build_repair_prompt(
+        self,
+        question: str,
+        table_schema: Dict[str, Any],
+        column_profiles: List[Dict[str, Any]],
+        failed_sql: str,
+        error: str
+    ) -> str:
+        """Build the SQL repair prompt"""
+        
+        column_types = table_schema.get("column_types", {})
+        column_list = ", ".join(f"{col} ({column_types.get(col, 'unknown')})" for col in table_schema.get("columns", []))
+        
+        profile_lines = "\n".join([
+            f"- {p['name']}: {p['type']}, {p['distinct']} distinct, {p['nulls']} nulls, e.g. {p['examples']}"
+            for p in column_profiles
+        ]) or "(none matched)"
+        
+        prompt = f"""
+Given a dataset with the following schema:
+
+TABLE: data ({table_schema.get("row_count", 0)} rows)
+COLUMNS: {column_list}
+
+USER QUESTION: "{question}"
+
+This SQL query was generated for the question but failed:
+{failed_sql}
+
+ERROR:
+{error}
+
+RELEVANT COLUMNS:
+{profile_lines}
+
+Write a corrected SQL query that answers the question. The query runs on SQLite, so use SQLite syntax and functions.
+
+IMPORTANT RULES:
+1. Use "data" as the table name
+2. Column names must exactly match the schema (case-sensitive); quote names with spaces or symbols in double quotes
+3. Only a single read-only SELECT statement
+4. Fix the cause of the error; keep the rest of the query's intent
+5. If the query was too expensive, avoid self-joins and correlated subqueries, and aggregate earlier
+
+Return your response in JSON format:
+{{
+  "sql": "SELECT ... FROM data ...",
+  "explanation": "Brief explanation of what the query does",
+  "confidence": 0.9
+}}
 """
         return prompt
     
@@ -120,7 +323,9 @@ The confidence should be between 0.0 and 1.0 based on how certain you are that t
         self,
         question: str,
         sql: str,
-        query_results: Dict[str, Any]
+        query_results: Dict[str, Any],
+        priority: Priority = Priority.INTERACTIVE,
+        user_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Generate chart configuration from query results.
@@ -129,6 +334,8 @@ The confidence should be between 0.0 and 1.0 based on how certain you are that t
             question: Original user question
             sql: The SQL query that was executed
             query_results: Results from query execution
+            priority: Scheduling priority for the LLM call
+            user_id: Requesting user, for per-user fairness
         
         Returns:
             Dict with Chart.js compatible configuration
@@ -136,25 +343,20 @@ The confidence should be between 0.0 and 1.0 based on how certain you are that t
         prompt = self._build_chart_prompt(question, sql, query_results)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert at data visualization. Generate Chart.js configurations that best represent the data."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
+            content = self._complete(
+                system_prompt="You are an expert at data visualization. Generate Chart.js configurations that best represent the data.",
+                prompt=prompt,
                 temperature=self.temperature,
-                response_format={"type": "json_object"}
+                json_mode=True,
+                priority=priority,
+                user_id=user_id
             )
             
-            result = json.loads(response.choices[0].message.content)
+            result = json.loads(content)
             return result
             
+        except LLMRateLimitError:
+            raise
         except Exception as e:
             raise Exception(f"Chart generation error: {str(e)}")
     
@@ -203,7 +405,9 @@ Return JSON:
         self,
         question: str,
         sql: str,
-        query_results: Dict[str, Any]
+        query_results: Dict[str, Any],
+        priority: Priority = Priority.INTERACTIVE,
+        user_id: Optional[int] = None
     ) -> str:
         """
         Generate textual insights from query results.
@@ -212,6 +416,8 @@ Return JSON:
             question: Original user question
             sql: The SQL query that was executed
             query_results: Results from query execution
+            priority: Scheduling priority for the LLM call
+            user_id: Requesting user, for per-user fairness
         
         Returns:
             Insight text
@@ -219,23 +425,16 @@ Return JSON:
         prompt = self._build_insight_prompt(question, sql, query_results)
         
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a data analyst. Provide clear, actionable insights from data analysis results."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.3  # Slightly higher for more creative insights
+            return self._complete(
+                system_prompt="You are a data analyst. Provide clear, actionable insights from data analysis results.",
+                prompt=prompt,
+                temperature=0.3,  # Slightly higher for more creative insights
+                priority=priority,
+                user_id=user_id
             )
             
-            return response.choices[0].message.content
-            
+        except LLMRateLimitError:
+            raise
         except Exception as e:
             raise Exception(f"Insight generation error: {str(e)}")
     
@@ -1,18 +1,43 @@
 """
 Query Service - Execute SQL queries on CSV data and manage query history.
-Uses pandasql to run SQL queries on pandas DataFrames.
+SQL runs on pandas DataFrames through the budgeted SQLite engine.
+Approximate queries are estimated from a sample of the source kept at
+upload; their results are stored, and an optional background exact run
+replaces them.
 """
 
+import asyncio
+import math
+import os
 import time
 import pandas as pd
-from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional, Set
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from fastapi import HTTPException, status
+from fastapi import HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
 
-from app.models.query import Query
+from app.core.admission import background_slot
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.event_sink import audit, query_history
+from app.core.metrics import counter
+from app.core.timing import span
+from app.models.query import Query, QueryHistory, QueryResult
 from app.models.data_source import DataSource
 from app.models.user import User
 from app.services.llm_service import LLMService
+from app.services.counter_service import adjust_user_counter
+from app.services.llm_dispatcher import LLMRateLimitError
+from app.services.rollups import RollupSet, cached_rollups
+from app.services.sampling import load_sample
+from app.services.sql_engine import QueryAborted, QueryRun, execute_sql, get_running, register_run
+from app.services.sql_fastpath import run_on_sample
+from app.services.sql_validator import SQLValidationError, validate_sql
+from app.services.table_profile import TableProfile, cached_profile, load_frame, store_profile
+from app.services.storage_service import StorageService
+from app.services.usage_service import track_usage, measure_resources, record_query_metric
 from app.schemas.ai_query import (
     AIQueryRequest,
     AIQueryResponse,
@@ -21,16 +46,150 @@ from app.schemas.ai_query import (
     QueryHistoryResponse,
     QueryHistoryItem,
     QueryDetailResponse,
+    QueryCancelResponse,
+    SQLValidationRequest,
+    SQLValidationResponse,
 )
 
 
-# Pandasql for SQL execution on DataFrames
-try:
-    from pandasql import sqldf
-except ImportError:
-    # Fallback if pandasql is not installed
-    sqldf = None
-    print("Warning: pandasql not installed. Install with: pip install pandasql")
+_repairs = counter(
+    "lumiere_sql_repair_total",
+    "Queries that went through the SQL repair loop, by final outcome",
+    label_names=("outcome",)
+)
+
+
+def _cancel_requested(query_id: int) -> bool:
+    """Whether a cancel was requested through another worker"""
+    db = SessionLocal()
+    try:
+        return db.query(Query.status).filter(Query.id == query_id).scalar() == "cancelling"
+    finally:
+        db.close()
+
+
+def _refine_cancelled(query_id: int) -> bool:
+    """Whether the query stopped refining (cancelled through another worker, or deleted)"""
+    db = SessionLocal()
+    try:
+        return db.query(Query.status).filter(Query.id == query_id).scalar() != "refining"
+    finally:
+        db.close()
+
+
+def expire_stale_queries(db: Session) -> int:
+    """
+    Finish queries left behind by a worker that stopped mid-run. Running
+    or cancelling queries started longer ago than a live run can take
+    (QUERY_REPAIR_DEADLINE_SECONDS, at least QUERY_TIMEOUT_SECONDS) plus
+    QUERY_STALE_MARGIN_SECONDS become errors; refining queries whose exact
+    run should have ended by then go back to "success" with their estimate.
+    
+    Returns:
+        Number of queries updated
+    """
+    now = datetime.utcnow()
+    margin = settings.QUERY_STALE_MARGIN_SECONDS
+    run_limit = max(settings.QUERY_TIMEOUT_SECONDS, settings.QUERY_REPAIR_DEADLINE_SECONDS) + margin
+    refine_limit = settings.APPROX_EXACT_QUEUE_SECONDS + settings.APPROX_EXACT_TIMEOUT_SECONDS + margin
+    
+    interrupted = db.execute(
+        update(Query)
+        .where(
+            Query.status.in_(("running", "cancelling")),
+            Query.started_at < now - timedelta(seconds=run_limit)
+        )
+        .values(status="error", error_message="Query was interrupted (its worker stopped)", finished_at=now)
+    ).rowcount
+    abandoned = db.execute(
+        update(Query)
+        .where(Query.status == "refining", Query.finished_at < now - timedelta(seconds=refine_limit))
+        .values(status="success")
+    ).rowcount
+    db.commit()
+    return interrupted + abandoned
+
+
+def _result_path(user_id: int, query_id: int) -> str:
+    return os.path.join(settings.UPLOAD_DIR, "results", f"user_{user_id}_query_{query_id}.json")
+
+
+def _store_result(db: Session, query_id: int, user_id: int, data_source_id: int, result: QueryExecutionResult):
+    """
+    Write a query's result to UPLOAD_DIR/results, replacing any earlier
+    one, and point its QueryResult row at it. Does not commit.
+    """
+    path = _result_path(user_id, query_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        f.write(result.model_dump_json())
+    os.replace(path + ".tmp", path)
+    
+    meta = {"row_count": result.row_count, "approximate": result.approximate}
+    stored = db.query(QueryResult).filter(QueryResult.query_id == query_id).first()
+    if stored is None:
+        db.add(QueryResult(query_id=query_id, result_location=path, result_meta=meta))
+    else:
+        stored.result_location = path
+        stored.result_meta = meta
+    StorageService(db).record_file(path, "result_cache", user_id, data_source_id)
+
+
+# Background exact runs, referenced until they finish
+_refinements: Set[asyncio.Task] = set()
+
+
+async def _refine_exact(query_id: int, user_id: int, data_source_id: int, path: str, sql_query: str):
+    """
+    Run an approximately answered query exactly and replace its stored
+    estimate. The run waits for one of the user's admission slots (up to
+    APPROX_EXACT_QUEUE_SECONDS) before loading any data. The query is
+    "refining" until it ends; cancelling it (DELETE /ai/query/{id}/run)
+    from any worker keeps the estimate.
+    """
+    db = SessionLocal()
+    try:
+        service = QueryService(db)
+        run = QueryRun(query_id=query_id, user_id=user_id, timeout=settings.APPROX_EXACT_TIMEOUT_SECONDS)
+        result = None
+        event, details = "refine_failed", None
+        try:
+            async with background_slot(user_id, "ai_query_refine", settings.APPROX_EXACT_QUEUE_SECONDS) as admitted:
+                if not admitted:
+                    details = "No admission slot became free"
+                elif await run_in_threadpool(_refine_cancelled, query_id):
+                    event = "refine_cancelled"
+                else:
+                    with register_run(run):
+                        watcher = asyncio.create_task(service._watch_run(run, None, _refine_cancelled))
+                        try:
+                            rollups = cached_rollups(path)
+                            df = None if rollups is not None else await run_in_threadpool(load_frame, path)
+                            result, exec_time = await run_in_threadpool(service._execute_sql, df, sql_query, run, rollups)
+                        finally:
+                            watcher.cancel()
+        except QueryAborted as e:
+            event = "refine_cancelled" if e.status == "cancelled" else "refine_failed"
+            details = str(e)
+        except Exception as e:
+            details = str(e)
+        
+        query = db.query(Query).filter(Query.id == query_id).first()
+        if query is None:
+            return  # deleted meanwhile
+        if result is not None:
+            _store_result(db, query_id, user_id, data_source_id, result)
+            query.execution_time = exec_time
+            query.result_row_count = result.row_count
+            event, details = "refined", f"Exact result in {exec_time:.0f} ms"
+        if query.status == "refining":
+            query.status = "success"
+        db.commit()
+        query_history(query_id, user_id, event, details=details)
+    except Exception as e:
+        print(f"Warning: Exact run of query {query_id} failed: {e}")
+    finally:
+        db.close()
 
 
 class QueryService:
@@ -43,21 +202,31 @@ class QueryService:
     async def execute_ai_query(
         self,
         query_request: AIQueryRequest,
-        user: User
+        user: User,
+        request: Optional[Request] = None
     ) -> AIQueryResponse:
         """
         Execute an AI-powered query:
-        1. Load data from data source
+        1. Get the data source's profile (cached schema and statistics)
         2. Generate SQL using LLM
-        3. Execute SQL on the data
-        4. Store query in history
-        5. Return results
+        3. Validate the SQL and estimate its cost
+        4. Load the data and execute the SQL on it; send failing SQL back
+           to the LLM with the error for a bounded number of repairs
+        5. Store query in history
+        6. Return results
+        
+        CPU, memory and LLM usage are recorded as a QueryMetric row.
+        Execution is bounded by the query time/memory budgets and stops
+        when cancelled or when the client (`request`) disconnects.
         """
+        usage = track_usage()
+        
         # Get data source
-        data_source = self.db.query(DataSource).filter(
-            DataSource.id == query_request.data_source_id,
-            DataSource.user_id == user.id
-        ).first()
+        with span("db"):
+            data_source = self.db.query(DataSource).filter(
+                DataSource.id == query_request.data_source_id,
+                DataSource.user_id == user.id
+            ).first()
         
         if not data_source:
             raise HTTPException(
@@ -65,42 +234,53 @@ class QueryService:
                 detail="Data source not found"
             )
         
-        # Load CSV data
+        # Approximate queries on large sources run on the sample kept at upload
+        sample, population = None, 0
+        if query_request.approximate and query_request.execute:
+            loaded = await run_in_threadpool(load_sample, data_source.connection_string)
+            if loaded is not None:
+                sample, population = loaded
+        
+        # Schema and statistics for the LLM and the SQL validator; the data
+        # itself is only loaded once the generated SQL has been validated
         try:
-            df = pd.read_csv(data_source.connection_string)
+            profile, df = await run_in_threadpool(self._load_profile, data_source, sample, population)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to load data source: {str(e)}"
             )
         
-        # Prepare schema info for LLM
-        table_schema = {
-            "columns": df.columns.tolist(),
-            "row_count": len(df),
-            "column_types": {col: str(dtype) for col, dtype in df.dtypes.items()}
-        }
-        
-        # Get sample data
-        sample_data = df.head(5).to_dict('records')
-        
-        # Generate SQL using LLM
+        # Generate SQL using LLM (in a worker thread so concurrent requests
+        # can overlap and identical prompts can be coalesced)
         try:
-            llm_result = self.llm_service.generate_sql(
+            llm_result = await run_in_threadpool(
+                self.llm_service.generate_sql,
                 question=query_request.question,
-                table_schema=table_schema,
-                sample_data=sample_data
+                table_schema=profile.table_schema,
+                sample_data=profile.sample_data,
+                user_id=user.id
             )
             
             sql_query = llm_result["sql"]
             explanation = llm_result["explanation"]
             
+        except LLMRateLimitError as e:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=str(e),
+                headers={"Retry-After": str(math.ceil(e.retry_after))}
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to generate SQL: {str(e)}"
             )
         
+        # Reject invalid, non-read-only or too expensive SQL before loading
+        # any data; bound the size of the result
+        sql_query, rejection = self._validate(sql_query, profile)
+        
         # Create query record
         query_record = Query(
             user_id=user.id,
@@ -109,31 +289,138 @@ class QueryService:
             sql_query=sql_query,
             status="pending"
         )
-        self.db.add(query_record)
-        self.db.commit()
-        self.db.refresh(query_record)
+        with span("db"):
+            self.db.add(query_record)
+            adjust_user_counter(self.db, user.id, "queries", +1)
+            self.db.commit()
+            self.db.refresh(query_record)
         
-        # Execute SQL if requested
+        # Execute SQL if requested; rejected or failing SQL goes back to the
+        # LLM with the error, up to QUERY_REPAIR_MAX_ATTEMPTS times within
+        # QUERY_REPAIR_DEADLINE_SECONDS of the first run
         result = None
         error = None
-        query_status = QueryStatus.SUCCESS
-        
-        if query_request.execute:
-            try:
-                result, exec_time = self._execute_sql(df, sql_query)
-                query_record.status = "success"
-                query_record.execution_time = exec_time
-                query_record.result_row_count = result["row_count"]
-            except Exception as e:
-                error = str(e)
-                query_status = QueryStatus.ERROR
-                query_record.status = "error"
+        query_status = QueryStatus.PENDING
+        history_event = "executed"
+        attempt = 0
+        
+        if query_request.execute or rejection:
+            query_record.status = "running"
+            query_record.started_at = datetime.utcnow()
+            with span("db"):
+                self.db.commit()
+            deadline = time.monotonic() + settings.QUERY_REPAIR_DEADLINE_SECONDS
+            
+            while True:
+                if rejection:
+                    error = rejection
+                    query_status = QueryStatus.ERROR
+                    history_event = "rejected"
+                elif not query_request.execute:
+                    error = None
+                    query_status = QueryStatus.PENDING
+                    break
+                else:
+                    run = QueryRun(
+                        query_id=query_record.id,
+                        user_id=user.id,
+                        timeout=min(settings.QUERY_TIMEOUT_SECONDS, max(deadline - time.monotonic(), 1.0))
+                    )
+                    try:
+                        estimated = None
+                        if sample is not None:
+                            estimated = await run_in_threadpool(
+                                self._estimate_sql, sample, population, sql_query
+                            )
+                        if estimated is not None:
+                            result, exec_time = estimated
+                        else:
+                            # Grouped queries covered by a rollup never touch the table
+                            rollups = cached_rollups(data_source.connection_string)
+                            if df is None and rollups is None:
+                                try:
+                                    df = await run_in_threadpool(self._load_frame, data_source)
+                                except Exception as e:
+                                    # A missing or unreadable file is not the SQL's fault
+                                    raise QueryAborted(f"Could not load the data source: {e}") from e
+                            with register_run(run):
+                                watcher = asyncio.create_task(self._watch_run(run, request))
+                                try:
+                                    result, exec_time = await run_in_threadpool(self._execute_sql, df, sql_query, run, rollups)
+                                finally:
+                                    watcher.cancel()
+                        error = None
+                        query_status = QueryStatus.SUCCESS
+                        history_event = "executed"
+                        query_record.execution_time = exec_time
+                        query_record.result_row_count = result.row_count
+                        break
+                    except QueryAborted as e:
+                        # Budgets, cancels and unreadable files are not something a rewrite fixes
+                        error = str(e)
+                        query_status = QueryStatus(e.status)
+                        history_event = e.status if e.status != "error" else "executed"
+                        break
+                    except Exception as e:
+                        error = str(e)
+                        query_status = QueryStatus.ERROR
+                        history_event = "executed"
+                
+                if attempt >= settings.QUERY_REPAIR_MAX_ATTEMPTS or time.monotonic() >= deadline:
+                    break
+                if await run_in_threadpool(_cancel_requested, query_record.id):
+                    error = "Query cancelled"
+                    query_status = QueryStatus.CANCELLED
+                    history_event = "cancelled"
+                    break
+                attempt += 1
+                repaired = await self._repair_sql(query_request.question, profile, sql_query, error, user.id, deadline)
+                query_history(
+                    query_record.id,
+                    user.id,
+                    "repaired" if repaired else "repair_failed",
+                    details=f"Attempt {attempt}: {error}\nSQL: {sql_query}"
+                )
+                if not repaired:
+                    break
+                sql_query, rejection = self._validate(repaired["sql"], profile)
+                explanation = repaired["explanation"] or explanation
+                query_record.sql_query = sql_query
+            
+            if attempt:
+                _repairs.inc(outcome="fixed" if query_status in (QueryStatus.SUCCESS, QueryStatus.PENDING) else "failed")
+            if query_status != QueryStatus.PENDING:
+                query_record.status = query_status.value
                 query_record.error_message = error
-        else:
-            query_status = QueryStatus.PENDING
+                query_record.finished_at = datetime.utcnow()
+            else:
+                query_record.status = "pending"
+                query_record.started_at = None
         
-        self.db.commit()
-        self.db.refresh(query_record)
+        # Estimates are stored so the exact run can replace them
+        refining = False
+        if result is not None and result.approximate:
+            with span("db"):
+                _store_result(self.db, query_record.id, user.id, data_source.id, result)
+            refining = query_request.exact_followup
+            if refining:
+                query_record.status = "refining"
+        
+        with span("db"):
+            self.db.commit()
+            self.db.refresh(query_record)
+        
+        if refining:
+            task = asyncio.create_task(_refine_exact(
+                query_record.id, user.id, data_source.id, data_source.connection_string, sql_query
+            ))
+            _refinements.add(task)
+            task.add_done_callback(_refinements.discard)
+        
+        record_query_metric(query_record.id, usage)
+        query_history(query_record.id, user.id, "created")
+        if query_status != QueryStatus.PENDING:
+            query_history(query_record.id, user.id, history_event, details=error)
         
         # Build response
         return AIQueryResponse(
@@ -145,41 +432,137 @@ class QueryService:
             status=query_status,
             result=result,
             error=error,
+            refining=refining,
             created_at=query_record.created_at
         )
     
+    def _validate(self, sql_query: str, profile: TableProfile) -> tuple[str, Optional[str]]:
+        """
+        Returns:
+            Tuple of (SQL to run, rejection reason or None)
+        """
+        try:
+            with span("sql_validate"):
+                return validate_sql(sql_query, profile).sql, None
+        except SQLValidationError as e:
+            return sql_query, str(e)
+    
+    async def _repair_sql(
+        self,
+        question: str,
+        profile: TableProfile,
+        failed_sql: str,
+        error: str,
+        user_id: int,
+        deadline: float
+    ) -> Optional[Dict[str, Any]]:
+        """Ask the LLM for a corrected query; None if it fails or misses the deadline"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        try:
+            repaired = await asyncio.wait_for(
+                run_in_threadpool(
+                    self.llm_service.repair_sql,
+                    question=question,
+                    table_schema=profile.table_schema,
+                    column_profiles=profile.column_profiles(profile.relevant_columns(failed_sql, error)),
+                    failed_sql=failed_sql,
+                    error=error,
+                    user_id=user_id
+                ),
+                timeout=remaining
+            )
+        except Exception:
+            return None
+        return repaired if repaired.get("sql") else None
+    
+    def _load_frame(self, data_source: DataSource) -> pd.DataFrame:
+        """A data source's DataFrame (cached while the file is unchanged)"""
+        return load_frame(data_source.connection_string)
+    
+    def _load_profile(
+        self,
+        data_source: DataSource,
+        sample: Optional[pd.DataFrame] = None,
+        population: int = 0
+    ) -> tuple[TableProfile, Optional[pd.DataFrame]]:
+        """
+        The data source's profile, from cache while the file is unchanged.
+        Without a cached profile, a `sample` of a `population`-row table
+        gives an estimated one (not cached) so approximate queries never
+        load the full file.
+        
+        Returns:
+            Tuple of (TableProfile, DataFrame if it had to be loaded else None)
+        """
+        profile = cached_profile(data_source.connection_string)
+        if profile is not None:
+            return profile, None
+        if sample is not None:
+            profile = TableProfile.from_frame(sample)
+            profile.row_count = population
+            return profile, None
+        df = self._load_frame(data_source)
+        return store_profile(data_source.connection_string, df), df
+    
+    async def _watch_run(
+        self,
+        run: QueryRun,
+        request: Optional[Request],
+        cancelled: Callable[[int], bool] = _cancel_requested
+    ):
+        """Cancel a run when the client disconnects or another worker asks to (`cancelled`)"""
+        next_db_check = time.monotonic() + settings.QUERY_CANCEL_POLL_SECONDS
+        while True:
+            await asyncio.sleep(0.25)
+            if request is not None and await request.is_disconnected():
+                run.cancel("disconnected")
+                return
+            if time.monotonic() >= next_db_check:
+                next_db_check = time.monotonic() + settings.QUERY_CANCEL_POLL_SECONDS
+                if await run_in_threadpool(cancelled, run.query_id):
+                    run.cancel("cancelled")
+                    return
+    
     def _execute_sql(
         self,
-        df: pd.DataFrame,
-        sql_query: str
+        df: Optional[pd.DataFrame],
+        sql_query: str,
+        run: Optional[QueryRun] = None,
+        rollups: Optional[RollupSet] = None
     ) -> tuple[QueryExecutionResult, float]:
         """
-        Execute SQL query on DataFrame using pandasql.
+        Execute SQL query on DataFrame (table "data") within the run's budgets.
+        With `rollups`, grouped queries they cover are answered from them,
+        and `df` may be None: the file is only loaded if they do not.
         
         Returns:
             Tuple of (QueryExecutionResult, execution_time_ms)
+            
+        Raises:
+            QueryAborted: Timed out, over the memory budget or cancelled
         """
-        if sqldf is None:
-            raise Exception("pandasql is not installed. Cannot execute SQL queries.")
-        
         # Measure execution time
         start_time = time.time()
         
         try:
-            # Rename DataFrame to 'data' for query execution
-            data = df
-            
-            # Execute SQL using pandasql
-            result_df = sqldf(sql_query, locals())
+            result_df = rollups.answer(sql_query) if rollups is not None else None
+            if result_df is None:
+                if df is None:
+                    df = load_frame(rollups.path)
+                    start_time = time.time()
+                result_df = execute_sql(df, sql_query, run)
             
             execution_time = (time.time() - start_time) * 1000  # Convert to ms
             
-            # Convert result to dict format
-            columns = result_df.columns.tolist()
-            rows = result_df.to_dict('records')
-            
-            # Convert numpy types to Python types for JSON serialization
-            rows = self._convert_numpy_types(rows)
+            with span("serialize"):
+                # Convert result to dict format
+                columns = result_df.columns.tolist()
+                rows = result_df.to_dict('records')
+                
+                # Convert numpy types to Python types for JSON serialization
+                rows = self._convert_numpy_types(rows)
             
             return QueryExecutionResult(
                 columns=columns,
@@ -188,9 +571,47 @@ class QueryService:
                 execution_time_ms=round(execution_time, 2)
             ), execution_time
             
+        except QueryAborted:
+            raise
         except Exception as e:
             raise Exception(f"SQL execution error: {str(e)}")
     
+    def _estimate_sql(
+        self,
+        sample: pd.DataFrame,
+        population: int,
+        sql_query: str
+    ) -> Optional[tuple[QueryExecutionResult, float]]:
+        """
+        Estimate the query's result from a sample of the table.
+        
+        Returns:
+            Tuple of (QueryExecutionResult with confidence intervals,
+            execution_time_ms), or None if it cannot be estimated
+        """
+        start_time = time.time()
+        with measure_resources():
+            estimated = run_on_sample(sample, population, sql_query, settings.APPROX_CONFIDENCE)
+        if estimated is None:
+            return None
+        result_df, margins = estimated
+        execution_time = (time.time() - start_time) * 1000
+        
+        with span("serialize"):
+            rows = self._convert_numpy_types(result_df.to_dict('records'))
+        
+        return QueryExecutionResult(
+            columns=result_df.columns.tolist(),
+            rows=rows,
+            row_count=len(rows),
+            execution_time_ms=round(execution_time, 2),
+            approximate=True,
+            sample_rows=len(sample),
+            population_rows=population,
+            confidence=settings.APPROX_CONFIDENCE,
+            margins=margins
+        ), execution_time
+    
     def _convert_numpy_types(self, rows: List[Dict]) -> List[Dict]:
         """Convert numpy types to Python types for JSON serialization"""
         import numpy as np
@@ -277,12 +698,10 @@ class QueryService:
             DataSource.id == query.data_source_id
         ).first()
         
-        # If query has results stored, retrieve them
+        # Only approximate results (and the exact results replacing them) are stored
         result = None
-        if query.status == "success" and query.result_row_count:
-            # For now, we don't store full results in DB
-            # In production, you might want to cache results in Redis or similar
-            result = None
+        if query.status in ("success", "refining"):
+            result = self._stored_result(query.id)
         
         return QueryDetailResponse(
             id=query.id,
@@ -299,10 +718,60 @@ class QueryService:
             execution_time_ms=query.execution_time
         )
     
+    def _stored_result(self, query_id: int) -> Optional[QueryExecutionResult]:
+        """The query's stored result, if any"""
+        stored = self.db.query(QueryResult).filter(QueryResult.query_id == query_id).first()
+        if stored is None or not stored.result_location:
+            return None
+        try:
+            with open(stored.result_location) as f:
+                return QueryExecutionResult.model_validate_json(f.read())
+        except (OSError, ValueError) as e:
+            print(f"Warning: Failed to read stored result of query {query_id}: {e}")
+            return None
+    
+    async def validate_sql(self, validation_request: SQLValidationRequest, user: User) -> SQLValidationResponse:
+        """
+        Validate SQL against a data source without running it.
+        
+        `suggested_fix` is the SQL that would run instead (with a LIMIT
+        added) when the result could exceed QUERY_MAX_RESULT_ROWS.
+        """
+        with span("db"):
+            data_source = self.db.query(DataSource).filter(
+                DataSource.id == validation_request.data_source_id,
+                DataSource.user_id == user.id
+            ).first()
+        
+        if not data_source:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Data source not found"
+            )
+        
+        try:
+            profile, _ = await run_in_threadpool(self._load_profile, data_source)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to load data source: {str(e)}"
+            )
+        
+        try:
+            validated = validate_sql(validation_request.sql, profile)
+        except SQLValidationError as e:
+            return SQLValidationResponse(is_valid=False, error=str(e))
+        
+        return SQLValidationResponse(
+            is_valid=True,
+            suggested_fix=validated.sql if validated.limited else None
+        )
+    
     async def rerun_query(
         self,
         query_id: int,
-        user: User
+        user: User,
+        request: Optional[Request] = None
     ) -> AIQueryResponse:
         """Re-run a previous query"""
         # Get original query
@@ -324,7 +793,55 @@ class QueryService:
             execute=True
         )
         
-        return await self.execute_ai_query(query_request, user)
+        return await self.execute_ai_query(query_request, user, request)
+    
+    def cancel_query(
+        self,
+        query_id: int,
+        user: User
+    ) -> QueryCancelResponse:
+        """
+        Cancel a running query, or the exact run refining an estimate.
+        
+        A run in this process is stopped directly; otherwise a running query
+        is marked "cancelling" and a refining one goes back to "success"
+        (keeping its estimate), and the worker running it stops it when it
+        next polls (within QUERY_CANCEL_POLL_SECONDS).
+        """
+        query = self.db.query(Query).filter(
+            Query.id == query_id,
+            Query.user_id == user.id
+        ).first()
+        
+        if not query:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Query not found"
+            )
+        
+        run = get_running(query_id)
+        if run is not None:
+            run.cancel("cancelled")
+        else:
+            marked = self.db.execute(
+                update(Query)
+                .where(Query.id == query_id, Query.status == "running")
+                .values(status="cancelling")
+            ).rowcount or self.db.execute(
+                update(Query)
+                .where(Query.id == query_id, Query.status == "refining")
+                .values(status="success")
+            ).rowcount
+            self.db.commit()
+            if not marked:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Query is not running"
+                )
+        
+        audit("query_cancel", user_id=user.id, object_type="query", object_id=query_id)
+        
+        return QueryCancelResponse(query_id=query_id, status=QueryStatus.CANCELLING)
     
     def delete_query(
         self,
@@ -343,8 +860,21 @@ class QueryService:
                 detail="Query not found"
             )
         
+        # History rows require their query; the deletion itself goes to the audit trail
+        self.db.query(QueryHistory).filter(QueryHistory.query_id == query.id).delete(synchronize_session=False)
+        for stored in self.db.query(QueryResult).filter(QueryResult.query_id == query.id).all():
+            if stored.result_location:
+                try:
+                    os.remove(stored.result_location)
+                except FileNotFoundError:
+                    pass
+                StorageService(self.db).forget_file(stored.result_location)
+            self.db.delete(stored)
         self.db.delete(query)
+        adjust_user_counter(self.db, user.id, "queries", -1)
         self.db.commit()
         
+        audit("query_delete", user_id=user.id, object_type="query", object_id=query_id)
+        
         return True
 
@@ -0,0 +1,325 @@
+"""
+RAG Ingestion Service - Chunk, deduplicate and embed documents.
+Chunks are content-hashed; a chunk whose hash already has an Embedding for
+the active model is skipped, so re-indexing only pays for changed text.
+"""
+
+import hashlib
+import math
+import re
+import threading
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.rag import RAGDocument, Embedding
+from app.services.vector_store import get_vector_store
+
+
+# --- Embedders ---
+
+class Embedder:
+    """Base class for pluggable embedders"""
+
+    name: str = "base"
+    dim: int = 0
+    # CPU-bound pure-Python embedders run in a process pool; I/O-bound
+    # ones (remote APIs) in a thread pool
+    cpu_bound: bool = False
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts into an array of shape (len(texts), dim)"""
+        raise NotImplementedError
+
+
+class HashingEmbedder(Embedder):
+    """
+    Local deterministic embedder using signed feature hashing of word
+    unigrams and bigrams with sublinear term frequency. No model download,
+    stable across processes and restarts.
+    """
+
+    cpu_bound = True
+    _token_re = re.compile(r"[A-Za-z0-9_]+")
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim or settings.EMBEDDING_DIM
+        self.name = f"hashing-v1-{self.dim}"
+
+    def _features(self, text: str) -> Counter:
+        tokens = [t.lower() for t in self._token_re.findall(text)]
+        features = Counter(tokens)
+        features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        return features
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, tf in self._features(text).items():
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                h = int.from_bytes(digest, "little")
+                sign = 1.0 if h & 1 else -1.0
+                vectors[row, (h >> 1) % self.dim] += sign * (1.0 + math.log(tf))
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+_EMBEDDERS = {
+    "hashing": HashingEmbedder,
+}
+
+
+def get_embedder(name: Optional[str] = None) -> Embedder:
+    """Instantiate a registered embedder (RAG_EMBEDDER by default)"""
+    name = name or settings.RAG_EMBEDDER
+    if name not in _EMBEDDERS:
+        raise ValueError(f"Unknown embedder: {name}")
+    return _EMBEDDERS[name]()
+
+
+def register_embedder(name: str, factory) -> None:
+    """Register an embedder factory under a name usable in RAG_EMBEDDER"""
+    _EMBEDDERS[name] = factory
+
+
+# --- Chunking ---
+
+def chunk_text(text: str, chunk_size: Optional[int] = None, overlap: Optional[int] = None) -> List[str]:
+    """
+    Split text into chunks of at most `chunk_size` characters.
+
+    Paragraphs are packed together while they fit; a paragraph longer
+    than a chunk is cut into overlapping windows.
+    """
+    chunk_size = chunk_size or settings.RAG_CHUNK_SIZE
+    overlap = settings.RAG_CHUNK_OVERLAP if overlap is None else overlap
+
+    chunks: List[str] = []
+    current = ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+
+        if len(paragraph) > chunk_size:
+            if current:
+                chunks.append(current)
+                current = ""
+            step = max(chunk_size - overlap, 1)
+            for start in range(0, len(paragraph), step):
+                chunks.append(paragraph[start:start + chunk_size])
+                if start + chunk_size >= len(paragraph):
+                    break
+        elif len(current) + len(paragraph) + 2 <= chunk_size:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+        else:
+            chunks.append(current)
+            current = paragraph
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def content_hash(chunk: str) -> str:
+    """SHA-256 of a chunk with whitespace normalized"""
+    return hashlib.sha256(" ".join(chunk.split()).encode("utf-8")).hexdigest()
+
+
+# --- Worker pools ---
+
+_pools: Dict[bool, Executor] = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(cpu_bound: bool) -> Executor:
+    """Shared worker pool for embedding batches"""
+    with _pools_lock:
+        pool = _pools.get(cpu_bound)
+        if pool is None:
+            workers = settings.RAG_INGEST_WORKERS
+            pool = ProcessPoolExecutor(max_workers=workers) if cpu_bound else ThreadPoolExecutor(max_workers=workers)
+            _pools[cpu_bound] = pool
+        return pool
+
+
+def _embed_batch(embedder: Embedder, texts: List[str]) -> np.ndarray:
+    return embedder.embed(texts)
+
+
+class RAGIngestionService:
+    """Service for incremental document ingestion into the vector index"""
+
+    def __init__(self, db: Session, embedder: Optional[Embedder] = None):
+        self.db = db
+        self.embedder = embedder or get_embedder()
+
+    def ingest_document(
+        self,
+        datasource_id: Optional[int],
+        title: str,
+        content: str,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, int]:
+        """
+        Ingest (or re-ingest) one document.
+
+        Each chunk becomes a RAGDocument row carrying its content hash.
+        Chunks whose hash already has an Embedding for this embedder are
+        skipped; chunks of a previous version of the same document
+        (same data source and title) that no longer exist are removed.
+
+        Returns:
+            Counts of chunks, skipped, embedded and removed
+        """
+        chunks = chunk_text(content)
+        hashed: Dict[str, Tuple[int, str]] = {}
+        for position, chunk in enumerate(chunks):
+            hashed.setdefault(content_hash(chunk), (position, chunk))
+
+        existing = self._existing_chunks(datasource_id, title, list(hashed.keys()))
+        embedded_hashes = {h for h, (_, has_embedding) in existing.items() if has_embedding}
+        to_embed = [h for h in hashed if h not in embedded_hashes]
+
+        # Create RAGDocument rows for chunks never seen before (bulk insert)
+        new_rows = [
+            {
+                "datasource_id": datasource_id,
+                "title": title,
+                "content": hashed[h][1],
+                "content_hash": h,
+                "metadata_": {**(metadata or {}), "chunk": hashed[h][0]},
+            }
+            for h in to_embed if h not in existing
+        ]
+        document_ids = {h: doc_id for h, (doc_id, _) in existing.items()}
+        if new_rows:
+            inserted = self.db.execute(
+                insert(RAGDocument).returning(
+                    RAGDocument.id, RAGDocument.content_hash, sort_by_parameter_order=True
+                ),
+                new_rows
+            )
+            document_ids.update({row.content_hash: row.id for row in inserted})
+
+        new_vectors = self._embed_and_insert(
+            [(document_ids[h], hashed[h][1]) for h in to_embed]
+        )
+        removed_embeddings, removed = self._remove_stale_chunks(datasource_id, title, set(hashed.keys()))
+        self.db.commit()
+
+        # The index follows the committed state of the Embedding table
+        store = get_vector_store(self.embedder.name, self.embedder.dim)
+        for embedding_ids, doc_ids, vectors in new_vectors:
+            store.append(embedding_ids, doc_ids, vectors)
+        store.remove(removed_embeddings)
+        store.flush()
+
+        return {
+            "chunks": len(hashed),
+            "skipped": len(hashed) - len(to_embed),
+            "embedded": len(to_embed),
+            "removed": removed,
+        }
+
+    def _existing_chunks(
+        self,
+        datasource_id: Optional[int],
+        title: str,
+        hashes: List[str]
+    ) -> Dict[str, Tuple[int, bool]]:
+        """Map content hash -> (document id, has embedding for this embedder)"""
+        existing: Dict[str, Tuple[int, bool]] = {}
+        for start in range(0, len(hashes), 1000):
+            rows = self.db.query(
+                RAGDocument.id, RAGDocument.content_hash, Embedding.id.label("embedding_id")
+            ).outerjoin(
+                Embedding,
+                (Embedding.document_id == RAGDocument.id) & (Embedding.model == self.embedder.name)
+            ).filter(
+                RAGDocument.datasource_id == datasource_id,
+                RAGDocument.title == title,
+                RAGDocument.content_hash.in_(hashes[start:start + 1000])
+            ).all()
+
+            for row in rows:
+                has_embedding = row.embedding_id is not None
+                if row.content_hash not in existing or has_embedding:
+                    existing[row.content_hash] = (row.id, has_embedding)
+        return existing
+
+    def _embed_and_insert(self, items: List[Tuple[int, str]]) -> List[Tuple[List[int], List[int], np.ndarray]]:
+        """
+        Embed chunks in parallel batches and bulk insert the Embeddings.
+
+        Returns:
+            (embedding ids, document ids, vectors) per batch, to be
+            appended to the vector store once the transaction commits
+        """
+        if not items:
+            return []
+
+        batch_size = settings.RAG_EMBED_BATCH_SIZE
+        batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+        pool = _get_pool(self.embedder.cpu_bound)
+        futures = [
+            pool.submit(_embed_batch, self.embedder, [text for _, text in batch])
+            for batch in batches
+        ]
+
+        results = []
+        for batch, future in zip(batches, futures):
+            vectors = future.result()
+            inserted = self.db.execute(
+                insert(Embedding).returning(
+                    Embedding.id, Embedding.document_id, sort_by_parameter_order=True
+                ),
+                [
+                    {"document_id": doc_id, "vector": vector.tolist(), "model": self.embedder.name}
+                    for (doc_id, _), vector in zip(batch, vectors)
+                ]
+            ).all()
+            results.append((
+                [row.id for row in inserted],
+                [row.document_id for row in inserted],
+                vectors
+            ))
+
+        return results
+
+    def _remove_stale_chunks(
+        self,
+        datasource_id: Optional[int],
+        title: str,
+        current: set
+    ) -> Tuple[List[int], int]:
+        """
+        Delete chunks of an earlier version of the document.
+
+        Returns:
+            (removed embedding ids, number of removed chunks)
+        """
+        stale = self.db.query(RAGDocument).filter(
+            RAGDocument.datasource_id == datasource_id,
+            RAGDocument.title == title,
+            RAGDocument.content_hash.notin_(current)
+        ).all()
+        if not stale:
+            return [], 0
+
+        stale_ids = [doc.id for doc in stale]
+        embeddings = self.db.query(Embedding.id).filter(
+            Embedding.document_id.in_(stale_ids),
+            Embedding.model == self.embedder.name
+        ).all()
+
+        self.db.query(Embedding).filter(Embedding.document_id.in_(stale_ids)).delete(synchronize_session=False)
+        self.db.query(RAGDocument).filter(RAGDocument.id.in_(stale_ids)).delete(synchronize_session=False)
+        return [e.id for e in embeddings], len(stale_ids)
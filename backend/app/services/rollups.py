@@ -0,0 +1,206 @@
+"""
+Rollups - Pre-aggregated summaries of large CSV data sources.
+A background job picks dimensions (integer or text columns with few
+distinct values) and measures (numeric columns) from a source's table
+profile and builds one rollup per dimension and per pair of dimensions:
+the row count and each measure's sum, count, min and max for every
+combination of dimension values. Grouped queries that only filter and
+group by a rollup's dimensions and aggregate its measures are answered
+from the smallest such rollup (sql_fastpath.run_on_rollups) instead of
+scanning the table. Rollups are kept in memory per worker and keyed by
+file version, so a rewritten file is never answered from stale rollups.
+"""
+
+import itertools
+import os
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.metrics import counter, histogram
+from app.core.timing import span
+from app.models.data_source import DataSource
+from app.models.query import Query
+from app.services.sql_engine import execute_sql
+from app.services.sql_fastpath import ROLLUP_ROWS, column_kind, run_on_rollups
+from app.services.table_profile import TableProfile, cached_profile, file_version, load_frame, store_profile
+
+
+_rollup_queries = counter(
+    "lumiere_rollup_queries_total",
+    "Queries on sources with rollups, by whether a rollup answered them",
+    label_names=("result",)
+)
+_build_seconds = histogram(
+    "lumiere_rollup_build_seconds",
+    "Time to build the rollups of one data source"
+)
+
+_INT64_MAX = 2 ** 63 - 1
+
+
+class Rollup:
+    """Per-measure sum/count/min/max of a table grouped by `dimensions`"""
+
+    def __init__(self, dimensions: List[str], frame: pd.DataFrame, measures: Dict[str, str]):
+        self.dimensions = dimensions
+        self.frame = frame
+        self.measures = measures  # measure column -> prefix of its stat columns in `frame`
+
+
+class RollupSet:
+    """The rollups of one version of a data file"""
+
+    def __init__(self, path: str, rollups: List[Rollup]):
+        self.path = path
+        self.rollups = rollups
+
+    def answer(self, sql: str) -> Optional[pd.DataFrame]:
+        """The query's result from a rollup, or None if none covers it"""
+        result = run_on_rollups(self.rollups, sql) if self.rollups else None
+        _rollup_queries.inc(result="hit" if result is not None else "miss")
+        return result
+
+
+# Rollups by file version (possibly empty: nothing worth rolling up)
+_rollups: TTLCache[RollupSet] = TTLCache(
+    "rollup",
+    ttl=settings.ROLLUP_CACHE_TTL_SECONDS,
+    max_size=settings.ROLLUP_CACHE_SIZE
+)
+
+
+def cached_rollups(path: str) -> Optional[RollupSet]:
+    """The rollups of the file's current version, if built"""
+    if not settings.ROLLUP_ENABLED:
+        return None
+    try:
+        return _rollups.get(file_version(path))
+    except OSError:
+        return None
+
+
+def execute_on_source(path: str, sql: str) -> pd.DataFrame:
+    """Run `sql` on a CSV file: from its rollups if they cover it, else on its DataFrame"""
+    rollups = cached_rollups(path)
+    result = rollups.answer(sql) if rollups is not None else None
+    return result if result is not None else execute_sql(load_frame(path), sql)
+
+
+def _dimensions(df: pd.DataFrame, profile: TableProfile) -> List[str]:
+    """Low-cardinality integer and text columns, fewest distinct values first"""
+    candidates = [
+        col for col in profile.columns
+        if isinstance(col, str) and not col.startswith("__")
+        and 2 <= profile.distinct_counts.get(col, 0) <= settings.ROLLUP_MAX_CARDINALITY
+        and column_kind(df[col]) in ("int", "text")
+    ]
+    candidates.sort(key=lambda col: profile.distinct_counts[col])
+    return candidates[:settings.ROLLUP_MAX_DIMENSIONS]
+
+
+def _measures(df: pd.DataFrame, profile: TableProfile) -> Dict[str, str]:
+    """Numeric columns whose sums fit SQLite's integers, by stat column prefix"""
+    measures: Dict[str, str] = {}
+    for col in profile.columns:
+        if len(measures) >= settings.ROLLUP_MAX_MEASURES:
+            break
+        if not isinstance(col, str) or col.startswith("__"):
+            continue
+        kind = column_kind(df[col])
+        if kind not in ("int", "float"):
+            continue
+        if kind == "int" and len(df) and len(df) * float(df[col].abs().max()) >= _INT64_MAX:
+            continue  # SQLite raises on the overflow; leave those queries to it
+        measures[col] = f"__m{len(measures)}"
+    return measures
+
+
+def _rollup_frame(df: pd.DataFrame, dimensions: List[str], measures: Dict[str, str]) -> pd.DataFrame:
+    stats = {ROLLUP_ROWS: (dimensions[0], "size")}
+    for col, prefix in measures.items():
+        for stat in ("sum", "count", "min", "max"):
+            stats[f"{prefix}_{stat}"] = (col, stat)
+    grouped = df.groupby(dimensions, dropna=False, sort=False)
+    return grouped.agg(**stats).reset_index()
+
+
+def build_rollups(path: str, df: pd.DataFrame, profile: TableProfile) -> RollupSet:
+    """
+    Rollups of one version of a file: one per dimension and per pair of
+    dimensions, skipping those with more than ROLLUP_MAX_ROWS rows.
+    """
+    rollups: List[Rollup] = []
+    lower = [str(col).lower() for col in df.columns]
+    if len(set(lower)) != len(lower):
+        return RollupSet(path, rollups)  # the fast path cannot resolve these columns either
+
+    dimensions = _dimensions(df, profile)
+    measures = _measures(df, profile)
+    for size in (1, 2):
+        for dims in itertools.combinations(dimensions, size):
+            # +1: NULL is a group of its own
+            bound = 1
+            for col in dims:
+                bound *= profile.distinct_counts[col] + 1
+            if bound > settings.ROLLUP_MAX_ROWS:
+                continue
+            frame = _rollup_frame(df, list(dims), measures)
+            if len(frame) <= settings.ROLLUP_MAX_ROWS:
+                rollups.append(Rollup(list(dims), frame, measures))
+    return RollupSet(path, rollups)
+
+
+def refresh_rollups(db: Session) -> int:
+    """
+    Build rollups for the most recently queried CSV sources (those whose
+    connection string is an uploaded file) with at least ROLLUP_MIN_ROWS
+    rows, unless their current file version already has them. Row counts
+    come from the table profile; sources that turn out to be smaller get
+    an empty set, so they are not loaded again until the file changes.
+
+    Returns:
+        Number of data sources rolled up
+    """
+    if not settings.ROLLUP_ENABLED:
+        return 0
+    last_query = db.query(
+        Query.data_source_id, func.max(Query.created_at).label("last_query")
+    ).group_by(Query.data_source_id).subquery()
+    sources = db.query(DataSource.connection_string).join(
+        last_query, last_query.c.data_source_id == DataSource.id
+    ).filter(
+        DataSource.is_active == True,
+        DataSource.connection_string.isnot(None)
+    ).order_by(last_query.c.last_query.desc()).limit(settings.ROLLUP_SOURCES_PER_RUN).all()
+
+    built = 0
+    for (path,) in sources:
+        try:
+            if not os.path.isfile(path):
+                continue  # a database DSN, or a removed upload
+            key = file_version(path)
+            if _rollups.get(key) is not None:
+                continue
+            profile = cached_profile(path)
+            if profile is not None and profile.row_count < settings.ROLLUP_MIN_ROWS:
+                _rollups.set(key, RollupSet(path, []))
+                continue
+            start = time.perf_counter()
+            with span("rollup_build"):
+                df = load_frame(path)
+                profile = profile or store_profile(path, df)
+                if profile.row_count < settings.ROLLUP_MIN_ROWS:
+                    _rollups.set(key, RollupSet(path, []))
+                    continue
+                _rollups.set(key, build_rollups(path, df, profile))
+            _build_seconds.observe(time.perf_counter() - start)
+            built += 1
+        except Exception as e:
+            print(f"Warning: Failed to build rollups for {path}: {e}")
+    return built
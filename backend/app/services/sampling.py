@@ -0,0 +1,92 @@
+"""
+Sampling - Row samples of large CSV uploads for approximate queries.
+At upload, sources with more than APPROX_SAMPLE_ROWS rows get a simple
+random sample of that many rows (in file order) written to
+UPLOAD_DIR/samples, after a header line recording the row count of the
+full table. Approximate queries run on it through
+sql_fastpath.run_on_sample, which scales counts and sums to that row
+count and gives their confidence intervals.
+"""
+
+import os
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.timing import span
+from app.services.table_profile import file_version
+
+
+# First line of a sample file, followed by the population (full table row count)
+_POPULATION_HEADER = "# population="
+
+# (sample, population) by sample file version
+_samples: TTLCache[Tuple[pd.DataFrame, int]] = TTLCache(
+    "sample",
+    ttl=settings.DATAFRAME_CACHE_TTL_SECONDS,
+    max_size=settings.APPROX_SAMPLE_CACHE_SIZE
+)
+
+
+def sample_path(path: str) -> str:
+    """Where the sample of an uploaded file is kept"""
+    return os.path.join(settings.UPLOAD_DIR, "samples", os.path.basename(path))
+
+
+def sample_bytes(file_size: int, row_count: int) -> int:
+    """Approximate size of the sample write_sample keeps of a file"""
+    if row_count <= settings.APPROX_SAMPLE_ROWS:
+        return 0
+    return int(file_size * settings.APPROX_SAMPLE_ROWS / row_count)
+
+
+def write_sample(path: str, df: pd.DataFrame) -> Optional[str]:
+    """
+    Write the sample of a freshly uploaded file.
+
+    Returns:
+        The sample's path, or None if the table is small enough to query exactly
+    """
+    if len(df) <= settings.APPROX_SAMPLE_ROWS:
+        return None
+    target = sample_path(path)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    sample = df.sample(n=settings.APPROX_SAMPLE_ROWS, random_state=0).sort_index()
+    with open(target, "w", newline="") as f:
+        f.write(f"{_POPULATION_HEADER}{len(df)}\n")
+        sample.to_csv(f, index=False)
+    return target
+
+
+def remove_sample(path: str):
+    """Delete an uploaded file's sample, if it has one"""
+    try:
+        os.remove(sample_path(path))
+    except FileNotFoundError:
+        pass
+
+
+def load_sample(path: str) -> Optional[Tuple[pd.DataFrame, int]]:
+    """
+    The sample of an uploaded file and the row count of the full table,
+    or None if it has no sample or the file was rewritten after the
+    sample was taken. Shared: do not modify it.
+    """
+    target = sample_path(path)
+    try:
+        if os.stat(target).st_mtime_ns < os.stat(path).st_mtime_ns:
+            return None
+        key = file_version(target)
+    except OSError:
+        return None
+    loaded = _samples.get(key)
+    if loaded is None:
+        with span("sample_load"), open(target, newline="") as f:
+            header = f.readline()
+            if not header.startswith(_POPULATION_HEADER):
+                return None
+            loaded = (pd.read_csv(f), int(header[len(_POPULATION_HEADER):]))
+        _samples.set(key, loaded)
+    return loaded
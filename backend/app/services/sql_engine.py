@@ -0,0 +1,211 @@
+"""
+SQL Engine - Runs generated SQL on DataFrames in an in-memory SQLite database.
+Every statement runs under a QueryRun with a time and memory budget: a
+SQLite progress handler aborts it when a budget is exhausted or the run is
+cancelled. Runs for stored queries are registered so another request can
+cancel them.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+import pandas as pd
+
+from app.core.config import settings
+from app.core.metrics import counter, gauge
+from app.core.timing import span
+from app.services.sql_fastpath import run_fastpath
+from app.services.usage_service import measure_resources, rss_mb
+
+
+# DataFrames are loaded as this table; "df" is an alias view
+TABLE_NAME = "data"
+
+_FETCH_BATCH_ROWS = 1000
+_MEMORY_CHECK_SECONDS = 0.05
+
+_aborted = counter(
+    "lumiere_sql_aborted_total",
+    "SQL executions stopped before completion",
+    label_names=("reason",)
+)
+
+
+class QueryAborted(Exception):
+    """Execution stopped before completion; `status` is stored on the Query"""
+    status = "error"
+
+
+class QueryCancelled(QueryAborted):
+    status = "cancelled"
+
+
+class QueryTimeout(QueryAborted):
+    status = "timeout"
+
+
+class QueryMemoryExceeded(QueryAborted):
+    status = "error"
+
+
+class QueryRun:
+    """
+    One execution and its budgets. cancel() may be called from any thread;
+    the running statement stops at the next progress handler call.
+    """
+
+    def __init__(
+        self,
+        query_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        timeout: Optional[float] = None,
+        memory_limit_mb: Optional[float] = None
+    ):
+        self.query_id = query_id
+        self.user_id = user_id
+        self.timeout = settings.QUERY_TIMEOUT_SECONDS if timeout is None else timeout
+        self.memory_limit_mb = settings.QUERY_MEMORY_LIMIT_MB if memory_limit_mb is None else memory_limit_mb
+        self.abort_reason: Optional[str] = None
+        self._deadline = float("inf")
+        self._rss_start = 0.0
+        self._next_memory_check = 0.0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def cancel(self, reason: str = "cancelled"):
+        """Stop the run (reason: "cancelled" or "disconnected")"""
+        with self._lock:
+            if self.abort_reason is None:
+                self.abort_reason = reason
+            conn = self._conn
+        if conn is not None:
+            conn.interrupt()
+
+    def _attach(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._conn = conn
+        self._deadline = time.monotonic() + self.timeout
+        self._rss_start = rss_mb()
+        conn.set_progress_handler(self._progress, settings.QUERY_PROGRESS_STEPS)
+
+    def _detach(self):
+        with self._lock:
+            self._conn = None
+
+    def _progress(self) -> int:
+        """SQLite progress handler: non-zero aborts the statement"""
+        if self.abort_reason is not None:
+            return 1
+        now = time.monotonic()
+        if now > self._deadline:
+            self.abort_reason = "timeout"
+            return 1
+        if now >= self._next_memory_check:
+            self._next_memory_check = now + _MEMORY_CHECK_SECONDS
+            if rss_mb() - self._rss_start > self.memory_limit_mb:
+                self.abort_reason = "memory"
+                return 1
+        return 0
+
+    def raise_if_aborted(self):
+        if self._progress():
+            raise self.error()
+
+    def error(self) -> QueryAborted:
+        reason = self.abort_reason
+        _aborted.inc(reason=reason or "unknown")
+        if reason == "timeout":
+            return QueryTimeout(f"Query exceeded the {self.timeout:g}s time limit")
+        if reason == "memory":
+            return QueryMemoryExceeded(f"Query exceeded the {self.memory_limit_mb:g} MB memory limit")
+        if reason == "disconnected":
+            return QueryCancelled("Query cancelled: client disconnected")
+        return QueryCancelled("Query cancelled")
+
+
+# --- Running query registry (per process) ---
+
+_running: Dict[int, QueryRun] = {}
+_running_lock = threading.Lock()
+
+gauge("lumiere_sql_running", "Registered SQL executions in progress", fn=lambda: len(_running))
+
+
+@contextmanager
+def register_run(run: QueryRun) -> Iterator[QueryRun]:
+    """Make a run findable by its query id while the block executes"""
+    with _running_lock:
+        _running[run.query_id] = run
+    try:
+        yield run
+    finally:
+        with _running_lock:
+            if _running.get(run.query_id) is run:
+                del _running[run.query_id]
+
+
+def get_running(query_id: int) -> Optional[QueryRun]:
+    with _running_lock:
+        return _running.get(query_id)
+
+
+# --- Execution ---
+
+def execute_sql(
+    df: pd.DataFrame,
+    sql: str,
+    run: Optional[QueryRun] = None,
+    fastpath: bool = True
+) -> pd.DataFrame:
+    """
+    Run `sql` against `df` (as table "data") within the run's budgets.
+
+    Simple single-table queries run directly on the DataFrame (see
+    sql_fastpath) unless `fastpath` is False or SQL_FASTPATH_ENABLED is
+    off; everything else is copied into SQLite. Loading the table counts
+    against the budgets too. CPU and memory are charged to the current
+    query's usage.
+
+    Raises:
+        QueryAborted: Timed out, over the memory budget or cancelled
+        sqlite3.Error: Invalid SQL
+    """
+    run = run or QueryRun()
+    if run.abort_reason is not None:
+        raise run.error()
+    if fastpath and settings.SQL_FASTPATH_ENABLED:
+        with measure_resources():
+            result = run_fastpath(df, sql)
+        if result is not None:
+            return result
+
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    try:
+        with span("sql"), measure_resources():
+            run._attach(conn)
+            try:
+                df.to_sql(TABLE_NAME, conn, index=False)
+                conn.execute(f"CREATE VIEW df AS SELECT * FROM {TABLE_NAME}")
+                cursor = conn.execute(sql)
+                columns = [d[0] for d in cursor.description] if cursor.description else []
+                rows = []
+                while True:
+                    batch = cursor.fetchmany(_FETCH_BATCH_ROWS)
+                    if not batch:
+                        break
+                    rows.extend(batch)
+                    run.raise_if_aborted()
+            except QueryAborted:
+                raise
+            except Exception:
+                if run.abort_reason is not None:
+                    raise run.error()
+                raise
+            finally:
+                run._detach()
+        return pd.DataFrame.from_records(rows, columns=columns)
+    finally:
+        conn.close()
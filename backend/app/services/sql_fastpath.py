@@ -0,0 +1,1054 @@
+"""
+SQL Fast Path - Runs simple single-table queries directly on the DataFrame.
+Covers the shape most generated queries have:
+
+    SELECT col | COUNT/SUM/AVG/MIN/MAX(...) [AS alias], ...
+    FROM data | df
+    [WHERE comparisons, IN, BETWEEN, LIKE, IS NULL with AND/OR/NOT]
+    [GROUP BY columns] [ORDER BY ...] [LIMIT n [OFFSET m]]
+
+(optionally wrapped as SELECT * FROM (...) LIMIT n, as the SQL validator
+does) with SQLite's semantics: three-valued NULL logic, NULLs first in
+ascending order, NULL as its own group, and SQLite's result column names.
+Anything outside the subset, or columns whose types could compare
+differently in SQLite (dates, booleans, mixed objects), makes
+run_fastpath() return None and the caller uses the SQL engine.
+run_on_rollups() runs grouped queries of the same subset on pre-aggregated
+rollups instead of the table, and run_on_sample() estimates aggregate
+queries from a sample of it. benchmarks/sql_fastpath_diff.py checks the
+exact paths agree.
+"""
+
+import copy
+import re
+from functools import lru_cache
+from statistics import NormalDist
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.metrics import counter
+from app.core.timing import span
+
+
+_fastpath = counter(
+    "lumiere_sql_fastpath_total",
+    "SQL executions by path: fast path hit or why it fell back to SQLite",
+    label_names=("result",)
+)
+
+_AGGREGATES = {"COUNT", "SUM", "AVG", "MIN", "MAX"}
+_TABLES = {"data", "df"}
+_RESERVED = {
+    "SELECT", "FROM", "WHERE", "GROUP", "BY", "HAVING", "ORDER", "LIMIT", "OFFSET",
+    "AND", "OR", "NOT", "IN", "IS", "NULL", "BETWEEN", "LIKE", "GLOB", "AS", "ASC", "DESC",
+    "DISTINCT", "ALL", "CASE", "WHEN", "THEN", "ELSE", "END", "JOIN", "ON", "USING",
+    "UNION", "INTERSECT", "EXCEPT", "WINDOW", "OVER", "FILTER", "COLLATE", "NULLS",
+    "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "NATURAL", "ESCAPE", "WITH", "VALUES",
+}
+ROLLUP_ROWS = "__rows"
+_COMPARISONS = {"=", "==", "!=", "<>", "<", "<=", ">", ">="}
+_INT64_MAX = 2 ** 63 - 1
+
+_TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\])
+  | (?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+  | (?P<op><=|>=|<>|!=|==|[=<>(),*.;-])
+""", re.VERBOSE)
+
+
+class _Unsupported(Exception):
+    """Outside the fast path's subset; use the SQL engine"""
+
+
+# --- Parsing ---
+
+class _Token:
+    __slots__ = ("kind", "value", "start", "end")
+
+    def __init__(self, kind: str, value: str, start: int, end: int):
+        self.kind = kind
+        self.value = value
+        self.start = start
+        self.end = end
+
+    def is_word(self, *words: str) -> bool:
+        return self.kind == "word" and self.value.upper() in words
+
+    def is_op(self, *ops: str) -> bool:
+        return self.kind == "op" and self.value in ops
+
+
+def _tokenize(sql: str) -> List[_Token]:
+    tokens = []
+    pos = 0
+    while pos < len(sql):
+        match = _TOKEN_RE.match(sql, pos)
+        if not match:
+            raise _Unsupported(f"unexpected character {sql[pos]!r}")
+        kind = match.lastgroup
+        text = match.group()
+        if kind == "string":
+            tokens.append(_Token("string", text[1:-1].replace("''", "'"), match.start(), match.end()))
+        elif kind == "quoted":
+            inner = text[1:-1]
+            if text[0] in "\"`":
+                inner = inner.replace(text[0] * 2, text[0])
+            tokens.append(_Token("ident", inner, match.start(), match.end()))
+        elif kind != "space":
+            tokens.append(_Token(kind, text, match.start(), match.end()))
+        pos = match.end()
+    return tokens
+
+
+class _ColumnRef:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class _Aggregate:
+    def __init__(self, func: str, column: Optional[_ColumnRef], distinct: bool, margin: bool = False):
+        self.func = func
+        self.column = column  # None for COUNT(*)
+        self.distinct = distinct
+        self.margin = margin  # confidence interval half-width instead of the value (run_on_sample)
+
+    def signature(self) -> Tuple:
+        return (self.func, self.column.name.lower() if self.column else None, self.distinct, self.margin)
+
+
+class _Item:
+    """One result column: a column, an aggregate, or *"""
+
+    def __init__(self, expr, text: str, alias: Optional[str]):
+        self.expr = expr  # _ColumnRef | _Aggregate | None for *
+        self.text = text
+        self.alias = alias
+
+
+class _Select:
+    def __init__(self):
+        self.items: List[_Item] = []
+        self.source: Optional["_Select"] = None  # subquery in FROM
+        self.where = None
+        self.group_by: List[Any] = []  # _ColumnRef or ordinal
+        self.order_by: List[Tuple[Any, bool]] = []  # (_ColumnRef | _Aggregate | ordinal, ascending)
+        self.limit: Optional[int] = None
+        self.offset: int = 0
+
+
+class _Parser:
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.tokens = _tokenize(sql)
+        self.pos = 0
+        self.table_names = set(_TABLES)
+
+    def peek(self, ahead: int = 0) -> Optional[_Token]:
+        index = self.pos + ahead
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def next(self) -> _Token:
+        token = self.peek()
+        if token is None:
+            raise _Unsupported("unexpected end of statement")
+        self.pos += 1
+        return token
+
+    def accept_word(self, *words: str) -> Optional[_Token]:
+        token = self.peek()
+        if token is not None and token.is_word(*words):
+            self.pos += 1
+            return token
+        return None
+
+    def accept_op(self, *ops: str) -> Optional[_Token]:
+        token = self.peek()
+        if token is not None and token.is_op(*ops):
+            self.pos += 1
+            return token
+        return None
+
+    def expect_word(self, *words: str) -> _Token:
+        token = self.accept_word(*words)
+        if token is None:
+            raise _Unsupported(f"expected {'/'.join(words)}")
+        return token
+
+    def expect_op(self, op: str) -> _Token:
+        token = self.accept_op(op)
+        if token is None:
+            raise _Unsupported(f"expected {op!r}")
+        return token
+
+    def parse(self) -> _Select:
+        select = self.parse_select()
+        self.accept_op(";")
+        if self.peek() is not None:
+            raise _Unsupported(f"unexpected {self.peek().value!r}")
+        return select
+
+    def parse_select(self) -> _Select:
+        select = _Select()
+        self.expect_word("SELECT")
+        if self.accept_word("DISTINCT"):
+            raise _Unsupported("DISTINCT")
+        self.accept_word("ALL")
+
+        # Items are resolved after FROM, which may declare a table alias
+        items_start = self.pos
+        depth = 0
+        while True:
+            token = self.next()
+            if token.is_op("("):
+                depth += 1
+            elif token.is_op(")"):
+                depth -= 1
+            elif depth == 0 and token.is_word("FROM"):
+                break
+        items_end = self.pos - 1
+
+        if self.accept_op("("):
+            select.source = self.parse_select()
+            self.expect_op(")")
+            self._accept_alias()
+        else:
+            table = self.next()
+            if table.kind not in ("word", "ident") or table.value.lower() not in _TABLES:
+                raise _Unsupported("unknown table")
+            alias = self._accept_alias()
+            if alias:
+                self.table_names.add(alias.lower())
+
+        resume = self.pos
+        self.pos = items_start
+        select.items.append(self.parse_item())
+        while self.accept_op(","):
+            select.items.append(self.parse_item())
+        if self.pos != items_end:
+            raise _Unsupported("unsupported select list")
+        self.pos = resume
+
+        if self.accept_word("WHERE"):
+            select.where = self.parse_or()
+        if self.accept_word("GROUP"):
+            self.expect_word("BY")
+            select.group_by.append(self.parse_group_term())
+            while self.accept_op(","):
+                select.group_by.append(self.parse_group_term())
+        if self.peek() is not None and self.peek().is_word("HAVING", "WINDOW", "UNION", "INTERSECT", "EXCEPT"):
+            raise _Unsupported(self.peek().value.upper())
+        if self.accept_word("ORDER"):
+            self.expect_word("BY")
+            select.order_by.append(self.parse_order_term())
+            while self.accept_op(","):
+                select.order_by.append(self.parse_order_term())
+        if self.accept_word("LIMIT"):
+            first = self.parse_int()
+            if self.accept_word("OFFSET"):
+                select.limit, select.offset = first, self.parse_int()
+            elif self.accept_op(","):
+                select.offset, select.limit = first, self.parse_int()
+            else:
+                select.limit = first
+            if select.limit < 0:
+                select.limit = None  # SQLite: a negative LIMIT means none
+            select.offset = max(select.offset, 0)
+        return select
+
+    def _accept_alias(self) -> Optional[str]:
+        if self.accept_word("AS"):
+            token = self.next()
+            if token.kind not in ("word", "ident", "string"):
+                raise _Unsupported("bad alias")
+            return token.value
+        token = self.peek()
+        if token is not None and (token.kind == "ident" or (token.kind == "word" and token.value.upper() not in _RESERVED)):
+            self.pos += 1
+            return token.value
+        return None
+
+    def parse_int(self) -> int:
+        negative = bool(self.accept_op("-"))
+        token = self.next()
+        if token.kind != "number" or not token.value.isdigit():
+            raise _Unsupported("LIMIT/OFFSET must be an integer")
+        return -int(token.value) if negative else int(token.value)
+
+    def parse_item(self) -> _Item:
+        token = self.peek()
+        if token is not None and token.is_op("*"):
+            self.pos += 1
+            return _Item(None, "*", None)
+        if (token is not None and token.kind in ("word", "ident") and self.peek(1) is not None
+                and self.peek(1).is_op(".") and self.peek(2) is not None and self.peek(2).is_op("*")):
+            if token.value.lower() not in self.table_names:
+                raise _Unsupported("unknown table")
+            self.pos += 3
+            return _Item(None, "*", None)
+        start = token.start if token is not None else 0
+        expr = self.parse_value()
+        text = self.sql[start:self.tokens[self.pos - 1].end]
+        return _Item(expr, text, self._accept_alias())
+
+    def parse_value(self):
+        """A column reference or an aggregate of one"""
+        token = self.next()
+        if token.kind == "word" and token.value.upper() in _AGGREGATES and self.peek() is not None and self.peek().is_op("("):
+            self.pos += 1
+            func = token.value.upper()
+            distinct = bool(self.accept_word("DISTINCT"))
+            if self.accept_op("*"):
+                if func != "COUNT" or distinct:
+                    raise _Unsupported("* argument")
+                column = None
+            else:
+                column = self.parse_column()
+            self.expect_op(")")
+            if self.peek() is not None and self.peek().is_word("OVER", "FILTER"):
+                raise _Unsupported("window or filtered aggregate")
+            return _Aggregate(func, column, distinct)
+        self.pos -= 1
+        return self.parse_column()
+
+    def parse_column(self) -> _ColumnRef:
+        token = self.next()
+        if token.kind == "ident" or (token.kind == "word" and token.value.upper() not in _RESERVED):
+            if self.peek() is not None and self.peek().is_op("."):
+                if token.value.lower() not in self.table_names:
+                    raise _Unsupported("unknown table")
+                self.pos += 1
+                token = self.next()
+                if token.kind not in ("word", "ident"):
+                    raise _Unsupported("bad column")
+            if self.peek() is not None and self.peek().is_op("("):
+                raise _Unsupported(f"function {token.value}")
+            return _ColumnRef(token.value)
+        raise _Unsupported(f"unexpected {token.value!r}")
+
+    def parse_group_term(self):
+        token = self.peek()
+        if token is not None and token.kind == "number":
+            return self.parse_int()
+        return self.parse_column()
+
+    def parse_order_term(self) -> Tuple[Any, bool]:
+        token = self.peek()
+        if token is not None and token.kind == "number":
+            key = self.parse_int()
+        else:
+            key = self.parse_value()
+        ascending = not self.accept_word("DESC")
+        if ascending:
+            self.accept_word("ASC")
+        if self.peek() is not None and self.peek().is_word("NULLS", "COLLATE"):
+            raise _Unsupported(self.peek().value.upper())
+        return key, ascending
+
+    # Conditions: ("and", a, b) | ("or", a, b) | ("not", a) | ("cmp", col, op, value)
+    # | ("in", col, values) | ("null", col) | ("between", col, low, high) | ("like", col, pattern)
+
+    def parse_or(self):
+        condition = self.parse_and()
+        while self.accept_word("OR"):
+            condition = ("or", condition, self.parse_and())
+        return condition
+
+    def parse_and(self):
+        condition = self.parse_not()
+        while self.accept_word("AND"):
+            condition = ("and", condition, self.parse_not())
+        return condition
+
+    def parse_not(self):
+        if self.accept_word("NOT"):
+            return ("not", self.parse_not())
+        return self.parse_predicate()
+
+    def parse_predicate(self):
+        if self.accept_op("("):
+            condition = self.parse_or()
+            self.expect_op(")")
+            return condition
+        column = self.parse_column()
+        token = self.next()
+        if token.kind == "op" and token.value in _COMPARISONS:
+            return ("cmp", column, token.value, self.parse_literal())
+        if token.is_word("IS"):
+            negate = bool(self.accept_word("NOT"))
+            self.expect_word("NULL")
+            condition = ("null", column)
+            return ("not", condition) if negate else condition
+        negate = False
+        if token.is_word("NOT"):
+            negate = True
+            token = self.next()
+        if token.is_word("IN"):
+            self.expect_op("(")
+            values = [self.parse_literal()]
+            while self.accept_op(","):
+                values.append(self.parse_literal())
+            self.expect_op(")")
+            condition = ("in", column, values)
+        elif token.is_word("BETWEEN"):
+            low = self.parse_literal()
+            self.expect_word("AND")
+            condition = ("between", column, low, self.parse_literal())
+        elif token.is_word("LIKE"):
+            pattern = self.next()
+            if pattern.kind != "string" or (self.peek() is not None and self.peek().is_word("ESCAPE")):
+                raise _Unsupported("LIKE pattern")
+            condition = ("like", column, pattern.value)
+        else:
+            raise _Unsupported(f"unexpected {token.value!r}")
+        return ("not", condition) if negate else condition
+
+    def parse_literal(self):
+        negative = bool(self.accept_op("-"))
+        token = self.next()
+        if token.kind == "number":
+            if re.fullmatch(r"\d+", token.value):
+                value = int(token.value)
+                if value > _INT64_MAX:
+                    raise _Unsupported("integer out of range")
+            else:
+                value = float(token.value)
+            return -value if negative else value
+        if negative:
+            raise _Unsupported("negated non-number")
+        if token.kind == "string":
+            return token.value
+        if token.is_word("NULL"):
+            return None
+        raise _Unsupported(f"literal {token.value!r}")
+
+
+@lru_cache(maxsize=512)
+def _parse(sql: str):
+    """The parsed statement, or the reason it is unsupported"""
+    try:
+        return _Parser(sql).parse()
+    except _Unsupported as e:
+        return str(e)
+
+
+# --- Execution ---
+
+class _Frame:
+    """Column lookup with SQLite's case-insensitive names and type checks"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.by_lower: Dict[str, str] = {}
+        for col in df.columns:
+            if not isinstance(col, str) or col.lower() in self.by_lower:
+                raise _Unsupported("non-string or duplicate column names")
+            self.by_lower[col.lower()] = col
+        self._kinds: Dict[str, str] = {}
+
+    def resolve(self, ref: _ColumnRef) -> str:
+        name = self.by_lower.get(ref.name.lower())
+        if name is None:
+            raise _Unsupported(f"no column {ref.name}")
+        return name
+
+    def kind(self, name: str) -> str:
+        if name not in self._kinds:
+            kind = column_kind(self.df[name])
+            if kind is None:
+                raise _Unsupported(f"column type {self.df[name].dtype}")
+            self._kinds[name] = kind
+        return self._kinds[name]
+
+
+def column_kind(series: pd.Series) -> Optional[str]:
+    """"int", "float" or "text", or None for types that compare differently in SQLite"""
+    dtype = series.dtype
+    if dtype.kind == "i":
+        return "int"
+    if dtype.kind == "f":
+        return "float"
+    if pd.api.types.is_string_dtype(dtype) and pd.api.types.infer_dtype(series, skipna=True) in ("string", "empty"):
+        return "text"
+    return None
+
+
+def _check_literal(frame: _Frame, name: str, value):
+    kind = frame.kind(name)
+    if value is None:
+        return
+    numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+    if (kind == "text") == numeric:
+        raise _Unsupported("literal type differs from column type")
+
+
+def _compare(values: pd.Series, op: str, literal) -> np.ndarray:
+    if op in ("=", "=="):
+        return (values == literal).to_numpy(dtype=bool)
+    if op in ("!=", "<>"):
+        return (values != literal).to_numpy(dtype=bool)
+    if op == "<":
+        return (values < literal).to_numpy(dtype=bool)
+    if op == "<=":
+        return (values <= literal).to_numpy(dtype=bool)
+    if op == ">":
+        return (values > literal).to_numpy(dtype=bool)
+    return (values >= literal).to_numpy(dtype=bool)
+
+
+def _like_regex(pattern: str) -> "re.Pattern":
+    """SQLite LIKE: % and _ wildcards, case-insensitive for ASCII only"""
+    parts = [".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern]
+    return re.compile("".join(parts), re.IGNORECASE | re.ASCII | re.DOTALL)
+
+
+def _evaluate(condition, frame: _Frame) -> Tuple[np.ndarray, np.ndarray]:
+    """(is true, is false) per row; rows in neither are NULL"""
+    op = condition[0]
+    if op == "and":
+        a_true, a_false = _evaluate(condition[1], frame)
+        b_true, b_false = _evaluate(condition[2], frame)
+        return a_true & b_true, a_false | b_false
+    if op == "or":
+        a_true, a_false = _evaluate(condition[1], frame)
+        b_true, b_false = _evaluate(condition[2], frame)
+        return a_true | b_true, a_false & b_false
+    if op == "not":
+        is_true, is_false = _evaluate(condition[1], frame)
+        return is_false, is_true
+
+    name = frame.resolve(condition[1])
+    series = frame.df[name]
+    null = series.isna().to_numpy()
+    frame.kind(name)
+    if op == "null":
+        return null, ~null
+
+    present = ~null
+    values = series[present]
+    if op == "cmp":
+        literal = condition[3]
+        _check_literal(frame, name, literal)
+        if literal is None:
+            none = np.zeros(len(series), dtype=bool)
+            return none, none
+        matched = _compare(values, condition[2], literal)
+    elif op == "in":
+        for literal in condition[2]:
+            if literal is None:
+                raise _Unsupported("NULL in IN list")
+            _check_literal(frame, name, literal)
+        matched = values.isin(condition[2]).to_numpy(dtype=bool)
+    elif op == "between":
+        low, high = condition[2], condition[3]
+        if low is None or high is None:
+            raise _Unsupported("NULL BETWEEN bound")
+        _check_literal(frame, name, low)
+        _check_literal(frame, name, high)
+        matched = ((values >= low) & (values <= high)).to_numpy(dtype=bool)
+    elif op == "like":
+        if frame.kind(name) != "text":
+            raise _Unsupported("LIKE on a non-text column")
+        regex = _like_regex(condition[2])
+        matched = np.fromiter((regex.fullmatch(v) is not None for v in values), dtype=bool, count=len(values))
+    else:
+        raise _Unsupported(op)
+
+    is_true = np.zeros(len(series), dtype=bool)
+    is_true[present] = matched
+    return is_true, present & ~is_true
+
+
+def _python_values(series: pd.Series, integer: bool = False) -> List[Any]:
+    """Values as SQLite returns them: Python int/float/str, None for NULL"""
+    values = series.tolist()
+    if series.hasnans:
+        values = [None if isinstance(v, float) and v != v else v for v in values]
+    if integer:
+        values = [int(v) if v is not None else None for v in values]
+    return values
+
+
+def _sort_order(keys: List[Tuple[pd.Series, bool]], length: int) -> np.ndarray:
+    """Stable multi-key order, NULLs first ascending and last descending"""
+    order = np.arange(length)
+    for series, ascending in reversed(keys):
+        values = pd.Series(series.to_numpy()[order])
+        ranked = values.sort_values(ascending=ascending, na_position="first" if ascending else "last", kind="mergesort")
+        order = order[ranked.index.to_numpy()]
+    return order
+
+
+def _check_sum(frame: _Frame, name: str, rows: int):
+    """SQLite raises on integer overflow in SUM; leave those to it"""
+    if frame.kind(name) == "int" and rows:
+        largest = frame.df[name].abs().max()
+        if largest and rows * float(largest) >= _INT64_MAX:
+            raise _Unsupported("possible integer overflow")
+
+
+def _aggregate(agg: _Aggregate, frame: _Frame, data: pd.DataFrame, keys: List[str], grouped):
+    """The aggregate per group (grouped) or over all rows, and whether it is an integer"""
+    if agg.column is None:
+        return (grouped.size() if grouped is not None else pd.Series([len(data)])), True
+    name = frame.resolve(agg.column)
+    kind = frame.kind(name)
+    source = grouped[name] if grouped is not None else data[name]
+    if agg.func == "COUNT":
+        result = source.nunique() if agg.distinct else source.count()
+        return (result if grouped is not None else pd.Series([result])), True
+    if agg.distinct:
+        raise _Unsupported("DISTINCT aggregate")
+    if agg.func in ("SUM", "AVG"):
+        if kind == "text":
+            raise _Unsupported("SUM/AVG of text")
+        if agg.func == "SUM":
+            _check_sum(frame, name, len(data))
+            result = source.sum(min_count=1)
+            return (result if grouped is not None else pd.Series([result])), kind == "int"
+        result = source.mean()
+        return (result if grouped is not None else pd.Series([result])), False
+    if kind == "text":
+        return _text_extreme(agg.func, data[name], [data[k] for k in keys] if keys else None), False
+    result = source.min() if agg.func == "MIN" else source.max()
+    return (result if grouped is not None else pd.Series([result])), kind == "int"
+
+
+def _text_extreme(func: str, values: pd.Series, keys: Optional[List[pd.Series]]) -> pd.Series:
+    """
+    MIN/MAX of text skipping NULLs (pandas cannot order str against NaN),
+    via ranks in code point order, which is SQLite's BINARY collation
+    """
+    uniques = sorted(set(values.dropna()))
+    ranks = values.map({v: i for i, v in enumerate(uniques)})
+    if keys is None:
+        ranks = pd.Series([ranks.min() if func == "MIN" else ranks.max()])
+    else:
+        grouped = ranks.groupby(keys, dropna=False, sort=False)
+        ranks = grouped.min() if func == "MIN" else grouped.max()
+    return pd.Series([uniques[int(r)] if r == r else None for r in ranks], dtype=object)
+
+
+def _rollup_aggregate(measures: Dict[str, str]):
+    """
+    _aggregate over a rollup's rows, which hold ROLLUP_ROWS and per measure
+    "<prefix>_sum", "_count", "_min" and "_max" for each combination of
+    dimension values; `measures` maps lower-case measure names to prefixes
+    """
+    def aggregate(agg: _Aggregate, frame: _Frame, data: pd.DataFrame, keys: List[str], grouped):
+        def total(values: pd.Series) -> pd.Series:
+            if grouped is None:
+                return pd.Series([values.sum()])
+            return values.groupby([data[k] for k in keys], dropna=False, sort=False).sum()
+
+        if agg.column is None:
+            return total(data[ROLLUP_ROWS]), True
+        prefix = measures.get(agg.column.name.lower())
+        if agg.distinct or (prefix is None and agg.func in ("MIN", "MAX")):
+            # COUNT(DISTINCT), MIN and MAX of a dimension: same values as the table
+            return _aggregate(agg, frame, data, keys, grouped)
+        if prefix is None:
+            if agg.func != "COUNT":
+                raise _Unsupported("not a rollup measure")
+            name = frame.resolve(agg.column)
+            return total(data[ROLLUP_ROWS].where(data[name].notna(), 0)), True
+
+        integer = frame.kind(f"{prefix}_sum") == "int"
+        counts = total(data[f"{prefix}_count"])
+        if agg.func == "COUNT":
+            return counts, True
+        if agg.func in ("MIN", "MAX"):
+            source = grouped[f"{prefix}_{agg.func.lower()}"] if grouped is not None else data[f"{prefix}_{agg.func.lower()}"]
+            result = source.min() if agg.func == "MIN" else source.max()
+            return (result if grouped is not None else pd.Series([result])), integer
+        sums = total(data[f"{prefix}_sum"])
+        empty = counts.to_numpy() == 0
+        if agg.func == "SUM":
+            return (sums.mask(empty) if empty.any() else sums), integer
+        return (sums / counts).mask(empty), False
+
+    return aggregate
+
+
+def _sample_aggregate(population: int, z: float):
+    """
+    _aggregate estimating the full table's value from a simple random
+    sample of it: COUNT and SUM scaled by population / sample size, AVG as
+    the sample mean. Margin aggregates give the half-width of the
+    confidence interval (normal approximation with finite population
+    correction, `z` standard errors).
+    """
+    def aggregate(agg: _Aggregate, frame: _Frame, data: pd.DataFrame, keys: List[str], grouped):
+        if agg.distinct or agg.func in ("MIN", "MAX"):
+            raise _Unsupported("not estimable from a sample")
+        n = len(frame.df)
+        correction = max(1.0 - n / population, 0.0)
+
+        def total(values: pd.Series) -> pd.Series:
+            if grouped is None:
+                return pd.Series([values.sum()])
+            return values.groupby([data[k] for k in keys], dropna=False, sort=False).sum()
+
+        if agg.column is None:
+            counts = total(pd.Series(1.0, index=data.index))
+        else:
+            name = frame.resolve(agg.column)
+            kind = frame.kind(name)
+            counts = total(data[name].notna().astype(float))
+        if agg.func == "COUNT":
+            share = counts / n
+            if agg.margin:
+                return z * population * np.sqrt(correction * share * (1 - share) / max(n - 1, 1)), False
+            return (share * population).round(), True
+
+        if kind == "text":
+            raise _Unsupported("SUM/AVG of text")
+        values = data[name].astype(float).fillna(0.0)
+        sums = total(values)
+        squares = total(values * values)
+        empty = counts.to_numpy() == 0
+        if agg.func == "SUM":
+            # Every sample row contributes its value if it matched, else 0
+            mean = sums / n
+            variance = ((squares - n * mean ** 2) / max(n - 1, 1)).clip(lower=0)
+            if agg.margin:
+                return (z * population * np.sqrt(correction * variance / n)).mask(empty), False
+            estimate = (mean * population).mask(empty)
+            return (estimate.round(), True) if kind == "int" else (estimate, False)
+        mean = sums / counts
+        if agg.margin:
+            variance = ((squares - counts * mean ** 2) / (counts - 1)).clip(lower=0)
+            return (z * np.sqrt(correction * variance / counts)).mask(counts.to_numpy() < 2), False
+        return mean.mask(empty), False
+
+    return aggregate
+
+
+def _rollup_columns(select: _Select) -> Tuple[set, set, set]:
+    """
+    Lower-case columns a grouped statement reads as dimensions (keys,
+    filters, COUNT(DISTINCT)), as measures (SUM, AVG), and as either
+    (COUNT, MIN, MAX)
+    """
+    dimensions, measures, either = set(), set(), set()
+
+    def filtered(condition):
+        if condition[0] in ("and", "or"):
+            filtered(condition[1])
+            filtered(condition[2])
+        elif condition[0] == "not":
+            filtered(condition[1])
+        else:
+            dimensions.add(condition[1].name.lower())
+
+    if select.where is not None:
+        filtered(select.where)
+    for term in select.group_by:
+        if isinstance(term, _ColumnRef):
+            dimensions.add(term.name.lower())
+    for item in select.items:
+        if item.expr is None:
+            raise _Unsupported("* with GROUP BY or aggregates")
+        if isinstance(item.expr, _ColumnRef):
+            dimensions.add(item.expr.name.lower())
+        elif item.expr.column is not None:
+            name = item.expr.column.name.lower()
+            if item.expr.distinct:
+                dimensions.add(name)
+            elif item.expr.func in ("SUM", "AVG"):
+                measures.add(name)
+            else:
+                either.add(name)
+    return dimensions, measures, either
+
+
+def _unique_names(columns: List[str]) -> List[str]:
+    """
+    SQLite's names for a subquery's columns: repeats (ignoring case) get
+    ":1", ":2"... and after four tries a random suffix, which we leave to it
+    """
+    seen = set()
+    names = []
+    for name in columns:
+        attempt = 0
+        while name.lower() in seen:
+            if attempt == 4:
+                raise _Unsupported("repeated column names")
+            attempt += 1
+            name = f"{re.sub(r'(?<=.):[0-9]*$', '', name)}:{attempt}"
+        seen.add(name.lower())
+        names.append(name)
+    return names
+
+
+def _execute(
+    select: _Select, df: pd.DataFrame, aggregate=_aggregate, subquery: bool = False
+) -> Tuple[List[str], List[List[Any]]]:
+    """
+    Run a parsed statement; returns result column names and column values.
+    `aggregate` computes aggregates (see _aggregate and _rollup_aggregate).
+    A `subquery` names unaliased columns as written, as SQLite does there
+    (at the top level it uses the table's spelling).
+    """
+    if select.source is not None:
+        if len(select.items) != 1 or select.items[0].expr is not None or select.where or select.group_by or select.order_by:
+            raise _Unsupported("only SELECT * FROM (subquery) LIMIT")
+        columns, values = _execute(select.source, df, aggregate, subquery=True)
+        end = None if select.limit is None else select.offset + select.limit
+        return _unique_names(columns), [v[select.offset:end] for v in values]
+
+    frame = _Frame(df)
+    data = df
+    if select.where is not None:
+        is_true, _ = _evaluate(select.where, frame)
+        data = df[is_true]
+
+    aggregates = [item for item in select.items if isinstance(item.expr, _Aggregate)]
+    if aggregates or select.group_by:
+        return _execute_grouped(select, frame, data, aggregate, subquery)
+    if aggregate is not _aggregate:
+        raise _Unsupported("projection of pre-aggregated rows")
+
+    # Projection: result columns are input columns
+    columns: List[str] = []
+    sources: List[str] = []
+    for item in select.items:
+        names = list(df.columns) if item.expr is None else [frame.resolve(item.expr)]
+        for name in names:
+            frame.kind(name)
+            sources.append(name)
+            if item.expr is None:
+                columns.append(name)
+            elif item.alias is not None:
+                columns.append(item.alias)
+            else:
+                columns.append(item.expr.name if subquery else name)
+
+    keys = []
+    for key, ascending in select.order_by:
+        if isinstance(key, int):
+            if not 1 <= key <= len(sources):
+                raise _Unsupported("ORDER BY position")
+            name = sources[key - 1]
+        elif isinstance(key, _Aggregate):
+            raise _Unsupported("aggregate in ORDER BY")
+        else:
+            matches = [i for i, c in enumerate(columns) if c.lower() == key.name.lower()]
+            if len(matches) > 1 and len({sources[i] for i in matches}) > 1:
+                raise _Unsupported("ambiguous ORDER BY")
+            name = sources[matches[0]] if matches else frame.resolve(key)
+            frame.kind(name)
+        keys.append((data[name], ascending))
+
+    order = _sort_order(keys, len(data)) if keys else np.arange(len(data))
+    end = None if select.limit is None else select.offset + select.limit
+    order = order[select.offset:end]
+    rows = data.iloc[order]
+    return columns, [_python_values(rows[name]) for name in sources]
+
+
+def _execute_grouped(
+    select: _Select, frame: _Frame, data: pd.DataFrame, aggregate, subquery: bool
+) -> Tuple[List[str], List[List[Any]]]:
+    keys: List[str] = []
+    for term in select.group_by:
+        if isinstance(term, int):
+            if not 1 <= term <= len(select.items) or not isinstance(select.items[term - 1].expr, _ColumnRef):
+                raise _Unsupported("GROUP BY position")
+            term = select.items[term - 1].expr
+        elif any(item.alias and item.alias.lower() == term.name.lower() for item in select.items):
+            raise _Unsupported("GROUP BY alias")
+        name = frame.resolve(term)
+        frame.kind(name)
+        if name not in keys:
+            keys.append(name)
+
+    grouped = data.groupby(keys, dropna=False, sort=False) if keys else None
+    key_frame = grouped.size().index.to_frame(index=False) if keys else None
+
+    columns: List[str] = []
+    outputs: List[Tuple[pd.Series, bool]] = []
+    for item in select.items:
+        if item.expr is None:
+            raise _Unsupported("* with GROUP BY or aggregates")
+        if isinstance(item.expr, _ColumnRef):
+            name = frame.resolve(item.expr)
+            if name not in keys:
+                raise _Unsupported("bare column outside GROUP BY")
+            outputs.append((key_frame[name], frame.kind(name) == "int"))
+            columns.append(item.alias if item.alias is not None else item.expr.name if subquery else name)
+        else:
+            result, integer = aggregate(item.expr, frame, data, keys, grouped)
+            outputs.append((pd.Series(np.asarray(result, dtype=object) if result.dtype == object else result.to_numpy()), integer))
+            columns.append(item.alias if item.alias is not None else item.text)
+
+    length = len(key_frame) if keys else 1
+    # SQLite emits groups in key order
+    order_keys = [(key_frame[name], True) for name in keys]
+    for key, ascending in select.order_by:
+        if isinstance(key, int):
+            if not 1 <= key <= len(outputs):
+                raise _Unsupported("ORDER BY position")
+            series = outputs[key - 1][0]
+        elif isinstance(key, _Aggregate):
+            positions = [i for i, item in enumerate(select.items)
+                         if isinstance(item.expr, _Aggregate) and item.expr.signature() == key.signature()]
+            if not positions:
+                raise _Unsupported("ORDER BY aggregate not selected")
+            series = outputs[positions[0]][0]
+        else:
+            positions = [i for i, c in enumerate(columns) if c.lower() == key.name.lower()]
+            if positions:
+                series = outputs[positions[0]][0]
+            else:
+                name = frame.resolve(key)
+                if name not in keys:
+                    raise _Unsupported("ORDER BY column outside GROUP BY")
+                series = key_frame[name]
+        order_keys.append((series, ascending))
+    # Explicit ORDER BY keys first, ties in group order
+    order_keys = order_keys[len(keys):] + order_keys[:len(keys)]
+    order = _sort_order(order_keys, length) if order_keys else np.arange(length)
+
+    end = None if select.limit is None else select.offset + select.limit
+    order = order[select.offset:end]
+    return columns, [_python_values(pd.Series(series.to_numpy()[order]), integer) for series, integer in outputs]
+
+
+def run_fastpath(df: pd.DataFrame, sql: str) -> Optional[pd.DataFrame]:
+    """
+    Run `sql` on `df` without SQLite if it is in the supported subset.
+
+    Returns:
+        The result, built exactly like the SQL engine's, or None to use
+        the SQL engine
+    """
+    select = _parse(sql.strip())
+    if isinstance(select, str):
+        _fastpath.inc(result="unsupported_sql")
+        return None
+    try:
+        with span("sql_fastpath"):
+            columns, values = _execute(select, df)
+    except _Unsupported:
+        _fastpath.inc(result="unsupported_data")
+        return None
+    except Exception as e:
+        print(f"Warning: SQL fast path failed ({e.__class__.__name__}: {e}); using SQLite")
+        _fastpath.inc(result="error")
+        return None
+    _fastpath.inc(result="hit")
+    return pd.DataFrame.from_records(list(zip(*values)) if values else [], columns=columns)
+
+
+def run_on_rollups(rollups: Sequence, sql: str) -> Optional[pd.DataFrame]:
+    """
+    Answer a grouped query from the smallest rollup that has all the
+    dimensions and measures it reads (see app.services.rollups: each
+    rollup has `frame`, `dimensions` and `measures`, a dict of measure
+    column to stat column prefix).
+
+    Returns:
+        The result, as run_fastpath() would return it on the full table,
+        or None if no rollup covers the query
+    """
+    select = _parse(sql.strip())
+    if isinstance(select, str):
+        return None
+    inner = select.source if select.source is not None else select
+    if inner.source is not None or not (inner.group_by or any(isinstance(i.expr, _Aggregate) for i in inner.items)):
+        return None
+    try:
+        dimensions, measures, either = _rollup_columns(inner)
+    except _Unsupported:
+        return None
+
+    best = None
+    for rollup in rollups:
+        rollup_dimensions = {d.lower() for d in rollup.dimensions}
+        rollup_measures = {m.lower() for m in rollup.measures}
+        if (dimensions <= rollup_dimensions and measures <= rollup_measures
+                and either <= rollup_dimensions | rollup_measures
+                and (best is None or len(rollup.frame) < len(best.frame))):
+            best = rollup
+    if best is None:
+        return None
+
+    aggregate = _rollup_aggregate({m.lower(): prefix for m, prefix in best.measures.items()})
+    try:
+        with span("sql_rollup"):
+            columns, values = _execute(select, best.frame, aggregate)
+    except _Unsupported:
+        return None
+    except Exception as e:
+        print(f"Warning: rollup query failed ({e.__class__.__name__}: {e}); using the table")
+        _fastpath.inc(result="error")
+        return None
+    _fastpath.inc(result="rollup")
+    return pd.DataFrame.from_records(list(zip(*values)) if values else [], columns=columns)
+
+
+def run_on_sample(
+    sample: pd.DataFrame,
+    population: int,
+    sql: str,
+    confidence: float
+) -> Optional[Tuple[pd.DataFrame, Dict[str, List[Optional[float]]]]]:
+    """
+    Estimate an aggregate query's result on a table of `population` rows
+    from a simple random sample of it. Only COUNT, SUM and AVG can be
+    estimated; groups with no sample rows are missing from the result.
+
+    Returns:
+        Tuple of (estimated result, {aggregate column: half-width of its
+        `confidence` interval per row}), or None if the query cannot be
+        estimated from a sample
+    """
+    select = _parse(sql.strip())
+    if isinstance(select, str):
+        return None
+    inner = select.source if select.source is not None else select
+    if inner.source is not None:
+        return None
+    positions = [i for i, item in enumerate(inner.items) if isinstance(item.expr, _Aggregate)]
+    if not positions:
+        return None  # rows or bare groups of the sample say nothing about the table's
+    ordinals = [term for term in inner.group_by if isinstance(term, int)]
+    ordinals += [key for key, _ in inner.order_by if isinstance(key, int)]
+    if any(not 1 <= term <= len(inner.items) for term in ordinals):
+        return None  # out of range for SQLite, but not once the margins are added
+
+    # The margins ride along as extra result columns, so they get the
+    # same grouping, order and LIMIT as the estimates
+    widened = copy.copy(inner)
+    widened.items = inner.items + [
+        _Item(_Aggregate(inner.items[i].expr.func, inner.items[i].expr.column, inner.items[i].expr.distinct, margin=True),
+              f"__margin_{j}", None)
+        for j, i in enumerate(positions)
+    ]
+    if select.source is not None:
+        select = copy.copy(select)
+        select.source = widened
+    else:
+        select = widened
+
+    aggregate = _sample_aggregate(population, NormalDist().inv_cdf(0.5 + confidence / 2))
+    try:
+        with span("sql_sample"):
+            columns, values = _execute(select, sample, aggregate)
+    except _Unsupported:
+        return None
+    except Exception as e:
+        print(f"Warning: sampled query failed ({e.__class__.__name__}: {e}); running it exactly")
+        _fastpath.inc(result="error")
+        return None
+    _fastpath.inc(result="sample")
+
+    width = len(inner.items)
+    margins = {columns[i]: values[width + j] for j, i in enumerate(positions)}
+    result = pd.DataFrame.from_records(list(zip(*values[:width])), columns=columns[:width])
+    return result, margins
@@ -0,0 +1,284 @@
+"""
+SQL Validator - Checks generated SQL before any data is loaded.
+The statement is compiled by SQLite against an empty table with the data
+source's columns (the same schema the execution engine creates), so syntax
+and column names are checked by the engine that will run it. An authorizer
+allows only reads, and EXPLAIN QUERY PLAN plus the table profile give a
+cost estimate: queries over QUERY_MAX_COST are rejected, and queries that
+may return more than QUERY_MAX_RESULT_ROWS get a LIMIT.
+"""
+
+import math
+import re
+import sqlite3
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.metrics import counter
+from app.services.sql_engine import TABLE_NAME
+from app.services.table_profile import TableProfile
+
+
+_validations = counter(
+    "lumiere_sql_validation_total",
+    "Generated SQL validation outcomes",
+    label_names=("result",)
+)
+
+_ALLOWED_ACTIONS = {
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    getattr(sqlite3, "SQLITE_RECURSIVE", 33),
+}
+
+_TRAILING_LIMIT_RE = re.compile(r"\blimit\s+(\d+)(?:\s*(?:offset\s+\d+|,\s*\d+))?\s*$", re.IGNORECASE)
+_SEARCH_COLUMNS_RE = re.compile(r"\((.*)\)\s*$")
+_GROUP_BY_RE = re.compile(r"\bgroup\s+by\s+(.*?)\s*(?:\bhaving\b|\border\s+by\b|\blimit\b|\bwindow\b|$)", re.IGNORECASE | re.DOTALL)
+_QUOTED_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]")
+_SELECT_LIST_RE = re.compile(r"\bselect\b(.*?)(?:\bfrom\b|$)", re.IGNORECASE | re.DOTALL)
+_NOT_SINGLE_ROW_RE = re.compile(r"\bgroup\s+by\b|\bover\b|\bwindow\b|\bunion\b|\bintersect\b|\bexcept\b", re.IGNORECASE)
+# min()/max() with one argument aggregate; with several they are scalar functions
+_AGGREGATE_RE = re.compile(r"\b(?:count|sum|avg|total|group_concat)\s*\(|\b(?:min|max)\s*\(\)", re.IGNORECASE)
+
+
+class SQLValidationError(Exception):
+    """Generated SQL that must not be executed"""
+
+
+class ValidatedSQL:
+    """SQL accepted for execution, with its plan and estimates"""
+
+    def __init__(self, sql: str, plan: List[str], estimated_cost: float, estimated_rows: float, limited: bool):
+        self.sql = sql
+        self.plan = plan
+        self.estimated_cost = estimated_cost
+        self.estimated_rows = estimated_rows
+        self.limited = limited
+
+
+def _sqlite_type(dtype: str) -> str:
+    if dtype.startswith(("int", "uint", "bool")):
+        return "INTEGER"
+    if dtype.startswith("float"):
+        return "REAL"
+    if dtype.startswith("datetime"):
+        return "TIMESTAMP"
+    return "TEXT"
+
+
+def _quote(identifier: str) -> str:
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _schema_db(profile: TableProfile) -> sqlite3.Connection:
+    """Empty in-memory database with the execution schema"""
+    conn = sqlite3.connect(":memory:")
+    columns = ", ".join(f"{_quote(c)} {_sqlite_type(profile.column_types.get(c, ''))}" for c in profile.columns)
+    conn.execute(f"CREATE TABLE {TABLE_NAME} ({columns})")
+    conn.execute(f"CREATE VIEW df AS SELECT * FROM {TABLE_NAME}")
+    return conn
+
+
+def _explain(profile: TableProfile, sql: str) -> Tuple[List[Tuple[int, int, str]], Set[str]]:
+    """
+    Compile the statement and return its plan and the columns it reads.
+
+    Raises:
+        SQLValidationError: Not a single read-only statement, or invalid
+    """
+    conn = _schema_db(profile)
+    columns_read: Set[str] = set()
+    denied: List[int] = []
+
+    def authorize(action, arg1, arg2, db_name, source):
+        if action not in _ALLOWED_ACTIONS:
+            denied.append(action)
+            return sqlite3.SQLITE_DENY
+        if action == sqlite3.SQLITE_READ and arg1 == TABLE_NAME and arg2:
+            columns_read.add(arg2)
+        return sqlite3.SQLITE_OK
+
+    conn.set_authorizer(authorize)
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    except (sqlite3.ProgrammingError, sqlite3.Warning):
+        raise SQLValidationError("Only a single SQL statement is allowed")
+    except sqlite3.DatabaseError as e:
+        if denied:
+            raise SQLValidationError("Only read-only SELECT queries are allowed")
+        raise SQLValidationError(f"Invalid SQL: {e}")
+    finally:
+        conn.close()
+    return [(row[0], row[1], row[3]) for row in rows], columns_read
+
+
+def _search_rows(detail: str, profile: TableProfile) -> float:
+    """Rows matched per lookup of an index SEARCH, from distinct counts"""
+    if "PRIMARY KEY" in detail or "rowid" in detail:
+        return 1.0
+    match = _SEARCH_COLUMNS_RE.search(detail)
+    if not match:
+        return float(profile.row_count)
+    selectivity = 1.0
+    for term in match.group(1).split(" AND "):
+        column = term.split("=")[0].split(">")[0].split("<")[0].strip()
+        distinct = profile.distinct_counts.get(column)
+        if distinct and "=" in term:
+            selectivity *= 1.0 / distinct
+    return max(profile.row_count * selectivity, 1.0)
+
+
+def _group_by_columns(sql: str, profile: TableProfile) -> Optional[Set[str]]:
+    """Columns of the query's last GROUP BY, if every term is a plain column"""
+    matches = _GROUP_BY_RE.findall(sql)
+    if not matches:
+        return None
+    columns = set()
+    for term in matches[-1].split(","):
+        name = term.strip().split(".")[-1].strip('"`[] ')
+        if name not in profile.distinct_counts:
+            return None
+        columns.add(name)
+    return columns
+
+
+def _top_level(sql: str) -> str:
+    """
+    The statement with literals and quoted names blanked and parenthesized
+    parts emptied (keeping only the argument-separating commas of calls),
+    so subqueries and CTE bodies do not look like the main query.
+    """
+    out = []
+    depth = 0
+    for ch in _QUOTED_RE.sub(" x ", sql):
+        if ch == "(":
+            depth += 1
+            if depth == 1:
+                out.append(ch)
+        elif ch == ")":
+            depth = max(depth - 1, 0)
+            if depth == 0:
+                out.append(ch)
+        elif depth == 0 or (depth == 1 and ch == ","):
+            out.append(ch)
+    return "".join(out)
+
+
+def _is_single_row_aggregate(sql: str) -> bool:
+    """Whether the main SELECT aggregates without GROUP BY (one result row)"""
+    top = _top_level(sql)
+    select_list = _SELECT_LIST_RE.search(top)
+    if not select_list or _NOT_SINGLE_ROW_RE.search(top):
+        return False
+    return bool(_AGGREGATE_RE.search(select_list.group(1)))
+
+
+def estimate_cost(
+    plan: List[Tuple[int, int, str]],
+    profile: TableProfile,
+    grouping_columns: Set[str],
+    single_row: bool = False
+) -> Tuple[float, float]:
+    """
+    Estimate (row operations, result rows upper bound) from a query plan.
+
+    Loops at one level of the plan nest (joins multiply); subqueries add
+    their own cost, correlated ones once per outer row. Every scanned
+    table or materialized subquery is assumed to have at most the table's
+    row count. A grouped result has at most as many rows as there are
+    combinations of `grouping_columns`; an aggregate without GROUP BY
+    (`single_row`) and a SELECT without FROM return one row.
+    """
+    n = float(max(profile.row_count, 1))
+    children: Dict[int, List[Tuple[int, str]]] = {}
+    for node_id, parent, detail in plan:
+        children.setdefault(parent, []).append((node_id, detail))
+
+    def level(parent: int, outer: float) -> Tuple[float, float]:
+        rows = 1.0
+        cost = 0.0
+        compound_rows: Optional[float] = None
+        for node_id, detail in children.get(parent, []):
+            if detail == "SCAN CONSTANT ROW":
+                cost += outer
+            elif detail.startswith("SCAN"):
+                rows *= n
+                cost += outer * rows
+            elif detail.startswith("SEARCH"):
+                if "AUTOMATIC" in detail:
+                    cost += outer * n  # building the index
+                rows *= _search_rows(detail, profile)
+                cost += outer * rows * math.log2(n + 1)
+            elif detail.startswith("USE TEMP B-TREE"):
+                cost += outer * rows * math.log2(rows + 1)
+            elif detail.startswith("CORRELATED"):
+                cost += level(node_id, outer * rows)[0]
+            else:  # MATERIALIZE, CO-ROUTINE, SCALAR SUBQUERY, COMPOUND and its parts
+                sub_cost, sub_rows = level(node_id, outer)
+                cost += sub_cost
+                if detail.startswith("COMPOUND"):
+                    rows *= sub_rows
+                elif detail.startswith(("LEFT-MOST", "UNION", "INTERSECT", "EXCEPT")):
+                    compound_rows = (compound_rows or 0.0) + sub_rows
+        if compound_rows is not None:
+            rows = compound_rows
+        return cost, rows
+
+    cost, rows = level(0, 1.0)
+    grouped = any(
+        parent == 0 and detail.startswith(("USE TEMP B-TREE FOR GROUP BY", "USE TEMP B-TREE FOR DISTINCT"))
+        for _, parent, detail in plan
+    )
+    if grouped and grouping_columns:
+        # +1: NULL forms its own group
+        rows = min(rows, math.prod(profile.distinct_counts.get(c, 0) + 1 for c in grouping_columns))
+    if single_row:
+        rows = min(rows, 1.0)
+    return cost, rows
+
+
+def validate_sql(sql: str, profile: TableProfile) -> ValidatedSQL:
+    """
+    Validate generated SQL against a data source's profile.
+
+    Returns:
+        The SQL to execute (with a LIMIT added if it could return more
+        than QUERY_MAX_RESULT_ROWS rows), its plan and estimates
+
+    Raises:
+        SQLValidationError: Invalid, not read-only, or too expensive
+    """
+    sql = (sql or "").strip().rstrip(";").strip()
+    if not sql:
+        _validations.inc(result="invalid")
+        raise SQLValidationError("Empty SQL")
+
+    try:
+        plan, columns_read = _explain(profile, sql)
+    except SQLValidationError:
+        _validations.inc(result="invalid")
+        raise
+
+    cost, rows = estimate_cost(
+        plan, profile, _group_by_columns(sql, profile) or columns_read, _is_single_row_aggregate(sql)
+    )
+    if cost > settings.QUERY_MAX_COST:
+        _validations.inc(result="too_expensive")
+        raise SQLValidationError(
+            f"Query is too expensive to run (about {cost:.3g} row operations, limit "
+            f"{settings.QUERY_MAX_COST:.3g}); filter or aggregate before joining"
+        )
+
+    trailing_limit = _TRAILING_LIMIT_RE.search(sql)
+    if trailing_limit:
+        rows = min(rows, int(trailing_limit.group(1)))
+
+    limited = rows > settings.QUERY_MAX_RESULT_ROWS
+    if limited:
+        # Newlines keep a trailing -- comment from swallowing the wrapper
+        sql = f"SELECT * FROM (\n{sql}\n) LIMIT {settings.QUERY_MAX_RESULT_ROWS}"
+        rows = settings.QUERY_MAX_RESULT_ROWS
+    _validations.inc(result="limited" if limited else "ok")
+
+    return ValidatedSQL(sql, [detail for _, _, detail in plan], cost, rows, limited)
@@ -0,0 +1,206 @@
+"""
+Storage Service - Per-user and per-data-source storage accounting.
+Every file the application writes under UPLOAD_DIR is recorded with its size
+in storage_usage when it is written or deleted, so totals and quotas are a
+SUM over an indexed table. A periodic reconciliation scan fixes drift.
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import delete, func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.utils import calculate_storage_size
+from app.models.data_source import DataSource
+from app.models.system import StorageUsage
+
+
+# Subdirectory of UPLOAD_DIR -> kind, for files found by reconciliation.
+# Uploads are stored in UPLOAD_DIR itself and recognized by their DataSource.
+_KIND_BY_DIR = {
+    "samples": "sample",
+    "results": "result_cache",
+    "vectors": "vector_index",
+}
+
+# Files written for a user are named user_<id>_...
+_USER_FILE_RE = re.compile(r"^user_(\d+)_")
+
+
+def _normalize(path: str) -> str:
+    return os.path.normpath(path)
+
+
+def _scan_tree(root: str) -> Dict[str, int]:
+    """path -> size for every file below root"""
+    sizes = {}
+    for directory, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                sizes[_normalize(path)] = os.path.getsize(path)
+            except OSError:
+                pass  # removed while scanning
+    return sizes
+
+
+class StorageService:
+    """Service for recording and querying stored bytes"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # --- Recording (no commit: call inside the transaction of the change) ---
+
+    def record_file(
+        self,
+        path: str,
+        kind: str,
+        user_id: Optional[int] = None,
+        data_source_id: Optional[int] = None
+    ) -> int:
+        """
+        Record (or update) the size of a file that was just written.
+
+        Returns:
+            Size in bytes
+        """
+        size = os.path.getsize(path)
+        values = {"kind": kind, "user_id": user_id, "data_source_id": data_source_id, "bytes": size}
+        stmt = insert(StorageUsage).values(path=_normalize(path), **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StorageUsage.path],
+            set_={**values, "updated_at": func.now()}
+        )
+        self.db.execute(stmt)
+        return size
+
+    def forget_file(self, path: str):
+        """Drop the record of a file that was deleted"""
+        self.db.execute(delete(StorageUsage).where(StorageUsage.path == _normalize(path)))
+
+    # --- Totals ---
+
+    def user_bytes(self, user_id: int) -> int:
+        return self.db.query(func.coalesce(func.sum(StorageUsage.bytes), 0)).filter(
+            StorageUsage.user_id == user_id
+        ).scalar()
+
+    def total_bytes(self) -> int:
+        return self.db.query(func.coalesce(func.sum(StorageUsage.bytes), 0)).scalar()
+
+    def check_quota(self, user_id: int, incoming_bytes: int):
+        """Raise 413 if storing incoming_bytes would exceed the user's quota"""
+        quota_mb = settings.STORAGE_QUOTA_MB_PER_USER
+        if quota_mb <= 0:
+            return
+        used = self.user_bytes(user_id)
+        if used + incoming_bytes > quota_mb * 1024 * 1024:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Storage quota exceeded: using {calculate_storage_size(used)} of {quota_mb} MB"
+            )
+
+    # --- Reconciliation ---
+
+    def reconcile(self) -> Dict[str, int]:
+        """
+        Compare storage_usage with the files under UPLOAD_DIR and fix drift.
+
+        Subdirectories are scanned in parallel. Rows touched after the scan
+        started are left alone, so concurrent uploads/deletes are not undone.
+
+        Returns:
+            Counts of files scanned, inserted, updated and deleted rows
+        """
+        started = datetime.now(timezone.utc)
+        on_disk = self._scan_parallel(settings.UPLOAD_DIR)
+
+        tracked = {
+            row.path: row
+            for row in self.db.query(
+                StorageUsage.id, StorageUsage.path, StorageUsage.bytes, StorageUsage.updated_at
+            ).all()
+        }
+        stable = lambda row: row.updated_at is None or row.updated_at < started
+
+        stale_ids = [row.id for path, row in tracked.items() if path not in on_disk and stable(row)]
+        resized = [
+            {"id": row.id, "bytes": on_disk[path]}
+            for path, row in tracked.items()
+            if path in on_disk and row.bytes != on_disk[path] and stable(row)
+        ]
+        untracked = [path for path in on_disk if path not in tracked]
+
+        for start in range(0, len(stale_ids), 1000):
+            self.db.execute(delete(StorageUsage).where(StorageUsage.id.in_(stale_ids[start:start + 1000])))
+        if resized:
+            self.db.execute(update(StorageUsage), resized)
+        if untracked:
+            self.db.execute(
+                insert(StorageUsage).on_conflict_do_nothing(index_elements=[StorageUsage.path]),
+                self._describe(untracked, on_disk)
+            )
+        self.db.commit()
+
+        return {
+            "scanned": len(on_disk),
+            "inserted": len(untracked),
+            "updated": len(resized),
+            "deleted": len(stale_ids),
+        }
+
+    @staticmethod
+    def _scan_parallel(root: str) -> Dict[str, int]:
+        if not os.path.isdir(root):
+            return {}
+
+        sizes: Dict[str, int] = {}
+        subdirs: List[str] = []
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    sizes[_normalize(entry.path)] = entry.stat().st_size
+
+        with ThreadPoolExecutor(max_workers=settings.STORAGE_SCAN_WORKERS) as pool:
+            for result in pool.map(_scan_tree, subdirs):
+                sizes.update(result)
+        return sizes
+
+    def _describe(self, paths: List[str], sizes: Dict[str, int]) -> List[Dict]:
+        """
+        Rows for untracked files: files in UPLOAD_DIR that are a data
+        source's file are uploads, others get their kind from their
+        directory; the owner comes from the data source or the name.
+        """
+        data_sources = {}
+        for start in range(0, len(paths), 1000):
+            for ds in self.db.query(DataSource.id, DataSource.connection_string, DataSource.owner_user_id).filter(
+                DataSource.connection_string.in_(paths[start:start + 1000])
+            ):
+                data_sources[_normalize(ds.connection_string)] = ds
+
+        upload_root = _normalize(settings.UPLOAD_DIR)
+        rows = []
+        for path in paths:
+            relative = os.path.relpath(path, upload_root)
+            top = relative.split(os.sep, 1)[0] if os.sep in relative else ""
+            ds = data_sources.get(path)
+            match = _USER_FILE_RE.match(os.path.basename(path))
+            rows.append({
+                "path": path,
+                "kind": "upload" if ds and not top else _KIND_BY_DIR.get(top, "other"),
+                "user_id": ds.owner_user_id if ds else (int(match.group(1)) if match else None),
+                "data_source_id": ds.id if ds else None,
+                "bytes": sizes[path],
+            })
+        return rows
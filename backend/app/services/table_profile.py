@@ -0,0 +1,143 @@
+"""
+Table Profile - Cached schema, statistics and data of CSV data sources.
+A profile (columns, types, row count, per-column distinct/null counts and
+sample rows) is computed once per file version and reused to prompt the
+LLM and to validate SQL without loading the data again. The most recently
+used DataFrames are kept too, so repeated queries on a source skip the
+CSV parse.
+"""
+
+import difflib
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.timing import span
+from app.services.usage_service import measure_resources
+
+
+_MISSING_COLUMN_RE = re.compile(r"no such column: ([\w.]+)")
+
+
+class TableProfile:
+    """Schema and statistics of one version of a data file"""
+
+    def __init__(
+        self,
+        columns: List[str],
+        column_types: Dict[str, str],
+        row_count: int,
+        distinct_counts: Dict[str, int],
+        null_counts: Dict[str, int],
+        sample_data: List[Dict[str, Any]]
+    ):
+        self.columns = columns
+        self.column_types = column_types
+        self.row_count = row_count
+        self.distinct_counts = distinct_counts
+        self.null_counts = null_counts
+        self.sample_data = sample_data
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "TableProfile":
+        return cls(
+            columns=df.columns.tolist(),
+            column_types={col: str(dtype) for col, dtype in df.dtypes.items()},
+            row_count=len(df),
+            distinct_counts={col: int(n) for col, n in df.nunique(dropna=True).items()},
+            null_counts={col: int(n) for col, n in df.isna().sum().items()},
+            sample_data=df.head(5).to_dict('records')
+        )
+
+    def relevant_columns(self, *texts: str) -> List[str]:
+        """
+        Columns named in `texts` (e.g. failing SQL and its error), plus the
+        closest matches of names SQLite reported as missing.
+        """
+        found = []
+        for col in self.columns:
+            pattern = r"(?<![\w])" + re.escape(str(col)) + r"(?![\w])"
+            if any(re.search(pattern, text, re.IGNORECASE) for text in texts):
+                found.append(col)
+        for text in texts:
+            for missing in _MISSING_COLUMN_RE.findall(text):
+                for col in difflib.get_close_matches(missing.split(".")[-1], [str(c) for c in self.columns], n=3, cutoff=0.5):
+                    if col not in found:
+                        found.append(col)
+        return found
+    
+    def column_profiles(self, columns: List[str]) -> List[Dict[str, Any]]:
+        """Type, distinct/null counts and example values per column"""
+        return [
+            {
+                "name": col,
+                "type": self.column_types.get(col, "unknown"),
+                "distinct": self.distinct_counts.get(col, 0),
+                "nulls": self.null_counts.get(col, 0),
+                "examples": [row.get(col) for row in self.sample_data[:3]]
+            }
+            for col in columns
+        ]
+    
+    @property
+    def table_schema(self) -> Dict[str, Any]:
+        """Schema in the shape the LLM prompts expect"""
+        return {
+            "columns": self.columns,
+            "row_count": self.row_count,
+            "column_types": self.column_types
+        }
+
+
+# Profiles by (path, mtime, size), so a rewritten file gets a new profile
+_profiles: TTLCache[TableProfile] = TTLCache(
+    "table_profile",
+    ttl=settings.TABLE_PROFILE_CACHE_TTL_SECONDS,
+    max_size=settings.TABLE_PROFILE_CACHE_SIZE
+)
+
+
+# Parsed DataFrames, shared between requests: treat them as read-only
+_frames: TTLCache[pd.DataFrame] = TTLCache(
+    "dataframe",
+    ttl=settings.DATAFRAME_CACHE_TTL_SECONDS,
+    max_size=settings.DATAFRAME_CACHE_SIZE
+)
+
+
+def file_version(path: str):
+    """Cache key of the file's current contents: (path, mtime, size)"""
+    stat = os.stat(path)
+    return (os.path.normpath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def cached_profile(path: str) -> Optional[TableProfile]:
+    """The cached profile of the file's current version, if any"""
+    return _profiles.get(file_version(path))
+
+
+def store_profile(path: str, df: pd.DataFrame) -> TableProfile:
+    """Profile a freshly loaded DataFrame of the file and cache both"""
+    key = file_version(path)
+    profile = TableProfile.from_frame(df)
+    _profiles.set(key, profile)
+    _frames.set(key, df)
+    return profile
+
+
+def load_frame(path: str) -> pd.DataFrame:
+    """
+    The file's DataFrame, parsed once per file version. The result is
+    shared: callers must not modify it.
+    """
+    key = file_version(path)
+    df = _frames.get(key)
+    if df is None:
+        with span("csv_load"), measure_resources():
+            df = pd.read_csv(path)
+        _frames.set(key, df)
+    return df
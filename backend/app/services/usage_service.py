@@ -0,0 +1,146 @@
+"""
+Usage Service - Per-query resource and cost accounting.
+Collects CPU time, memory growth, LLM calls and tokens for the query being
+processed and turns them into QueryMetric rows, written through the
+event sink.
+"""
+
+import math
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Iterator, Optional
+
+from app.core.config import settings
+from app.core.event_sink import event_sink, usage_cost
+from app.models.query import QueryMetric
+
+
+class QueryUsage:
+    """Resources consumed while answering one query"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cpu_ms = 0.0
+        self.memory_mb = 0.0
+        self.api_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+    @property
+    def token_usage(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add_resources(self, cpu_ms: float, memory_mb: float):
+        with self._lock:
+            self.cpu_ms += cpu_ms
+            self.memory_mb = max(self.memory_mb, memory_mb)
+
+    def add_llm_call(self, prompt_tokens: int, completion_tokens: int, cost: float):
+        with self._lock:
+            self.api_calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cost += cost
+
+
+# Usage of the query being processed in this context. Worker threads started
+# with run_in_threadpool (LLM calls) inherit it.
+_current_usage: ContextVar[Optional[QueryUsage]] = ContextVar("query_usage", default=None)
+
+
+def track_usage() -> QueryUsage:
+    """Start collecting usage for the current request and return the collector"""
+    usage = QueryUsage()
+    _current_usage.set(usage)
+    return usage
+
+
+# --- Resource sampling ---
+
+def rss_mb() -> float:
+    """Current process RSS in MB (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+@contextmanager
+def measure_resources() -> Iterator[None]:
+    """
+    Charge the CPU time and memory growth of a block to the current query.
+
+    CPU is the calling thread's CPU time, so blocks must run on a single
+    thread (pandas and SQLite work does). Memory is the growth of process
+    RSS over the block, using the process peak when the block set a new
+    one; with concurrent requests this is an approximation.
+    """
+    usage = _current_usage.get()
+    if usage is None:
+        yield
+        return
+
+    cpu_start = time.thread_time()
+    rss_start = rss_mb()
+    peak_start = _peak_rss_mb()
+    try:
+        yield
+    finally:
+        cpu_ms = (time.thread_time() - cpu_start) * 1000
+        peak_end = _peak_rss_mb()
+        high_water = peak_end if peak_end > peak_start else rss_mb()
+        usage.add_resources(cpu_ms, max(high_water - rss_start, 0.0))
+
+
+# --- LLM accounting ---
+
+def llm_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Cost of an LLM call from the LLM_PRICE_PER_1M_TOKENS table (0 if unpriced)"""
+    prices = settings.LLM_PRICE_PER_1M_TOKENS.get(model)
+    if not prices:
+        return 0.0
+    return (
+        prompt_tokens * prices.get("prompt", 0.0)
+        + completion_tokens * prices.get("completion", 0.0)
+    ) / 1_000_000
+
+
+def record_llm_call(model: str, prompt_tokens: int, completion_tokens: int):
+    """Charge one completed LLM API call to the current query, if any"""
+    usage = _current_usage.get()
+    if usage is not None:
+        usage.add_llm_call(prompt_tokens, completion_tokens, llm_cost(model, prompt_tokens, completion_tokens))
+
+
+# --- Recording ---
+
+def record_query_metric(query_id: int, usage: QueryUsage):
+    """Queue the QueryMetric row (and token/API-call usage costs) for a query"""
+    event_sink.emit(
+        QueryMetric,
+        query_id=query_id,
+        cpu_ms=int(round(usage.cpu_ms)),
+        memory_mb=int(math.ceil(usage.memory_mb)),
+        api_calls=usage.api_calls,
+        token_usage=usage.token_usage,
+        cost=round(usage.cost, 6),
+        recorded_at=datetime.utcnow()
+    )
+    if usage.api_calls:
+        usage_cost("model_api_calls", usage.api_calls, "calls")
+        usage_cost("token_usage", usage.token_usage, "tokens")
@@ -8,7 +8,7 @@ from fastapi import HTTPException, status
 
 from app.models.user import User
 from app.schemas.user import UserCreate, UserUpdate
-from app.core.security import hash_password, verify_password
+from app.core.security import hash_password_async, verify_password_async, invalidate_user_cache
 
 
 def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
@@ -26,9 +26,10 @@ def get_user_by_email(db: Session, email: str) -> Optional[User]:
     return db.query(User).filter(User.email == email).first()
 
 
-def create_user(db: Session, user_data: UserCreate) -> User:
+async def create_user(db: Session, user_data: UserCreate) -> User:
     """
     Create a new user.
+    The password is hashed on the password hashing pool.
     
     Args:
         db: Database session
@@ -38,7 +39,8 @@ def create_user(db: Session, user_data: UserCreate) -> User:
         Created user object
         
     Raises:
-        HTTPException: If username or email already exists
+        HTTPException: If username or email already exists, or 429 if
+            the password hashing pool is saturated
     """
     # Check if username exists
     if get_user_by_username(db, user_data.username):
@@ -55,7 +57,7 @@ def create_user(db: Session, user_data: UserCreate) -> User:
         )
     
     # Create user
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
     db_user = User(
         username=user_data.username,
         email=user_data.email,
@@ -72,9 +74,10 @@ def create_user(db: Session, user_data: UserCreate) -> User:
     return db_user
 
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
+async def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
     """
     Authenticate a user with username and password.
+    The password is verified on the password hashing pool.
     
     Args:
         db: Database session
@@ -88,7 +91,7 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
     if not user:
         return None
     
-    if not verify_password(password, user.password_hash):
+    if not await verify_password_async(password, user.password_hash):
         return None
     
     return user
@@ -128,6 +131,7 @@ def update_user(db: Session, user_id: int, user_data: UserUpdate) -> User:
     
     db.commit()
     db.refresh(user)
+    invalidate_user_cache(user_id)
     
     return user
 
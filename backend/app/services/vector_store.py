@@ -0,0 +1,467 @@
+"""
+Vector Store - In-memory vector index for the Embedding table.
+Keeps vectors in a contiguous float32 matrix (memory-mapped from disk)
+and answers top-k cosine similarity searches as batched matrix products.
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.rag import Embedding, RetrievalSession
+
+
+class VectorStore:
+    """
+    Float32 vector matrix with an embedding id map.
+
+    Vectors are L2-normalized on insert so cosine similarity is a plain
+    dot product. The matrix lives in a memory-mapped file that grows by
+    doubling, so appends are amortized O(1) and reopening a store does
+    not copy the vectors into RAM. Removals are tombstones until the
+    store is compacted.
+    """
+
+    # document_id marker for removed rows (tombstones until compaction)
+    DELETED = -1
+
+    def __init__(self, name: str, dim: int, directory: Optional[str] = None):
+        self.name = name
+        self.dim = dim
+        self.directory = directory or settings.VECTOR_STORE_DIR
+        os.makedirs(self.directory, exist_ok=True)
+
+        base = os.path.join(self.directory, name)
+        self._matrix_path = f"{base}.f32"
+        self._ids_path = f"{base}.ids.npy"
+        self._meta_path = f"{base}.json"
+
+        self._lock = threading.RLock()
+        self._count = 0
+        self._capacity = 0
+        self._matrix: Optional[np.memmap] = None
+        self._ids = np.empty((0, 2), dtype=np.int64)  # (embedding_id, document_id)
+        self._row_by_id: Dict[int, int] = {}
+        self._deleted_rows = np.empty(0, dtype=np.int64)
+
+        self._load()
+
+    def __len__(self) -> int:
+        return self._count - len(self._deleted_rows)
+
+    @property
+    def row_count(self) -> int:
+        """Number of matrix rows in use, including removed ones"""
+        return self._count
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Read view of the live part of the vector matrix"""
+        if self._matrix is None:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return self._matrix[:self._count]
+
+    @property
+    def deleted_rows(self) -> np.ndarray:
+        """Sorted row positions of removed vectors"""
+        return self._deleted_rows
+
+    def snapshot(self) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Consistent (row count, matrix, id map, removed rows) for a search.
+
+        Writers replace these arrays rather than reshaping them, so the
+        snapshot stays usable without holding the lock. Appends fill rows
+        past the snapshot's count and remove() marks document ids DELETED
+        in place, so searches drop rows marked after they took it.
+        """
+        with self._lock:
+            return self._count, self.matrix, self._ids, self._deleted_rows
+
+    @property
+    def max_embedding_id(self) -> int:
+        """Highest embedding id held by the store (0 when empty)"""
+        if self._count == 0:
+            return 0
+        return int(self._ids[:self._count, 0].max())
+
+    def _load(self):
+        """Open an existing store from disk, if there is one"""
+        if not os.path.exists(self._meta_path):
+            return
+
+        with open(self._meta_path) as f:
+            meta = json.load(f)
+
+        if meta["dim"] != self.dim:
+            raise ValueError(
+                f"Vector store '{self.name}' has dim {meta['dim']}, expected {self.dim}"
+            )
+
+        self._count = meta["count"]
+        self._capacity = meta["capacity"]
+        if self._capacity:
+            self._matrix = np.memmap(
+                self._matrix_path, dtype=np.float32, mode="r+",
+                shape=(self._capacity, self.dim)
+            )
+        self._ids = np.load(self._ids_path)
+        self._deleted_rows = np.flatnonzero(self._ids[:self._count, 1] == self.DELETED)
+        deleted = set(self._deleted_rows.tolist())
+        self._row_by_id = {
+            int(eid): row for row, eid in enumerate(self._ids[:self._count, 0])
+            if row not in deleted
+        }
+
+    def _grow(self, needed: int):
+        """Grow the backing file so it can hold at least `needed` rows"""
+        if needed <= self._capacity:
+            return
+
+        new_capacity = max(needed, self._capacity * 2, 1024)
+        if self._matrix is not None:
+            self._matrix.flush()
+            del self._matrix
+
+        with open(self._matrix_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+
+        self._matrix = np.memmap(
+            self._matrix_path, dtype=np.float32, mode="r+",
+            shape=(new_capacity, self.dim)
+        )
+        ids = np.zeros((new_capacity, 2), dtype=np.int64)
+        ids[:self._count] = self._ids[:self._count]
+        self._ids = ids
+        self._capacity = new_capacity
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows, leaving all-zero rows untouched"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def append(
+        self,
+        embedding_ids: Sequence[int],
+        document_ids: Sequence[int],
+        vectors: np.ndarray
+    ) -> int:
+        """
+        Append vectors to the store.
+
+        Embedding ids already present are skipped, so replaying the same
+        rows (e.g. after a restart) is harmless. The change is persisted
+        by the next flush(); batched writers call it once at the end.
+
+        Returns:
+            Number of vectors actually added
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(vectors) != len(embedding_ids) or len(vectors) != len(document_ids):
+            raise ValueError("embedding_ids, document_ids and vectors must have the same length")
+
+        with self._lock:
+            keep = [i for i, eid in enumerate(embedding_ids) if int(eid) not in self._row_by_id]
+            if not keep:
+                return 0
+
+            vectors = self._normalize(vectors[keep])
+            start = self._count
+            end = start + len(keep)
+            self._grow(end)
+
+            self._matrix[start:end] = vectors
+            self._ids[start:end, 0] = [embedding_ids[i] for i in keep]
+            self._ids[start:end, 1] = [document_ids[i] for i in keep]
+            for row in range(start, end):
+                self._row_by_id[int(self._ids[row, 0])] = row
+            self._count = end
+            return len(keep)
+
+    def remove(self, embedding_ids: Sequence[int]) -> int:
+        """
+        Remove vectors by embedding id.
+
+        Rows are tombstoned and skipped by searches; the space is
+        reclaimed by compact(). Persisted by the next flush().
+
+        Returns:
+            Number of vectors removed
+        """
+        with self._lock:
+            rows = [self._row_by_id.pop(int(eid)) for eid in embedding_ids if int(eid) in self._row_by_id]
+            if not rows:
+                return 0
+
+            self._ids[rows, 1] = self.DELETED
+            self._deleted_rows = np.union1d(self._deleted_rows, np.array(rows, dtype=np.int64))
+            return len(rows)
+
+    def compact(self) -> np.ndarray:
+        """
+        Rewrite the matrix without removed rows.
+
+        Returns:
+            Array mapping each old row position to its new position
+            (-1 for removed rows), for indexes that refer to rows
+        """
+        with self._lock:
+            mapping = np.full(self._count, -1, dtype=np.int64)
+            alive = np.ones(self._count, dtype=bool)
+            alive[self._deleted_rows] = False
+            mapping[alive] = np.arange(int(alive.sum()))
+
+            if len(self._deleted_rows) == 0:
+                return mapping
+
+            new_count = int(alive.sum())
+            new_capacity = max(new_count, 1024)
+            tmp_path = f"{self._matrix_path}.compact"
+            compacted = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=(new_capacity, self.dim))
+
+            chunk_rows = settings.VECTOR_SEARCH_CHUNK_ROWS
+            written = 0
+            for start in range(0, self._count, chunk_rows):
+                end = min(start + chunk_rows, self._count)
+                block = self._matrix[start:end][alive[start:end]]
+                compacted[written:written + len(block)] = block
+                written += len(block)
+            compacted.flush()
+            del compacted
+
+            ids = np.zeros((new_capacity, 2), dtype=np.int64)
+            ids[:new_count] = self._ids[:self._count][alive]
+
+            del self._matrix
+            os.replace(tmp_path, self._matrix_path)
+            self._matrix = np.memmap(
+                self._matrix_path, dtype=np.float32, mode="r+",
+                shape=(new_capacity, self.dim)
+            )
+            self._ids = ids
+            self._count = new_count
+            self._capacity = new_capacity
+            self._deleted_rows = np.empty(0, dtype=np.int64)
+            self._row_by_id = {int(eid): row for row, eid in enumerate(ids[:new_count, 0])}
+
+            self.flush()
+            return mapping
+
+    def flush(self):
+        """Persist the matrix, id map and metadata to disk"""
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            tmp_path = f"{self._ids_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, self._ids)
+            os.replace(tmp_path, self._ids_path)
+
+            tmp_path = f"{self._meta_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"dim": self.dim, "count": self._count, "capacity": self._capacity}, f)
+            os.replace(tmp_path, self._meta_path)
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10
+    ) -> List[List[Tuple[int, int, float]]]:
+        """
+        Top-k cosine similarity search for a batch of query vectors.
+
+        The matrix is scanned in row chunks so the score buffer stays
+        bounded regardless of store size; each chunk's candidates are
+        merged into a running top-k.
+
+        Args:
+            queries: Array of shape (dim,) or (n_queries, dim)
+            k: Number of neighbours to return per query
+
+        Returns:
+            For each query, a list of (embedding_id, document_id, score)
+            sorted by descending score
+        """
+        queries = self._normalize(np.asarray(queries, dtype=np.float32).reshape(-1, self.dim))
+        n_queries = len(queries)
+
+        count, matrix, ids, deleted = self.snapshot()
+
+        if count - len(deleted) <= 0 or k <= 0:
+            return [[] for _ in range(n_queries)]
+
+        k = min(k, count)
+        chunk_rows = settings.VECTOR_SEARCH_CHUNK_ROWS
+        best_scores = np.full((n_queries, 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((n_queries, 0), dtype=np.int64)
+
+        for start in range(0, count, chunk_rows):
+            end = min(start + chunk_rows, count)
+            scores = queries @ matrix[start:end].T
+            if len(deleted):
+                lo, hi = np.searchsorted(deleted, [start, end])
+                scores[:, deleted[lo:hi] - start] = -np.inf
+
+            if end - start > k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, top, axis=1)
+                rows = top + start
+            else:
+                rows = np.broadcast_to(np.arange(start, end), scores.shape)
+
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            if best_scores.shape[1] > k:
+                top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_rows = np.take_along_axis(best_rows, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+
+        return [
+            [
+                (int(ids[row, 0]), int(ids[row, 1]), float(score))
+                for row, score in zip(best_rows[q], best_scores[q])
+                if score != -np.inf and ids[row, 1] != self.DELETED
+            ]
+            for q in range(n_queries)
+        ]
+
+
+# Process-wide stores, one per embedding model
+_stores: Dict[str, VectorStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_vector_store(model: str, dim: Optional[int] = None) -> VectorStore:
+    """Get (or open) the shared vector store for an embedding model"""
+    with _stores_lock:
+        store = _stores.get(model)
+        if store is None:
+            name = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+            store = VectorStore(name, dim or settings.EMBEDDING_DIM)
+            _stores[model] = store
+        return store
+
+
+class RetrievalService:
+    """Service for similarity search over stored embeddings"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def sync_from_db(self, model: str, batch_size: int = 5000) -> int:
+        """
+        Append Embedding rows newer than the store's highest id.
+
+        The Embedding table stays the source of truth; this catches the
+        in-memory index up with rows written by other processes.
+
+        Returns:
+            Number of vectors added
+        """
+        store = get_vector_store(model)
+        added = 0
+        last_id = store.max_embedding_id
+
+        while True:
+            rows = self.db.query(
+                Embedding.id, Embedding.document_id, Embedding.vector
+            ).filter(
+                Embedding.model == model,
+                Embedding.id > last_id
+            ).order_by(Embedding.id).limit(batch_size).all()
+
+            if not rows:
+                break
+
+            added += store.append(
+                [r.id for r in rows],
+                [r.document_id or 0 for r in rows],
+                np.array([r.vector for r in rows], dtype=np.float32)
+            )
+            last_id = rows[-1].id
+
+        if added:
+            store.flush()
+            from app.services.ann_index import get_ann_index
+            index = get_ann_index(model)
+            if index.is_trained:
+                index.sync()
+
+        return added
+
+    def rebuild_ann_index(self, model: str) -> int:
+        """
+        Offline rebuild: compact the store and retrain the IVF index.
+
+        Returns:
+            Number of vectors in the rebuilt index
+        """
+        from app.services.ann_index import get_ann_index
+        index = get_ann_index(model)
+        index.store.compact()
+        index.train()
+        return index.indexed_rows
+
+    def search(
+        self,
+        query_vectors: np.ndarray,
+        model: str,
+        k: int = 5
+    ) -> List[List[Tuple[int, int, float]]]:
+        """
+        Batched top-k search without recording a retrieval session.
+
+        Large stores with a trained IVF index use approximate search;
+        everything else is an exact scan.
+        """
+        store = get_vector_store(model)
+        if settings.VECTOR_ANN_ENABLED and len(store) >= settings.VECTOR_ANN_MIN_ROWS:
+            from app.services.ann_index import get_ann_index
+            index = get_ann_index(model)
+            if index.is_trained:
+                return index.search(query_vectors, k)
+        return store.search(query_vectors, k)
+
+    def retrieve(
+        self,
+        query_vector: np.ndarray,
+        model: str,
+        k: int = 5,
+        conversation_id: Optional[int] = None,
+        query_id: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Retrieve the k most similar documents and record a RetrievalSession.
+
+        Returns:
+            List of (document_id, score), best match first
+        """
+        hits = self.search(query_vector, model, k)[0]
+
+        # Several chunks of one document can match; keep the best per document
+        documents: Dict[int, float] = {}
+        for _, document_id, score in hits:
+            if document_id not in documents:
+                documents[document_id] = score
+
+        session = RetrievalSession(
+            conversation_id=conversation_id,
+            query_id=query_id,
+            retrieved_doc_ids=list(documents.keys())
+        )
+        self.db.add(session)
+        self.db.commit()
+
+        return list(documents.items())
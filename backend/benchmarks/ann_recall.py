@@ -0,0 +1,124 @@
+"""
+ANN recall benchmark - IVF index vs exact brute-force search.
+
+Builds a synthetic clustered corpus, runs the same queries through the
+exact VectorStore scan and the IVF index at several `nprobe` settings,
+and reports recall@k and per-query latency.
+
+Usage (from backend/):
+    python -m benchmarks.ann_recall --rows 1000000 --dim 384 --nprobe 4,8,16,32
+"""
+import argparse
+import json
+import tempfile
+import time
+
+from benchmarks.common import bootstrap_env
+
+bootstrap_env()
+
+import numpy as np
+
+from app.services.ann_index import IVFIndex
+from app.services.vector_store import VectorStore
+
+
+def make_corpus(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Gaussian mixture, roughly the shape of real embedding corpora"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    noise = rng.standard_normal((rows, dim)).astype(np.float32) * 0.6
+    return centers[labels] + noise
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(np.array(samples) * 1000, q))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF recall/latency benchmark")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--clusters", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="0 = 4 * sqrt(rows)")
+    parser.add_argument("--nprobe", type=str, default="1,4,8,16,32,64")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this file")
+    args = parser.parse_args()
+
+    vectors = make_corpus(args.rows, args.dim, args.clusters, args.seed)
+    queries = make_corpus(args.queries, args.dim, args.clusters, args.seed + 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = VectorStore("bench", args.dim, directory=directory)
+        start = time.perf_counter()
+        batch = 100000
+        for lo in range(0, args.rows, batch):
+            hi = min(lo + batch, args.rows)
+            ids = np.arange(lo + 1, hi + 1)
+            store.append(ids, ids, vectors[lo:hi])
+        load_s = time.perf_counter() - start
+        print(f"Loaded {args.rows} x {args.dim} vectors in {load_s:.1f}s")
+
+        exact, exact_times = [], []
+        for query in queries:
+            t0 = time.perf_counter()
+            exact.append({hit[0] for hit in store.search(query, args.k)[0]})
+            exact_times.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        exact_batch = store.search(queries, args.k)
+        batch_s = time.perf_counter() - t0
+
+        index = IVFIndex(store, nlist=args.nlist)
+        t0 = time.perf_counter()
+        index.train(seed=args.seed)
+        train_s = time.perf_counter() - t0
+        print(f"Trained IVF (nlist={index.nlist}) in {train_s:.1f}s")
+
+        results = {
+            "rows": args.rows,
+            "dim": args.dim,
+            "k": args.k,
+            "nlist": index.nlist,
+            "train_s": round(train_s, 3),
+            "exact": {
+                "p50_ms": round(percentile_ms(exact_times, 50), 3),
+                "p95_ms": round(percentile_ms(exact_times, 95), 3),
+                "batch_ms_per_query": round(batch_s * 1000 / len(queries), 3),
+            },
+            "ivf": [],
+        }
+        assert len(exact_batch) == len(queries)
+
+        print(f"\n{'mode':<14}{'recall@' + str(args.k):>10}{'p50 ms':>10}{'p95 ms':>10}")
+        print(f"{'exact':<14}{1.0:>10.3f}{results['exact']['p50_ms']:>10.2f}{results['exact']['p95_ms']:>10.2f}")
+
+        for nprobe in [int(n) for n in args.nprobe.split(",")]:
+            times, recalls = [], []
+            for query, truth in zip(queries, exact):
+                t0 = time.perf_counter()
+                hits = index.search(query, args.k, nprobe=nprobe)[0]
+                times.append(time.perf_counter() - t0)
+                recalls.append(len({hit[0] for hit in hits} & truth) / max(len(truth), 1))
+
+            row = {
+                "nprobe": nprobe,
+                "recall": round(float(np.mean(recalls)), 4),
+                "p50_ms": round(percentile_ms(times, 50), 3),
+                "p95_ms": round(percentile_ms(times, 95), 3),
+            }
+            results["ivf"].append(row)
+            print(f"{'ivf/' + str(nprobe):<14}{row['recall']:>10.3f}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Shared helpers for the benchmark scripts: latency summaries, memory
+sampling and JSON result files.
+"""
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+
+def bootstrap_env():
+    """
+    Fill in settings the app refuses to start without, for benchmarks that
+    never touch the database or external services. Does nothing when a
+    .env file exists (environment variables would override it).
+    """
+    if os.path.exists(".env"):
+        return
+    os.environ.setdefault("DATABASE_URL", "postgresql://localhost/lumiere_bench")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("ENCRYPTION_KEY", "benchmark")
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+
+def percentile(samples: List[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100) of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize_ms(durations_s: List[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/min/max in milliseconds for durations in seconds"""
+    ms = [d * 1000 for d in durations_s]
+    if not ms:
+        return {"count": 0}
+    return {
+        "count": len(ms),
+        "mean_ms": round(sum(ms) / len(ms), 3),
+        "min_ms": round(min(ms), 3),
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(max(ms), 3),
+    }
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process right now"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_metadata() -> Dict[str, Any]:
+    """Environment details stored with every result file"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=False
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(path: str, results: Dict[str, Any]):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"\nResults written to {path}")
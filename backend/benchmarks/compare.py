@@ -0,0 +1,140 @@
+"""
+Compare benchmark results against a baseline and flag regressions.
+
+Works on any result file with a top-level "results" mapping of
+name -> latency summary (benchmarks.micro, benchmarks.e2e). Exits with
+status 1 when a benchmark got slower than the threshold, so it can gate CI.
+
+Baselines are kept in benchmarks/baselines/<benchmark>.json, with the
+run_metadata of the run that produced them. Given one file, compare uses
+the stored baseline for that file's benchmark. Latencies depend on the
+machine: re-record the baseline (--save-baseline) on the hardware the
+gate runs on, and after intended performance changes.
+
+Usage (from backend/):
+    python -m benchmarks.compare micro.json --threshold 0.10
+    python -m benchmarks.compare micro.json --save-baseline
+    python -m benchmarks.compare baseline.json current.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+from typing import Any, Dict, List, Tuple
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def baseline_path(benchmark: str) -> str:
+    """Stored baseline of a benchmark (the "benchmark" field of its results)"""
+    return os.path.join(BASELINE_DIR, f"{benchmark}.json")
+
+
+def compare(
+    baseline: Dict[str, Any],
+    current: Dict[str, Any],
+    metric: str = "p50_ms",
+    threshold: float = 0.10,
+    min_delta_ms: float = 0.005
+) -> Tuple[List[Dict[str, Any]], List[str], List[str]]:
+    """
+    Compare the `metric` of every benchmark present in both files.
+
+    A benchmark regresses when it is more than `threshold` (relative)
+    slower and the absolute difference exceeds `min_delta_ms`, which
+    keeps timer noise on sub-microsecond calls from failing the gate.
+    Baseline benchmarks at a size the current run did not use (e.g.
+    `micro --sizes small`) are left out rather than reported missing.
+
+    Returns:
+        (rows, names only in baseline, names only in current)
+    """
+    base_results = baseline.get("results", {})
+    current_results = current.get("results", {})
+
+    rows = []
+    for name in sorted(base_results.keys() & current_results.keys()):
+        before = base_results[name].get(metric)
+        after = current_results[name].get(metric)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        if change > threshold and after - before > min_delta_ms:
+            verdict = "REGRESSION"
+        elif change < -threshold and before - after > min_delta_ms:
+            verdict = "improved"
+        else:
+            verdict = "ok"
+        rows.append({"name": name, "before": before, "after": after, "change": change, "verdict": verdict})
+
+    sizes_run = {result.get("size") for result in current_results.values()}
+    missing = sorted(
+        name for name in base_results.keys() - current_results.keys()
+        if base_results[name].get("size") in sizes_run
+    )
+    added = sorted(current_results.keys() - base_results.keys())
+    return rows, missing, added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag benchmark regressions against a baseline")
+    parser.add_argument("files", nargs="+", metavar="FILE",
+                        help="CURRENT (against the stored baseline) or BASELINE CURRENT")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store CURRENT as the baseline of its benchmark instead of comparing")
+    parser.add_argument("--metric", default="p50_ms")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative slowdown that fails (0.10 = 10%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.005, help="Ignore absolute changes below this")
+    args = parser.parse_args()
+    if len(args.files) > 2:
+        parser.error("expected CURRENT or BASELINE CURRENT")
+
+    current = _load(args.files[-1])
+    benchmark = current.get("benchmark")
+    if args.save_baseline:
+        if len(args.files) != 1 or not benchmark:
+            parser.error("--save-baseline takes one result file with a \"benchmark\" field")
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        shutil.copyfile(args.files[0], baseline_path(benchmark))
+        print(f"Saved {args.files[0]} as the {benchmark} baseline ({baseline_path(benchmark)})")
+        return
+
+    if len(args.files) == 2:
+        baseline = _load(args.files[0])
+    else:
+        if not benchmark or not os.path.exists(baseline_path(benchmark)):
+            parser.error(f"no stored baseline for {benchmark!r}: pass BASELINE CURRENT or --save-baseline")
+        baseline = _load(baseline_path(benchmark))
+        meta = baseline.get("meta", {})
+        print(f"Baseline: {baseline_path(benchmark)} (commit {meta.get('commit')}, {meta.get('timestamp')}, {meta.get('cpus')} cpus)")
+    if baseline.get("benchmark") != benchmark:
+        print(f"Warning: comparing {baseline.get('benchmark')} against {benchmark} results")
+
+    rows, missing, added = compare(baseline, current, args.metric, args.threshold, args.min_delta_ms)
+
+    print(f"{'benchmark':<48} {'baseline':>12} {'current':>12} {'change':>9}")
+    for row in rows:
+        print(
+            f"{row['name']:<48} {row['before']:>12.3f} {row['after']:>12.3f} "
+            f"{row['change']:>+8.1%}  {row['verdict'] if row['verdict'] != 'ok' else ''}"
+        )
+    for name in missing:
+        print(f"{name:<48} missing from current run")
+    for name in added:
+        print(f"{name:<48} new (no baseline)")
+
+    regressions = [row for row in rows if row["verdict"] == "REGRESSION"]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%} on {args.metric}")
+        sys.exit(1)
+    print(f"\nNo regressions above {args.threshold:.0%} on {args.metric}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Synthetic CSV generator for benchmarks.
+
+Produces a sales-like table with a date column, categorical dimensions of
+configurable cardinality, numeric measures and an optional free-text
+column of configurable width.
+
+Usage (from backend/):
+    python -m benchmarks.datagen out.csv --rows 1000000 --dimensions 3 --measures 4 --cardinality 50
+"""
+import argparse
+import string
+
+import numpy as np
+import pandas as pd
+
+
+def generate_dataframe(
+    rows: int,
+    dimensions: int = 2,
+    measures: int = 2,
+    cardinality: int = 20,
+    text_width: int = 0,
+    seed: int = 0
+) -> pd.DataFrame:
+    """Build one synthetic table in memory"""
+    rng = np.random.default_rng(seed)
+    data = {
+        "date": (np.datetime64("2024-01-01") + rng.integers(0, 730, size=rows)).astype(str),
+    }
+    for d in range(dimensions):
+        labels = np.array([f"{chr(ord('A') + d)}{i:04d}" for i in range(cardinality)])
+        # Zipf-like skew so group sizes look like real categories
+        weights = 1.0 / np.arange(1, cardinality + 1)
+        data[f"dim_{d}"] = labels[rng.choice(cardinality, size=rows, p=weights / weights.sum())]
+    for m in range(measures):
+        if m % 2 == 0:
+            data[f"measure_{m}"] = np.round(rng.lognormal(3, 1, size=rows), 2)
+        else:
+            data[f"measure_{m}"] = rng.integers(1, 100, size=rows)
+    if text_width > 0:
+        alphabet = np.array(list(string.ascii_lowercase + " "))
+        chars = alphabet[rng.integers(0, len(alphabet), size=(rows, text_width))]
+        data["notes"] = chars.view(f"<U{text_width}").ravel()
+    return pd.DataFrame(data)
+
+
+def generate_csv(
+    path: str,
+    rows: int,
+    dimensions: int = 2,
+    measures: int = 2,
+    cardinality: int = 20,
+    text_width: int = 0,
+    seed: int = 0,
+    chunk_rows: int = 250000
+) -> str:
+    """Write a synthetic CSV in chunks so large files need bounded memory"""
+    written = 0
+    chunk = 0
+    while written < rows:
+        n = min(chunk_rows, rows - written)
+        df = generate_dataframe(n, dimensions, measures, cardinality, text_width, seed + chunk)
+        df.to_csv(path, mode="w" if chunk == 0 else "a", header=chunk == 0, index=False)
+        written += n
+        chunk += 1
+    return path
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--dimensions", type=int, default=2)
+    parser.add_argument("--measures", type=int, default=2)
+    parser.add_argument("--cardinality", type=int, default=20)
+    parser.add_argument("--text-width", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic CSV")
+    parser.add_argument("path")
+    add_arguments(parser)
+    args = parser.parse_args()
+    generate_csv(args.path, args.rows, args.dimensions, args.measures, args.cardinality, args.text_width, args.seed)
+    print(f"Wrote {args.rows} rows to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+End-to-end API load test.
+
+Runs the backend in-process (uvicorn on a background thread) with the LLM
+pointed at the local mock server, then drives concurrent virtual users
+through upload -> preview -> AI query -> chart -> insight on a synthetic
+CSV. Reports p50/p95/p99 latency, throughput, error count and peak RSS
+per endpoint, optionally as JSON for benchmarks.compare. A failed upload
+or a server error on the AI query (anything but a 429) stops the run: the
+later steps depend on them, so the numbers would not describe the flow.
+
+Requires a configured .env (use a scratch database) and httpx.
+
+Usage (from backend/):
+    python -m benchmarks.e2e --rows 100000 --users 8 --iterations 5 --json e2e.json
+"""
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from benchmarks.common import current_rss_mb, peak_rss_mb, run_metadata, summarize_ms, write_results
+from benchmarks.datagen import add_arguments, generate_csv
+
+ENDPOINTS = ["upload", "preview", "ai_query", "chart", "insight"]
+
+QUESTIONS = [
+    "What are the total sales by region?",
+    "What are the top 5 products by revenue?",
+    "How many orders per category?",
+    "What is the average order value by month?",
+]
+
+
+class FlowError(RuntimeError):
+    """A step the rest of the flow depends on failed (not rate limiting)"""
+
+
+def _require(response, step: str) -> bool:
+    """True if the step succeeded, False if it was rate limited; raises otherwise"""
+    if response.status_code == 429:
+        return False
+    if response.status_code >= 400:
+        raise FlowError(f"{step} failed with HTTP {response.status_code}: {response.text[:500]}")
+    return True
+
+
+class Recorder:
+    """Thread-safe per-endpoint latency, error and memory samples"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.status_codes: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.rss_mb: Dict[str, float] = defaultdict(float)
+
+    def timed(self, endpoint: str, call):
+        start = time.perf_counter()
+        response = call()
+        elapsed = time.perf_counter() - start
+        rss = current_rss_mb()
+        with self._lock:
+            self.durations[endpoint].append(elapsed)
+            self.status_codes[endpoint][response.status_code] += 1
+            if response.status_code >= 400:
+                self.errors[endpoint] += 1
+            self.rss_mb[endpoint] = max(self.rss_mb[endpoint], rss)
+        return response
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _serve(app, port: int):
+    """Run an ASGI app with uvicorn on a daemon thread"""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def virtual_user(
+    base_url: str,
+    run_id: str,
+    worker: int,
+    iterations: int,
+    csv_path: str,
+    recorder: Recorder,
+    stop: threading.Event
+):
+    """One user's session: register, log in, then repeat the full analysis flow"""
+    import httpx
+
+    with httpx.Client(base_url=f"{base_url}/api/v1", timeout=300) as client:
+        username = f"bench_{run_id}_{worker}"
+        password = "benchmark-password"
+        _require(client.post("/auth/register", json={
+            "username": username,
+            "email": f"{username}@example.com",  # email validation rejects special-use domains like .local
+            "password": password,
+        }), "register")
+        login = client.post("/auth/login", json={"username": username, "password": password})
+        _require(login, "login")
+        client.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+
+        for i in range(iterations):
+            if stop.is_set():
+                return
+            with open(csv_path, "rb") as f:
+                upload = recorder.timed("upload", lambda: client.post(
+                    "/data/upload",
+                    files={"file": (f"bench_{worker}_{i}.csv", f, "text/csv")}
+                ))
+            if not _require(upload, "upload"):
+                continue
+            data_source_id = upload.json()["id"]
+
+            recorder.timed("preview", lambda: client.get(
+                f"/data/source/{data_source_id}/preview", params={"limit": 100}
+            ))
+
+            query = recorder.timed("ai_query", lambda: client.post("/ai/query", json={
+                "data_source_id": data_source_id,
+                "question": QUESTIONS[(worker + i) % len(QUESTIONS)],
+            }))
+            if query.status_code >= 500:
+                _require(query, "ai_query")
+            if query.status_code >= 400:
+                continue
+            query_id = query.json()["query_id"]
+
+            recorder.timed("chart", lambda: client.post("/ai/chart", json={"query_id": query_id}))
+            recorder.timed("insight", lambda: client.post("/ai/insight", json={"query_id": query_id}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end API benchmark")
+    add_arguments(parser)
+    parser.add_argument("--users", type=int, default=4, help="Concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=3, help="Flows per user")
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this file")
+    args = parser.parse_args()
+
+    # The mock LLM must be configured before the app's settings load
+    llm_port = _free_port()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{llm_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+
+    from benchmarks.mock_openai_server import MockLLMConfig, create_app
+    from main import app
+
+    _serve(create_app(MockLLMConfig(
+        latency_ms=args.llm_latency_ms,
+        rate_limit_rate=args.llm_rate_limit_rate,
+        seed=args.seed,
+    )), llm_port)
+    api_port = _free_port()
+    api_server, _ = _serve(app, api_port)
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "bench.csv")
+        generate_csv(csv_path, args.rows, args.dimensions, args.measures, args.cardinality, args.text_width, args.seed)
+        csv_mb = os.path.getsize(csv_path) / (1024 * 1024)
+        print(f"Generated {args.rows} rows ({csv_mb:.1f} MB); running {args.users} users x {args.iterations} flows")
+
+        recorder = Recorder()
+        run_id = uuid.uuid4().hex[:8]
+        stop = threading.Event()
+        failure = None
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            futures = [
+                pool.submit(
+                    virtual_user, f"http://127.0.0.1:{api_port}", run_id, w, args.iterations, csv_path, recorder, stop
+                )
+                for w in range(args.users)
+            ]
+            for future in futures:
+                try:
+                    future.result()
+                except FlowError as e:
+                    stop.set()
+                    failure = failure or e
+        wall_s = time.perf_counter() - start
+
+    api_server.should_exit = True
+    if failure is not None:
+        sys.exit(f"Error: {failure}\nThe flow is broken on this tree; no results were written.")
+
+    endpoints = {}
+    print(f"\n{'endpoint':<10}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>8}{'rss MB':>9}")
+    for endpoint in ENDPOINTS:
+        stats = summarize_ms(recorder.durations[endpoint])
+        stats.update({
+            "errors": recorder.errors[endpoint],
+            "status_codes": dict(recorder.status_codes[endpoint]),
+            "throughput_rps": round(stats["count"] / wall_s, 3) if wall_s else 0.0,
+            "peak_rss_mb": round(recorder.rss_mb[endpoint], 1),
+        })
+        endpoints[endpoint] = stats
+        if stats["count"]:
+            print(
+                f"{endpoint:<10}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10.1f}"
+                f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['throughput_rps']:>8.2f}{stats['peak_rss_mb']:>9.1f}"
+            )
+
+    total_requests = sum(len(d) for d in recorder.durations.values())
+    results = {
+        "benchmark": "e2e",
+        "meta": run_metadata(),
+        "config": {**vars(args), "csv_mb": round(csv_mb, 2)},
+        "wall_s": round(wall_s, 3),
+        "throughput_rps": round(total_requests / wall_s, 3) if wall_s else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "results": endpoints,
+    }
+    print(f"\nTotal: {total_requests} requests in {wall_s:.1f}s ({results['throughput_rps']:.2f} req/s), peak RSS {results['peak_rss_mb']:.0f} MB")
+
+    if args.json:
+        write_results(args.json, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Micro-benchmarks for the service functions on every request path.
+
+Each benchmark is run for several input sizes. A benchmark is timed in
+batches of calls, with the batch size grown until one batch takes at
+least --min-batch-ms. Per-call latency is then sampled over --repeats
+batches. Nothing touches the database or the network.
+
+Usage (from backend/):
+    python -m benchmarks.micro --json micro.json
+    python -m benchmarks.micro --filter security --sizes small
+    python -m benchmarks.compare micro.json
+"""
+import argparse
+import io
+import os
+import re
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, List
+
+from benchmarks.common import bootstrap_env, run_metadata, summarize_ms, write_results
+
+bootstrap_env()
+
+import numpy as np  # noqa: E402
+
+from app.core import security  # noqa: E402
+from app.services.data_service import DataService  # noqa: E402
+from app.services.llm_service import LLMService  # noqa: E402
+from app.services.query_service import QueryService  # noqa: E402
+from benchmarks.datagen import generate_dataframe  # noqa: E402
+
+SIZES = {"small": 1_000, "medium": 10_000, "large": 100_000}
+
+# name -> setup(n) returning the zero-argument callable to time
+BENCHMARKS: Dict[str, Callable[[int], Callable[[], object]]] = {}
+
+# Temporary files created by setups, removed after the run
+_cleanup: List[str] = []
+
+
+def benchmark(name: str):
+    """Register a benchmark; the decorated function builds the call for a size"""
+    def register(setup: Callable[[int], Callable[[], object]]):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _frame(n: int):
+    return generate_dataframe(n, dimensions=2, measures=2, cardinality=50, text_width=20)
+
+
+# --- QueryService ---
+
+@benchmark("query.execute_sql.group_by")
+def bench_execute_sql(n: int):
+    service = QueryService(db=None)
+    df = _frame(n)
+    sql = "SELECT dim_0, SUM(measure_0) AS total FROM data GROUP BY dim_0 ORDER BY total DESC LIMIT 10"
+    return lambda: service._execute_sql(df, sql)
+
+
+@benchmark("query.execute_sql.select_rows")
+def bench_execute_sql_rows(n: int):
+    service = QueryService(db=None)
+    df = _frame(n)
+    sql = "SELECT * FROM data LIMIT 1000"
+    return lambda: service._execute_sql(df, sql)
+
+
+@benchmark("query.convert_numpy_types")
+def bench_convert_numpy_types(n: int):
+    service = QueryService(db=None)
+    frame = _frame(n)
+    frame.loc[frame.index[::10], "measure_1"] = np.nan
+    rows = frame.to_dict("records")
+    return lambda: service._convert_numpy_types(rows)
+
+
+# --- DataService ---
+
+@benchmark("data.parse_csv")
+def bench_parse_csv(n: int):
+    service = DataService(db=None)
+    buffer = io.StringIO()
+    _frame(n).to_csv(buffer, index=False)
+    contents = buffer.getvalue().encode("utf-8")
+    return lambda: service._parse_csv(contents)
+
+
+@benchmark("data.preview_csv")
+def bench_preview_csv(n: int):
+    service = DataService(db=None)
+    fd, path = tempfile.mkstemp(suffix=".csv", prefix="lumiere_bench_")
+    os.close(fd)
+    _frame(n).to_csv(path, index=False)
+    _cleanup.append(path)
+    data_source = SimpleNamespace(connection_string=path, source_type="csv")
+    return lambda: service._preview_csv(data_source, limit=100, offset=0)
+
+
+# --- LLMService prompt building (no API calls) ---
+
+def _prompt_inputs(n: int):
+    frame = _frame(min(n, 1_000))
+    rows = frame.to_dict("records")
+    columns = frame.columns.tolist()
+    results = {"columns": columns, "rows": rows, "row_count": n}
+    return columns, rows, results
+
+
+@benchmark("llm.build_sql_prompt")
+def bench_build_sql_prompt(n: int):
+    service = LLMService()
+    columns, rows, _ = _prompt_inputs(n)
+    schema = {"columns": columns, "dtypes": {c: "object" for c in columns}, "row_count": n}
+    return lambda: service._build_sql_prompt("What are the total sales by region?", schema, rows)
+
+
+@benchmark("llm.build_chart_prompt")
+def bench_build_chart_prompt(n: int):
+    service = LLMService()
+    _, _, results = _prompt_inputs(n)
+    sql = "SELECT dim_0, SUM(measure_0) FROM data GROUP BY dim_0"
+    return lambda: service._build_chart_prompt("Total by dim_0?", sql, results)
+
+
+@benchmark("llm.build_insight_prompt")
+def bench_build_insight_prompt(n: int):
+    service = LLMService()
+    _, _, results = _prompt_inputs(n)
+    sql = "SELECT dim_0, SUM(measure_0) FROM data GROUP BY dim_0"
+    return lambda: service._build_insight_prompt("Total by dim_0?", sql, results)
+
+
+# --- Security ---
+# Sizes scale the payload rather than a row count: n // 1000 extra claims
+# for tokens, and a longer password (up to bcrypt's 72 bytes) for hashing.
+
+@benchmark("security.create_access_token")
+def bench_create_access_token(n: int):
+    claims = {"sub": "42", "username": "bench"}
+    claims.update({f"claim_{i}": f"value_{i}" for i in range(n // 1000)})
+    return lambda: security.create_access_token(claims)
+
+
+@benchmark("security.decode_access_token")
+def bench_decode_access_token(n: int):
+    claims = {"sub": "42", "username": "bench"}
+    claims.update({f"claim_{i}": f"value_{i}" for i in range(n // 1000)})
+    token = security.create_access_token(claims)
+    return lambda: security.decode_access_token(token)
+
+
+@benchmark("security.hash_password")
+def bench_hash_password(n: int):
+    length = min(8 + n // 1000, 72)
+    password = ("correct horse battery staple " * 3)[:length]
+    return lambda: security.hash_password(password)
+
+
+# --- Runner ---
+
+def _time(call: Callable[[], object], repeats: int, min_batch_s: float) -> List[float]:
+    """Per-call durations (seconds) from `repeats` batches"""
+    call()  # warm-up
+
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            call()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_batch_s or batch >= 1_000_000:
+            break
+        batch *= 2 if elapsed == 0 else max(2, min(10, int(min_batch_s / elapsed) + 1))
+
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(batch):
+            call()
+        samples.append((time.perf_counter() - start) / batch)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for hot service functions")
+    parser.add_argument("--sizes", default="small,medium,large",
+                        help=f"Comma-separated names from {list(SIZES)} or row counts")
+    parser.add_argument("--filter", default=None, help="Regex on benchmark names")
+    parser.add_argument("--repeats", type=int, default=15)
+    parser.add_argument("--min-batch-ms", type=float, default=50.0)
+    parser.add_argument("--json", type=str, default=None)
+    args = parser.parse_args()
+
+    sizes = {}
+    for name in args.sizes.split(","):
+        name = name.strip()
+        sizes[name] = SIZES[name] if name in SIZES else int(name)
+
+    selected = [name for name in BENCHMARKS if not args.filter or re.search(args.filter, name)]
+    results = {}
+    try:
+        for name in selected:
+            for size_name, n in sizes.items():
+                key = f"{name}[{size_name}]"
+                call = BENCHMARKS[name](n)
+                summary = summarize_ms(_time(call, args.repeats, args.min_batch_ms / 1000))
+                summary["size"] = n
+                results[key] = summary
+                print(f"{key:<48} p50={summary['p50_ms']:>10.3f} ms  p95={summary['p95_ms']:>10.3f} ms")
+    finally:
+        for path in _cleanup:
+            if os.path.exists(path):
+                os.remove(path)
+
+    if args.json:
+        write_results(args.json, {
+            "benchmark": "micro",
+            "meta": run_metadata(),
+            "config": {"sizes": sizes, "repeats": args.repeats, "min_batch_ms": args.min_batch_ms},
+            "results": results,
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Local OpenAI-compatible stand-in server for offline, reproducible load tests.
+
+Speaks the chat-completions protocol and answers the prompts built by
+LLMService with rule-generated SQL, Chart.js JSON and insight text.
+Latency, error rate and 429 injection are configurable and seeded.
+
+Usage (from backend/):
+    python -m benchmarks.mock_openai_server --port 8100 --latency-ms 300 --rate-limit-rate 0.02
+
+Then point the backend at it:
+    OPENAI_BASE_URL=http://localhost:8100/v1
+"""
+import argparse
+import ast
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+class MockLLMConfig(BaseModel):
+    """Behaviour of the mock server"""
+    latency_dist: str = "lognormal"  # fixed, uniform, normal, lognormal
+    latency_ms: float = 400.0  # median / mean
+    latency_jitter_ms: float = 150.0  # spread (uniform half-width, normal/lognormal sigma)
+    error_rate: float = 0.0  # fraction of 500 responses
+    rate_limit_rate: float = 0.0  # fraction of 429 responses
+    retry_after_s: float = 1.0
+    seed: int = 42
+    canned: Dict[str, str] = {}  # prompt substring -> response content
+
+
+# --- Prompt parsing helpers ---
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _sql_response(prompt: str) -> Dict[str, Any]:
+    """Rule-generated SQL for LLMService._build_sql_prompt prompts"""
+    columns_match = re.search(r"^COLUMNS: (.*)$", prompt, re.MULTILINE)
+    columns = [c.strip() for c in columns_match.group(1).split(",")] if columns_match else []
+    question_match = re.search(r'USER QUESTION: "(.*)"', prompt)
+    question = question_match.group(1).lower() if question_match else ""
+
+    # Classify columns from the sample rows ("col=value, col=value")
+    numeric = set(columns)
+    sample_block = prompt.split("SAMPLE DATA", 1)[-1].split("USER QUESTION", 1)[0]
+    for line in sample_block.splitlines()[1:]:
+        for column in columns:
+            match = re.search(rf"(?:^|, ){re.escape(column)}=([^,]*)", line)
+            if match and not _is_number(match.group(1).strip()):
+                numeric.discard(column)
+
+    dimensions = [c for c in columns if c not in numeric]
+    measures = [c for c in columns if c in numeric]
+    measure = next((c for c in measures if c.lower() in question), measures[0] if measures else None)
+    dimension = next((c for c in dimensions if c.lower() in question), dimensions[0] if dimensions else None)
+
+    if "how many" in question or "count" in question or measure is None:
+        aggregate, alias = "COUNT(*)", "count"
+    elif any(word in question for word in ("average", "avg", "mean")):
+        aggregate, alias = f"AVG({_quote(measure)})", f"avg_{measure}"
+    elif any(word in question for word in ("max", "highest", "largest")):
+        aggregate, alias = f"MAX({_quote(measure)})", f"max_{measure}"
+    elif any(word in question for word in ("min", "lowest", "smallest")):
+        aggregate, alias = f"MIN({_quote(measure)})", f"min_{measure}"
+    else:
+        aggregate, alias = f"SUM({_quote(measure)})", f"total_{measure}"
+
+    limit_match = re.search(r"\btop (\d+)", question)
+    limit = int(limit_match.group(1)) if limit_match else 10
+
+    if dimension:
+        sql = (
+            f"SELECT {_quote(dimension)}, {aggregate} AS {_quote(alias)} FROM data "
+            f"GROUP BY {_quote(dimension)} ORDER BY {_quote(alias)} DESC LIMIT {limit}"
+        )
+    else:
+        sql = f"SELECT {aggregate} AS {_quote(alias)} FROM data"
+
+    return {
+        "sql": sql,
+        "explanation": f"Computes {alias}" + (f" for each {dimension}" if dimension else ""),
+        "confidence": 0.9,
+    }
+
+
+def _result_block(prompt: str) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Columns and sample rows from chart/insight prompts"""
+    columns: List[str] = []
+    match = re.search(r"^Columns: (\[.*\])$", prompt, re.MULTILINE)
+    if match:
+        try:
+            columns = ast.literal_eval(match.group(1))
+        except (ValueError, SyntaxError):
+            pass
+
+    rows: List[Dict[str, Any]] = []
+    match = re.search(r"^(\[.*?^\])", prompt, re.MULTILINE | re.DOTALL)
+    if match:
+        try:
+            rows = json.loads(match.group(1))
+        except ValueError:
+            pass
+    if not columns and rows:
+        columns = list(rows[0].keys())
+    return columns, rows
+
+
+def _chart_response(prompt: str) -> Dict[str, Any]:
+    columns, rows = _result_block(prompt)
+    label_col = columns[0] if columns else "label"
+    value_col = next(
+        (c for c in columns[1:] if rows and isinstance(rows[0].get(c), (int, float))),
+        columns[-1] if columns else "value"
+    )
+    return {
+        "type": "bar",
+        "title": f"{value_col} by {label_col}",
+        "labels": [str(row.get(label_col)) for row in rows],
+        "datasets": [{"label": value_col, "data": [row.get(value_col) for row in rows]}],
+        "explanation": "Bar charts compare a measure across categories.",
+    }
+
+
+def _insight_response(prompt: str) -> str:
+    columns, rows = _result_block(prompt)
+    total = re.search(r"Total rows: (\d+)", prompt)
+    if not rows:
+        return "The query returned no rows, so there is nothing to analyse yet."
+    first = rows[0]
+    summary = ", ".join(f"{k} = {v}" for k, v in first.items())
+    return (
+        f"The result has {total.group(1) if total else len(rows)} rows. "
+        f"The leading entry is {summary}. "
+        "Focus follow-up analysis on the top entries, which account for most of the total."
+    )
+
+
+# --- App ---
+
+def create_app(config: Optional[MockLLMConfig] = None) -> FastAPI:
+    """Build the mock server app (usable in-process or under uvicorn)"""
+    config = config or MockLLMConfig()
+    rng = random.Random(config.seed)
+    stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+    app = FastAPI(title="Mock OpenAI")
+
+    def sample_latency() -> float:
+        mean, spread = config.latency_ms, config.latency_jitter_ms
+        if config.latency_dist == "fixed":
+            ms = mean
+        elif config.latency_dist == "uniform":
+            ms = rng.uniform(mean - spread, mean + spread)
+        elif config.latency_dist == "normal":
+            ms = rng.gauss(mean, spread)
+        else:
+            # lognormal with the given median; sigma from spread/median
+            ms = mean * rng.lognormvariate(0, spread / mean if mean else 0)
+        return max(ms, 0.0) / 1000
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        await asyncio.sleep(sample_latency())
+
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": str(config.retry_after_s)},
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+            )
+        if roll < config.rate_limit_rate + config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Injected server error", "type": "server_error", "code": None}},
+            )
+
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        prompt = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+
+        content = next((text for key, text in config.canned.items() if key in prompt), None)
+        if content is None:
+            if "SQL" in system:
+                content = json.dumps(_sql_response(prompt))
+            elif "visualization" in system:
+                content = json.dumps(_chart_response(prompt))
+            else:
+                content = _insight_response(prompt)
+
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI chat-completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-dist", default="lognormal", choices=["fixed", "uniform", "normal", "lognormal"])
+    parser.add_argument("--latency-ms", type=float, default=400.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=150.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--canned", type=str, default=None, help="JSON file mapping prompt substrings to responses")
+    args = parser.parse_args()
+
+    canned = {}
+    if args.canned:
+        with open(args.canned) as f:
+            canned = json.load(f)
+
+    config = MockLLMConfig(
+        latency_dist=args.latency_dist,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after_s=args.retry_after,
+        seed=args.seed,
+        canned=canned,
+    )
+
+    import uvicorn
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Differential check of the SQL fast path against SQLite.
+
+Runs a fixed set of typical generated queries plus --random seeded random
+queries from the fast path's subset on a synthetic table with NULLs, once
+through sql_fastpath and once through SQLite, and compares columns,
+dtypes and rows (floats to 1e-9 relative). Every query with an ORDER BY
+orders by all result columns last, so the expected row order is fully
+determined. Every fixed query, plus a few the fast path does not take
+(trailing comments), is also put through sql_validator and the SQL it
+returns is checked against the original's result cut to the row limit.
+With --rollups, rollups of the table are built as the
+background job builds them and every query they cover is compared too.
+Also reports the latency of the paths for the fixed queries. Exits
+non-zero on any mismatch.
+
+Usage (from backend/):
+    python -m benchmarks.sql_fastpath_diff --rows 100000 --random 2000
+    python -m benchmarks.sql_fastpath_diff --rows 1000000 --rollups
+    python -m benchmarks.sql_fastpath_diff --json fastpath.json
+"""
+import argparse
+import math
+import random
+import sys
+import time
+from typing import List, Optional
+
+from benchmarks.common import bootstrap_env, run_metadata, summarize_ms, write_results
+
+bootstrap_env()
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.services.rollups import build_rollups  # noqa: E402
+from app.services.sql_engine import execute_sql  # noqa: E402
+from app.services.sql_fastpath import run_fastpath, run_on_rollups  # noqa: E402
+from app.services.sql_validator import validate_sql  # noqa: E402
+from app.services.table_profile import TableProfile  # noqa: E402
+from benchmarks.datagen import generate_dataframe  # noqa: E402
+
+FIXED_QUERIES = [
+    "SELECT dim_0, SUM(measure_0) AS total FROM data GROUP BY dim_0 ORDER BY total DESC, 1 LIMIT 10",
+    "SELECT dim_0, COUNT(*) FROM data GROUP BY dim_0",
+    "SELECT dim_1, AVG(measure_1) AS avg_units, MAX(measure_0) FROM df WHERE measure_1 > 50 GROUP BY dim_1 ORDER BY 2 DESC, 1, 3",
+    "SELECT COUNT(*), SUM(measure_1), AVG(measure_0), MIN(date), MAX(date) FROM data",
+    "SELECT COUNT(DISTINCT dim_1) AS n FROM data WHERE date >= '2025-01-01'",
+    "SELECT dim_0, dim_1, SUM(measure_1) FROM data WHERE dim_1 IS NOT NULL GROUP BY dim_0, dim_1 ORDER BY 3 DESC, 1, 2 LIMIT 20",
+    "SELECT date, dim_0, measure_0 FROM data WHERE dim_0 IN ('A0000', 'A0003') AND measure_0 BETWEEN 10 AND 50 ORDER BY measure_0 DESC, 1, 2, 3 LIMIT 100",
+    "SELECT * FROM data WHERE dim_1 LIKE 'b000%' AND NOT measure_1 < 20 LIMIT 500",
+    "SELECT * FROM (SELECT * FROM data WHERE measure_0 IS NULL) LIMIT 10000",
+    "SELECT * FROM (SELECT DIM_0, COUNT(*) AS n FROM data GROUP BY dim_0 ORDER BY 1) LIMIT 2",
+    "SELECT * FROM (SELECT data.Measure_0, \"DIM_1\" FROM data WHERE measure_0 > 90) LIMIT 50",
+    "SELECT SUM(measure_0) FROM data WHERE dim_0 = 'no such value'",
+]
+
+# Only put through the validator: the row limit wrapper must survive them
+VALIDATOR_QUERIES = [
+    "SELECT dim_0, measure_0 FROM data -- all rows",
+    "SELECT dim_0, COUNT(*) FROM data GROUP BY dim_0 -- per dimension\n",
+    "SELECT * FROM data /* everything */",
+]
+
+
+def build_frame(rows: int, seed: int) -> pd.DataFrame:
+    """Synthetic table with NULLs in a dimension and a measure"""
+    df = generate_dataframe(rows, dimensions=2, measures=2, cardinality=20, seed=seed)
+    rng = np.random.default_rng(seed)
+    df["dim_1"] = df["dim_1"].astype(object)
+    df.loc[rng.random(rows) < 0.1, "dim_1"] = None
+    df.loc[rng.random(rows) < 0.1, "measure_0"] = np.nan
+    return df
+
+
+def random_query(rng: random.Random, df: pd.DataFrame) -> str:
+    """A random query from the fast path's subset"""
+    dims = ["dim_0", "dim_1", "date"]
+    measures = ["measure_0", "measure_1"]
+
+    def label(column: str) -> str:
+        value = df[column].dropna().iloc[rng.randrange(len(df[column].dropna()))]
+        return "'" + str(value).replace("'", "''") + "'"
+
+    def predicate() -> str:
+        if rng.random() < 0.5:
+            column = rng.choice(dims)
+            choice = rng.randrange(6)
+            if choice == 0:
+                return f"{column} = {label(column)}"
+            if choice == 1:
+                return f"{column} != {label(column)}"
+            if choice == 2:
+                return f"{column} {rng.choice(['', 'NOT '])}IN ({label(column)}, {label(column)})"
+            if choice == 3:
+                return f"{column} LIKE '{label(column)[1:3].lower()}%'"
+            if choice == 4:
+                return f"{column} IS {rng.choice(['', 'NOT '])}NULL"
+            return f"{column} {rng.choice(['<', '>=', '<>'])} {label(column)}"
+        column = rng.choice(measures)
+        if rng.random() < 0.3:
+            low = rng.randint(0, 60)
+            return f"{column} BETWEEN {low} AND {low + rng.randint(1, 40)}"
+        return f"{column} {rng.choice(['<', '<=', '>', '>=', '=', '<>'])} {rng.choice([rng.randint(0, 100), round(rng.uniform(0, 100), 2)])}"
+
+    def condition(depth: int = 0) -> str:
+        if depth < 2 and rng.random() < 0.4:
+            joined = f"{condition(depth + 1)} {rng.choice(['AND', 'OR'])} {condition(depth + 1)}"
+            return f"({joined})" if rng.random() < 0.5 else joined
+        return ("NOT " if rng.random() < 0.15 else "") + predicate()
+
+    items: List[str] = []
+    if rng.random() < 0.7:
+        keys = rng.sample(dims, rng.randint(0, 2))
+        items += keys
+        for _ in range(rng.randint(1, 3)):
+            func = rng.choice(["COUNT(*)", "COUNT", "COUNT DISTINCT", "SUM", "AVG", "MIN", "MAX"])
+            if func == "COUNT(*)":
+                expr = "COUNT(*)"
+            elif func == "COUNT DISTINCT":
+                expr = f"COUNT(DISTINCT {rng.choice(dims)})"
+            elif func in ("SUM", "AVG"):
+                expr = f"{func}({rng.choice(measures)})"
+            else:
+                expr = f"{func.lower() if rng.random() < 0.3 else func}({rng.choice(dims + measures)})"
+            items.append(expr + (f" AS agg_{len(items)}" if rng.random() < 0.5 else ""))
+        group_by = f" GROUP BY {', '.join(keys)}" if keys else ""
+    else:
+        items = rng.sample(dims + measures, rng.randint(1, 4)) if rng.random() < 0.8 else ["*"]
+        group_by = ""
+
+    sql = f"SELECT {', '.join(items)} FROM {rng.choice(['data', 'df'])}"
+    if rng.random() < 0.7:
+        sql += f" WHERE {condition()}"
+    sql += group_by
+
+    width = len(df.columns) if items == ["*"] else len(items)
+    if rng.random() < 0.6:
+        leading = [f"{rng.randint(1, width)}{rng.choice(['', ' DESC', ' ASC'])}" for _ in range(rng.randint(0, 2))]
+        sql += " ORDER BY " + ", ".join(leading + [str(i) for i in range(1, width + 1)])
+        if rng.random() < 0.6:
+            sql += f" LIMIT {rng.randint(0, 50)}"
+            if rng.random() < 0.3:
+                sql += f" OFFSET {rng.randint(0, 20)}"
+    if rng.random() < 0.2 and " LIMIT " not in sql:
+        sql = f"SELECT * FROM ({sql}) LIMIT {rng.randint(1, 200)}"
+    return sql
+
+
+def _same_value(a, b) -> bool:
+    a_null = a is None or (isinstance(a, float) and math.isnan(a))
+    b_null = b is None or (isinstance(b, float) and math.isnan(b))
+    if a_null or b_null:
+        return a_null and b_null
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+    return a == b
+
+
+def difference(fast: pd.DataFrame, slow: pd.DataFrame) -> Optional[str]:
+    """Why two results differ, or None if they agree"""
+    if list(fast.columns) != list(slow.columns):
+        return f"columns {list(fast.columns)} != {list(slow.columns)}"
+    if len(fast) != len(slow):
+        return f"{len(fast)} rows != {len(slow)} rows"
+    if [str(t) for t in fast.dtypes] != [str(t) for t in slow.dtypes]:
+        return f"dtypes {list(fast.dtypes)} != {list(slow.dtypes)}"
+    fast_rows = list(fast.itertuples(index=False, name=None))
+    slow_rows = list(slow.itertuples(index=False, name=None))
+    for i, (a, b) in enumerate(zip(fast_rows, slow_rows)):
+        if not all(_same_value(x, y) for x, y in zip(a, b)):
+            # SUM/AVG round differently in the last bits, which can swap
+            # rows that tie on a float; the same rows in another order is fine
+            if sorted(map(_canonical, fast_rows)) == sorted(map(_canonical, slow_rows)):
+                return None
+            return f"row {i}: {a} != {b}"
+    return None
+
+
+def _canonical(row) -> tuple:
+    """Sortable row with floats rounded and NULLs first"""
+    return tuple(
+        (0, "") if v is None or (isinstance(v, float) and math.isnan(v))
+        else (1, float(f"{v:.9g}")) if isinstance(v, float)
+        else (1, v)
+        for v in row
+    )
+
+
+def _median_ms(call, repeats: int) -> float:
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return summarize_ms(samples)["p50_ms"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the SQL fast path with SQLite")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--random", type=int, default=500, help="number of random queries")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=5, help="timing repeats per fixed query")
+    parser.add_argument("--rollups", action="store_true", help="also compare answers from rollups")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    df = build_frame(args.rows, args.seed)
+    rng = random.Random(args.seed)
+    queries = [(sql, True) for sql in FIXED_QUERIES] + [(random_query(rng, df), False) for _ in range(args.random)]
+
+    rollups = []
+    if args.rollups:
+        start = time.perf_counter()
+        rollups = build_rollups("benchmark", df, TableProfile.from_frame(df)).rollups
+        print(f"built {len(rollups)} rollups in {time.perf_counter() - start:.2f} s: "
+              + ", ".join(f"{'+'.join(r.dimensions)} ({len(r.frame)} rows)" for r in rollups))
+
+    failures = []
+    fallbacks = 0
+    rollup_hits = 0
+    timings = []
+    for sql, fixed in queries:
+        fast = run_fastpath(df, sql)
+        rolled = run_on_rollups(rollups, sql) if rollups else None
+        if fast is None:
+            fallbacks += 1
+            if fixed:
+                failures.append({"sql": sql, "error": "not handled by the fast path"})
+            if rolled is None:
+                continue
+        try:
+            slow = execute_sql(df, sql, fastpath=False)
+        except Exception as e:
+            failures.append({"sql": sql, "error": f"SQLite failed where the fast path did not: {e}"})
+            continue
+        reason = difference(fast, slow) if fast is not None else None
+        if rolled is not None:
+            rollup_hits += 1
+            rollup_reason = difference(rolled, slow)
+            if rollup_reason:
+                failures.append({"sql": sql, "error": f"rollup: {rollup_reason}"})
+        if reason:
+            failures.append({"sql": sql, "error": reason})
+        elif fixed and fast is not None:
+            timings.append({
+                "sql": sql,
+                "fastpath_ms": _median_ms(lambda: run_fastpath(df, sql), args.repeats),
+                "sqlite_ms": _median_ms(lambda: execute_sql(df, sql, fastpath=False), args.repeats),
+                "rollup_ms": _median_ms(lambda: run_on_rollups(rollups, sql), args.repeats) if rolled is not None else None,
+            })
+
+    profile = TableProfile.from_frame(df)
+    for sql in FIXED_QUERIES + VALIDATOR_QUERIES:
+        try:
+            validated = validate_sql(sql, profile)
+            limited = execute_sql(df, validated.sql, fastpath=False)
+        except Exception as e:
+            failures.append({"sql": sql, "error": f"validator: {e}"})
+            continue
+        expected = execute_sql(df, sql, fastpath=False)
+        if validated.limited:
+            expected = expected.head(settings.QUERY_MAX_RESULT_ROWS).reset_index(drop=True)
+        reason = difference(limited, expected)
+        if reason:
+            failures.append({"sql": sql, "error": f"validator: {reason}"})
+
+    for t in timings:
+        rollup = f"{t['rollup_ms']:9.2f} ms" if t["rollup_ms"] is not None else " " * 12
+        print(f"{t['fastpath_ms']:9.2f} ms  {t['sqlite_ms']:9.2f} ms  {rollup}  {t['sql']}")
+    for f in failures:
+        print(f"MISMATCH {f['sql']}\n    {f['error']}")
+    print(f"{len(queries)} queries, {len(queries) - fallbacks} on the fast path, "
+          f"{fallbacks} fell back, {rollup_hits} answered from rollups, {len(failures)} mismatches")
+
+    if args.json:
+        write_results(args.json, {
+            "meta": run_metadata(),
+            "rows": args.rows,
+            "queries": len(queries),
+            "fallbacks": fallbacks,
+            "rollup_hits": rollup_hits,
+            "failures": failures,
+            "timings": timings,
+        })
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,25 @@
 """
 Lumiere Backend - Main FastAPI Application
 """
-from fastapi import FastAPI
+import ipaddress
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
+from app.core.admission import admission_controller
 from app.core.config import settings
 from app.core.database import engine, Base
-from app.routers import auth, users, admin, data, ai
+from app.core.event_sink import event_sink
+from app.core.metrics import render_prometheus
+from app.core.scheduler import register_job, start_jobs, stop_jobs, with_session
+from app.core.timing import TimingMiddleware
+from app.routers import auth, users, admin, data, ai, api_keys
+from app.services.admin_service import AdminService
+from app.services.counter_service import rebuild_user_counters
+from app.services.query_service import expire_stale_queries
+from app.services.rollups import refresh_rollups
+from app.services.storage_service import StorageService
 
 # Create all database tables
 Base.metadata.create_all(bind=engine)
@@ -30,12 +43,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-stage request timing (Server-Timing header)
+app.add_middleware(TimingMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(users.router, prefix="/api/v1")
 app.include_router(admin.router, prefix="/api/v1")
 app.include_router(data.router, prefix="/api/v1")
 app.include_router(ai.router, prefix="/api/v1")
+app.include_router(api_keys.router, prefix="/api/v1")
+
+
+# Periodic jobs
+register_job(
+    "platform_stats",
+    settings.STATS_SNAPSHOT_INTERVAL_SECONDS,
+    with_session(AdminService.refresh_platform_stats)
+)
+register_job(
+    "user_counters",
+    settings.USER_COUNTERS_REBUILD_INTERVAL_SECONDS,
+    with_session(rebuild_user_counters),
+    initial_delay=60
+)
+register_job(
+    "storage_reconcile",
+    settings.STORAGE_RECONCILE_INTERVAL_SECONDS,
+    with_session(lambda db: StorageService(db).reconcile()),
+    initial_delay=120
+)
+register_job(
+    "stale_queries",
+    settings.QUERY_STALE_SWEEP_INTERVAL_SECONDS,
+    with_session(expire_stale_queries),
+    initial_delay=10
+)
+register_job(
+    "rollup_build",
+    settings.ROLLUP_BUILD_INTERVAL_SECONDS,
+    with_session(refresh_rollups),
+    initial_delay=30
+)
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    """Start the event sink writer and periodic jobs."""
+    await event_sink.start()
+    await start_jobs()
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    """Stop periodic jobs and write buffered records before the process exits."""
+    await stop_jobs()
+    await admission_controller.close()
+    await event_sink.stop()
 
 
 @app.get("/")
@@ -54,6 +118,21 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    """Prometheus metrics (latency, errors, DB pool, LLM usage, caches)."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    try:
+        client = ipaddress.ip_address(request.client.host) if request.client else None
+    except ValueError:
+        client = None
+    networks = [ipaddress.ip_network(net, strict=False) for net in settings.metrics_allowed_networks_list]
+    if client is None or not any(client in network for network in networks):
+        raise HTTPException(status_code=403, detail="Metrics not allowed from this address")
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
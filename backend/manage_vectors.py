@@ -0,0 +1,85 @@
+"""
+Script for offline maintenance of the RAG vector index.
+
+Usage:
+    python manage_vectors.py sync --model text-embedding-3-small
+    python manage_vectors.py rebuild --model text-embedding-3-small
+    python manage_vectors.py ingest --file docs/sales_dictionary.md --title "Sales data dictionary" --datasource-id 3
+
+ingest chunks and embeds a document with the RAG_EMBEDDER embedder.
+Running it again with the same title and data source re-indexes the
+document: unchanged chunks are skipped and removed ones are deleted.
+"""
+import argparse
+import os
+import sys
+import time
+
+from app.core.database import SessionLocal
+from app.services.rag_ingestion import RAGIngestionService
+from app.services.vector_store import RetrievalService
+
+
+def main():
+    """Main function to parse arguments and run the maintenance command."""
+    parser = argparse.ArgumentParser(
+        description="Maintain the Lumiere embedding vector index"
+    )
+    parser.add_argument(
+        "command",
+        choices=["sync", "rebuild", "ingest"],
+        help="sync: append new Embedding rows; rebuild: compact and retrain the ANN index; "
+             "ingest: chunk, embed and index a document"
+    )
+    parser.add_argument(
+        "--model",
+        type=str,
+        help="Embedding model name (Embedding.model); required for sync and rebuild"
+    )
+    parser.add_argument("--file", type=str, help="ingest: text or markdown file to index")
+    parser.add_argument("--title", type=str, help="ingest: document title (defaults to the file name)")
+    parser.add_argument("--datasource-id", type=int, help="ingest: data source the document describes")
+
+    args = parser.parse_args()
+    if args.command == "ingest" and not args.file:
+        parser.error("ingest requires --file")
+    if args.command != "ingest" and not args.model:
+        parser.error(f"{args.command} requires --model")
+    db = SessionLocal()
+
+    try:
+        start = time.perf_counter()
+
+        if args.command == "ingest":
+            with open(args.file, encoding="utf-8") as f:
+                content = f.read()
+            title = args.title or os.path.basename(args.file)
+            counts = RAGIngestionService(db).ingest_document(
+                args.datasource_id, title, content, metadata={"source_file": args.file}
+            )
+            print(f"✅ Ingested '{title}': {counts['chunks']} chunks, {counts['embedded']} embedded, "
+                  f"{counts['skipped']} unchanged, {counts['removed']} removed")
+            print(f"   Took {time.perf_counter() - start:.1f}s")
+            sys.exit(0)
+
+        service = RetrievalService(db)
+        added = service.sync_from_db(args.model)
+        print(f"✅ Synced {added} new vectors for '{args.model}'")
+
+        if args.command == "rebuild":
+            indexed = service.rebuild_ann_index(args.model)
+            print(f"✅ Rebuilt IVF index over {indexed} vectors")
+
+        print(f"   Took {time.perf_counter() - start:.1f}s")
+        sys.exit(0)
+
+    except Exception as e:
+        print(f"\n❌ Error: {str(e)}")
+        sys.exit(1)
+
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()